@@ -1,5 +1,8 @@
-from django.contrib import admin
-from .models import Test, Question, Answer, UserProfile, TestResult
+from django.contrib import admin, messages
+from .models import Test, Question, Answer, UserProfile, TestResult, ProfileRecomputeJob, Trait, TraitNormBucket, TraitScore
+from .item_analysis import build_item_analysis
+from .scoring_cache import build_scoring_plan
+from .scoring import ScoringConfigError
 
 
 @admin.register(Test)
@@ -8,6 +11,34 @@ class TestAdmin(admin.ModelAdmin):
     list_filter = ('is_active', 'created_at')
     search_fields = ('name', 'description')
     ordering = ('-created_at',)
+    actions = ['rescore_results', 'analyze_items']
+
+    @admin.action(description='Пересчитать результаты по текущей схеме подсчёта')
+    def rescore_results(self, request, queryset):
+        """
+        Пересчёт сотен тысяч результатов не помещается в HTTP-запрос: действие
+        проверяет схему подсчёта и подсказывает команду rescore_results
+        (пул процессов, контрольная точка и возобновление).
+        """
+        for test in queryset:
+            try:
+                build_scoring_plan(test)
+            except ScoringConfigError as e:
+                self.message_user(request, f'{test.name}: {e}', messages.ERROR)
+                continue
+            count = TestResult.objects.filter(test=test).count()
+            self.message_user(
+                request,
+                f'{test.name}: результатов {count}. Запустите на сервере: python manage.py rescore_results '
+                f'--test-id {test.id} --checkpoint rescore_{test.id}.json',
+                messages.WARNING
+            )
+
+    @admin.action(description='Пересчитать анализ заданий')
+    def analyze_items(self, request, queryset):
+        for test in queryset:
+            snapshot = build_item_analysis(test)
+            self.message_user(request, f'{test.name}: анализ заданий по {snapshot.result_count} результатам')
 
 
 @admin.register(Question)
@@ -47,3 +78,38 @@ class TestResultAdmin(admin.ModelAdmin):
             return obj.personality_map.get('overall_score', 0)
         return 0
     overall_score.short_description = 'Общий балл'
+
+
+@admin.register(Trait)
+class TraitAdmin(admin.ModelAdmin):
+    list_display = ('name', 'id')
+    search_fields = ('name',)
+    ordering = ('name',)
+
+
+@admin.register(TraitScore)
+class TraitScoreAdmin(admin.ModelAdmin):
+    list_display = ('user', 'test', 'trait', 'normalized', 'raw', 'completed_at')
+    list_filter = ('test', 'trait', 'completed_at')
+    list_select_related = ('user', 'test', 'trait')
+    search_fields = ('user__username', 'trait__name')
+    raw_id_fields = ('result', 'user')
+    ordering = ('-completed_at',)
+
+
+@admin.register(TraitNormBucket)
+class TraitNormBucketAdmin(admin.ModelAdmin):
+    list_display = ('test', 'trait', 'value', 'count')
+    list_filter = ('test',)
+    list_select_related = ('test', 'trait')
+    search_fields = ('test__name', 'trait__name')
+    ordering = ('test', 'trait', 'value')
+
+
+@admin.register(ProfileRecomputeJob)
+class ProfileRecomputeJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'request_count', 'processed_count', 'first_requested_at', 'attempts', 'failed_at')
+    list_filter = ('failed_at',)
+    search_fields = ('user__username',)
+    ordering = ('first_requested_at',)
+    readonly_fields = ('last_error',)
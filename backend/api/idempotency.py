@@ -0,0 +1,118 @@
+"""
+Идемпотентная отправка тестов по заголовку Idempotency-Key.
+
+Первый запрос с ключом «захватывает» его строкой SubmissionIdempotencyKey
+(уникальность (user, key) обеспечивает БД), после сохранения результата
+в строку записывается ссылка на него. Повтор с тем же ключом получает
+исходный ответ 201 без подсчёта и записи; одновременный повтор ждёт
+завершения первого запроса.
+"""
+from datetime import timedelta
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .ingestion import parse_pending_id
+from .models import PendingTestResult, SubmissionIdempotencyKey, TestResult
+from .norms import result_percentiles
+
+
+class IdempotencyError(Exception):
+    """Повтор с ключом невозможно обработать (status — HTTP-код ответа)"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def request_fingerprint(test, data):
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f'{test.id}:{payload}'.encode('utf-8')).hexdigest()
+
+
+def claim_idempotency_key(user, key, test, request_hash):
+    """
+    Возвращает (запись, данные для повтора). Если данные None — ключ захвачен
+    этим запросом и его нужно завершить (complete/release). Если ключ
+    выполняется в другом запросе — ждёт до IDEMPOTENCY_WAIT_SECONDS.
+    """
+    ttl = timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    stale = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_STALE_SECONDS', 60))
+    wait = getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 5)
+
+    SubmissionIdempotencyKey.objects.filter(user=user, created_at__lt=timezone.now() - ttl).delete()
+
+    # Повторные попытки — после освобождения брошенного захвата или удаления результата
+    for _ in range(3):
+        record, created = SubmissionIdempotencyKey.objects.get_or_create(
+            user=user, key=key, defaults={'test': test, 'request_hash': request_hash}
+        )
+        if created:
+            return record, None
+        if record.test_id != test.id or record.request_hash != request_hash:
+            raise IdempotencyError(
+                'Ключ идемпотентности уже использован для другого запроса', 422
+            )
+
+        deadline = time.monotonic() + wait
+        while not record.result_ref:
+            if record.created_at < timezone.now() - stale:
+                # Первый запрос не завершился — забираем ключ себе
+                SubmissionIdempotencyKey.objects.filter(pk=record.pk, result_ref='').delete()
+                break
+            if time.monotonic() >= deadline:
+                raise IdempotencyError('Запрос с этим ключом идемпотентности ещё выполняется', 409)
+            time.sleep(0.1)
+            try:
+                record.refresh_from_db()
+            except SubmissionIdempotencyKey.DoesNotExist:
+                break
+        if record.result_ref:
+            data = replay_response_data(record)
+            if data is not None:
+                return record, data
+            # Результат удалён — ключ больше ничего не гарантирует
+            record.delete()
+
+    raise IdempotencyError('Запрос с этим ключом идемпотентности ещё выполняется', 409)
+
+
+def complete_idempotency_key(record, result_ref):
+    """
+    Записывает в ключ ссылку на результат. False — ключ уже забрал другой
+    запрос (этот выполнялся дольше IDEMPOTENCY_STALE_SECONDS): результат
+    сохранён, но повтор с ключом его не вернёт.
+    """
+    record.result_ref = str(result_ref)
+    return SubmissionIdempotencyKey.objects.filter(pk=record.pk, result_ref='').update(
+        result_ref=record.result_ref
+    ) == 1
+
+
+def release_idempotency_key(record):
+    """Освобождает ключ, если запрос не создал результат (ошибка валидации и т.п.)"""
+    SubmissionIdempotencyKey.objects.filter(pk=record.pk, result_ref='').delete()
+
+
+def replay_response_data(record):
+    """Тело исходного ответа 201 по сохранённой ссылке или None, если результат удалён"""
+    pending_id = parse_pending_id(record.result_ref)
+    if pending_id is not None:
+        result = PendingTestResult.objects.filter(id=pending_id).first()
+        extra = {'pending': True}
+    else:
+        result = TestResult.objects.filter(id=int(record.result_ref)).first()
+        extra = {}
+    if result is None:
+        return None
+    return {
+        'message': 'Тест успешно завершен',
+        'result_id': record.result_ref if pending_id is not None else result.id,
+        **extra,
+        'personality_map': result.personality_map,
+        'scores': result.score,
+        'percentiles': result_percentiles(result.test_id, result.score)
+    }
@@ -0,0 +1,87 @@
+"""
+Буферизованный приём результатов тестов (write-behind).
+
+В режиме RESULT_INGESTION_MODE = 'buffered' отправка теста сохраняется одной
+вставкой в PendingTestResult и сразу подтверждается клиенту с идентификатором
+вида 'p<id>'. Команда flush_result_buffer переносит накопленные строки в
+TestResult пачками (TestResult.create_many), пересчитывая профиль каждого
+пользователя один раз на пачку.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PendingTestResult, TestResult
+
+
+def is_buffered_ingestion():
+    return getattr(settings, 'RESULT_INGESTION_MODE', 'direct') == 'buffered'
+
+
+def buffer_submission(user, test, answers, personality_map, scores, response_time=None, metadata=None):
+    """Сохраняет результат в буфер (одна вставка, без пересчёта профиля)"""
+    return PendingTestResult.objects.create(
+        user=user,
+        test=test,
+        answers=answers,
+        personality_map=personality_map,
+        score=scores,
+        response_time=response_time or {},
+        metadata=metadata or {}
+    )
+
+
+def parse_pending_id(public_id):
+    """'p123' -> 123, иначе None"""
+    if isinstance(public_id, str) and public_id[:1] == 'p' and public_id[1:].isdigit():
+        return int(public_id[1:])
+    return None
+
+
+def pending_count(limit=None):
+    """Количество строк, ожидающих переноса (не больше limit, если задан)"""
+    queryset = PendingTestResult.objects.filter(flushed_at__isnull=True)
+    if limit:
+        queryset = queryset[:limit]
+    return queryset.count()
+
+
+def flush_pending_results(limit=None):
+    """Переносит до limit строк буфера в TestResult. Возвращает число перенесённых"""
+    limit = limit or getattr(settings, 'RESULT_BUFFER_FLUSH_SIZE', 500)
+    with transaction.atomic():
+        pending = list(
+            PendingTestResult.objects.select_for_update(skip_locked=True)
+            .filter(flushed_at__isnull=True)
+            .order_by('id')[:limit]
+        )
+        if not pending:
+            return 0
+        created = TestResult.create_many([
+            TestResult(
+                user_id=p.user_id,
+                test_id=p.test_id,
+                answers=p.answers,
+                personality_map=p.personality_map,
+                score=p.score,
+                response_time=p.response_time,
+                metadata=p.metadata,
+            )
+            for p in pending
+        ], completed_at=[p.created_at for p in pending])
+        now = timezone.now()
+        for p, result in zip(pending, created):
+            p.result = result
+            p.flushed_at = now
+        PendingTestResult.objects.bulk_update(pending, ['result', 'flushed_at'])
+    return len(pending)
+
+
+def purge_flushed_results():
+    """Удаляет перенесённые строки буфера старше RESULT_BUFFER_RETENTION_HOURS"""
+    hours = getattr(settings, 'RESULT_BUFFER_RETENTION_HOURS', 24)
+    cutoff = timezone.now() - timedelta(hours=hours)
+    deleted, _ = PendingTestResult.objects.filter(flushed_at__lt=cutoff).delete()
+    return deleted
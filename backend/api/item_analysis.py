@@ -0,0 +1,309 @@
+"""
+Анализ заданий теста (item analysis) по всем сохранённым ответам.
+
+Ответы результатов читаются порциями и переводятся в компактную матрицу
+(результаты × вопросы) номеров выбранных вариантов ответа (int16, -1 — нет
+ответа). По каждой порции накапливаются только суммы — распределения
+ответов по вопросам и моменты заданий и суммарного балла каждой черты, —
+поэтому память не зависит от числа результатов. По суммам считаются:
+
+- распределение ответов, среднее и стандартное отклонение задания;
+- исправленная корреляция задание — сумма остальных заданий черты;
+- альфа Кронбаха черты;
+- эффекты пола и потолка: доля результатов с минимальной и максимальной
+  возможной суммой черты.
+
+Черта задания — самая частая personality_trait его вариантов ответа. В
+суммы черты входят только результаты, ответившие на все её задания.
+Результат сохраняется снимком в ItemAnalysisSnapshot (команда
+analyze_test_items, действие в админке теста) и отдаётся персоналу через
+GET /api/tests/<id>/item-analysis/. С numpy порция обрабатывается матрично,
+без него — тем же накоплением в Python.
+"""
+from collections import Counter
+import math
+
+from django.utils import timezone
+
+from .models import ItemAnalysisSnapshot, TestResult
+from .scoring_cache import scoring_definition
+from .utils import np
+
+RESULT_CHUNK_SIZE = 5000
+# Доля результатов на границе шкалы, с которой отмечается эффект пола/потолка
+FLOOR_CEILING_THRESHOLD = 0.15
+
+
+class ItemLayout:
+    """Вопросы теста, их варианты ответа и черты заданий"""
+
+    def __init__(self, definition):
+        self.questions = []
+        self.answer_codes = {}
+        self.values = []
+        self.item_traits = []
+        for column, question in enumerate(definition['questions']):
+            answers = question['answers']
+            self.questions.append({
+                'question_id': question['id'],
+                'order': question['order'],
+                'answers': [answer['id'] for answer in answers],
+            })
+            self.values.append([answer['value'] for answer in answers])
+            for code, answer in enumerate(answers):
+                self.answer_codes[answer['id']] = (column, code)
+            traits = Counter(answer['personality_trait'] for answer in answers if answer['personality_trait'])
+            self.item_traits.append(traits.most_common(1)[0][0] if traits else '')
+        # Черта -> столбцы её заданий (в порядке вопросов)
+        self.traits = {}
+        for column, trait in enumerate(self.item_traits):
+            if trait and self.values[column]:
+                self.traits.setdefault(trait, []).append(column)
+        self.max_answers = max((len(values) for values in self.values), default=0)
+
+    def encode(self, answers):
+        """Строка матрицы: номер выбранного варианта по каждому вопросу (-1 — нет ответа)"""
+        row = [-1] * len(self.questions)
+        if isinstance(answers, dict):
+            for answer_id in answers.values():
+                position = self.answer_codes.get(answer_id)
+                if position is not None:
+                    row[position[0]] = position[1]
+        return row
+
+
+class TraitMoments:
+    """Суммы по результатам, ответившим на все задания черты"""
+
+    def __init__(self, size):
+        self.count = 0
+        self.floor = 0
+        self.ceiling = 0
+        self.sum_t = 0.0
+        self.sum_tt = 0.0
+        self.sum_x = [0.0] * size
+        self.sum_xx = [0.0] * size
+        self.sum_xt = [0.0] * size
+
+
+class ItemAnalysis:
+    """Накопление сумм по порциям строк матрицы и итоговая статистика"""
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.results = 0
+        self.counts = [[0] * len(values) for values in layout.values]
+        self.moments = {trait: TraitMoments(len(columns)) for trait, columns in layout.traits.items()}
+        self.bounds = {
+            trait: (sum(min(layout.values[c]) for c in columns), sum(max(layout.values[c]) for c in columns))
+            for trait, columns in layout.traits.items()
+        }
+
+    def add_rows(self, rows):
+        """Добавляет порцию строк матрицы (списки номеров вариантов)"""
+        if not rows:
+            return
+        self.results += len(rows)
+        if np is not None:
+            self._add_matrix(np.array(rows, dtype=np.int16))
+        else:
+            self._add_lists(rows)
+
+    def _add_matrix(self, codes):
+        layout = self.layout
+        answered = codes >= 0
+        for column, counts in enumerate(self.counts):
+            if counts:
+                column_codes = codes[answered[:, column], column]
+                for code, count in enumerate(np.bincount(column_codes, minlength=len(counts))):
+                    counts[code] += int(count)
+
+        # Значения вариантов: таблица (вопрос × вариант), недостающие варианты — нули
+        table = np.zeros((len(layout.values), max(1, layout.max_answers)))
+        for column, values in enumerate(layout.values):
+            table[column, :len(values)] = values
+        for trait, columns in layout.traits.items():
+            trait_codes = codes[:, columns]
+            complete = (trait_codes >= 0).all(axis=1)
+            if not complete.any():
+                continue
+            items = table[columns, :][np.arange(len(columns)), trait_codes[complete]]
+            totals = items.sum(axis=1)
+            moments = self.moments[trait]
+            low, high = self.bounds[trait]
+            moments.count += int(complete.sum())
+            moments.floor += int((totals == low).sum())
+            moments.ceiling += int((totals == high).sum())
+            moments.sum_t += float(totals.sum())
+            moments.sum_tt += float(totals @ totals)
+            for i, (sx, sxx, sxt) in enumerate(zip(items.sum(axis=0), (items * items).sum(axis=0), items.T @ totals)):
+                moments.sum_x[i] += float(sx)
+                moments.sum_xx[i] += float(sxx)
+                moments.sum_xt[i] += float(sxt)
+
+    def _add_lists(self, rows):
+        layout = self.layout
+        for row in rows:
+            for column, code in enumerate(row):
+                if code >= 0:
+                    self.counts[column][code] += 1
+            for trait, columns in layout.traits.items():
+                if any(row[c] < 0 for c in columns):
+                    continue
+                items = [layout.values[c][row[c]] for c in columns]
+                total = sum(items)
+                moments = self.moments[trait]
+                low, high = self.bounds[trait]
+                moments.count += 1
+                moments.floor += total == low
+                moments.ceiling += total == high
+                moments.sum_t += total
+                moments.sum_tt += total * total
+                for i, x in enumerate(items):
+                    moments.sum_x[i] += x
+                    moments.sum_xx[i] += x * x
+                    moments.sum_xt[i] += x * total
+
+    def item_total_correlations(self):
+        """{столбец: исправленная корреляция задание — остальные задания черты}"""
+        correlations = {}
+        for trait, columns in self.layout.traits.items():
+            moments = self.moments[trait]
+            n = moments.count
+            if n < 2 or len(columns) < 2:
+                continue
+            mean_t = moments.sum_t / n
+            var_t = moments.sum_tt / n - mean_t * mean_t
+            for i, column in enumerate(columns):
+                mean_x = moments.sum_x[i] / n
+                var_x = moments.sum_xx[i] / n - mean_x * mean_x
+                cov_xt = moments.sum_xt[i] / n - mean_x * mean_t
+                # Сумма остальных заданий R = T - x
+                var_r = var_t + var_x - 2 * cov_xt
+                if var_x <= 1e-12 or var_r <= 1e-12:
+                    continue
+                correlations[column] = round((cov_xt - var_x) / math.sqrt(var_x * var_r), 4)
+        return correlations
+
+    def trait_summary(self, trait):
+        columns = self.layout.traits[trait]
+        moments = self.moments[trait]
+        n = moments.count
+        low, high = self.bounds[trait]
+        summary = {
+            'trait': trait,
+            'items': len(columns),
+            'respondents': n,
+            'alpha': None,
+            'mean': None,
+            'sd': None,
+            'min_total': low,
+            'max_total': high,
+            'floor': None,
+            'ceiling': None,
+            'floor_effect': False,
+            'ceiling_effect': False,
+        }
+        if not n:
+            return summary
+        mean_t = moments.sum_t / n
+        var_t = max(0.0, moments.sum_tt / n - mean_t * mean_t)
+        k = len(columns)
+        item_variance = sum(
+            max(0.0, moments.sum_xx[i] / n - (moments.sum_x[i] / n) ** 2) for i in range(k)
+        )
+        if k >= 2 and var_t > 1e-12:
+            summary['alpha'] = round(k / (k - 1) * (1 - item_variance / var_t), 4)
+        summary.update({
+            'mean': round(mean_t, 3),
+            'sd': round(math.sqrt(var_t), 3),
+            'floor': round(moments.floor / n, 4),
+            'ceiling': round(moments.ceiling / n, 4),
+            'floor_effect': moments.floor / n >= FLOOR_CEILING_THRESHOLD,
+            'ceiling_effect': moments.ceiling / n >= FLOOR_CEILING_THRESHOLD,
+        })
+        return summary
+
+    def summary(self):
+        layout = self.layout
+        correlations = self.item_total_correlations()
+        questions = []
+        for column, question in enumerate(layout.questions):
+            counts = self.counts[column]
+            values = layout.values[column]
+            answered = sum(counts)
+            mean = sd = None
+            if answered:
+                mean = sum(v * c for v, c in zip(values, counts)) / answered
+                sd = math.sqrt(max(0.0, sum(v * v * c for v, c in zip(values, counts)) / answered - mean * mean))
+            questions.append({
+                'question_id': question['question_id'],
+                'order': question['order'],
+                'trait': layout.item_traits[column],
+                'answered': answered,
+                'mean': round(mean, 3) if mean is not None else None,
+                'sd': round(sd, 3) if sd is not None else None,
+                'item_total_correlation': correlations.get(column),
+                'distribution': [
+                    {
+                        'answer_id': answer_id,
+                        'value': value,
+                        'count': count,
+                        'share': round(count / answered, 4) if answered else 0,
+                    }
+                    for answer_id, value, count in zip(question['answers'], values, counts)
+                ],
+            })
+        return {
+            'results': self.results,
+            'questions': questions,
+            'traits': [self.trait_summary(trait) for trait in layout.traits],
+        }
+
+
+def analyze_results(layout, rows, chunk_size=RESULT_CHUNK_SIZE):
+    """
+    ItemAnalysis по строкам (id, answers). Возвращает (анализ, наибольший id).
+    """
+    analysis = ItemAnalysis(layout)
+    last_result = 0
+    chunk = []
+    for result_id, answers in rows:
+        chunk.append(layout.encode(answers))
+        last_result = max(last_result, result_id)
+        if len(chunk) >= chunk_size:
+            analysis.add_rows(chunk)
+            chunk = []
+    analysis.add_rows(chunk)
+    return analysis, last_result
+
+
+def build_item_analysis(test, chunk_size=RESULT_CHUNK_SIZE):
+    """Считает анализ заданий теста по всем результатам и сохраняет снимок"""
+    layout = ItemLayout(scoring_definition(test))
+    rows = (
+        TestResult.objects.filter(test=test).order_by('id')
+        .values_list('id', 'answers').iterator(chunk_size=chunk_size)
+    )
+    analysis, last_result = analyze_results(layout, rows, chunk_size)
+    snapshot, _ = ItemAnalysisSnapshot.objects.update_or_create(
+        test=test,
+        defaults={
+            'scoring_version': test.scoring_version,
+            'result_count': analysis.results,
+            'last_result': last_result,
+            'data': analysis.summary(),
+            'computed_at': timezone.now(),
+        }
+    )
+    return snapshot
+
+
+def snapshot_is_stale(snapshot, test):
+    """Схема подсчёта теста изменилась или появились/удалены результаты"""
+    if snapshot.scoring_version != test.scoring_version:
+        return True
+    results = TestResult.objects.filter(test=test)
+    if results.filter(id__gt=snapshot.last_result).exists():
+        return True
+    return results.count() != snapshot.result_count
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from api.item_analysis import RESULT_CHUNK_SIZE, build_item_analysis, snapshot_is_stale
+from api.models import ItemAnalysisSnapshot, Test
+
+
+class Command(BaseCommand):
+    help = 'Анализ заданий тестов (распределения ответов, корреляции задание — шкала, альфа Кронбаха, эффекты пола и потолка).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test-id', action='append', type=int, dest='test_ids',
+                            help='ID теста (можно указать несколько раз); по умолчанию — все активные')
+        parser.add_argument('--stale-only', action='store_true',
+                            help='Пропускать тесты, снимок которых не устарел')
+        parser.add_argument('--chunk-size', type=int, default=RESULT_CHUNK_SIZE, help='Результатов в одной порции')
+
+    def handle(self, *args, **options):
+        tests = Test.objects.all()
+        if options['test_ids']:
+            tests = tests.filter(id__in=options['test_ids'])
+        else:
+            tests = tests.filter(is_active=True)
+        snapshots = ItemAnalysisSnapshot.objects.in_bulk(field_name='test_id')
+
+        count = 0
+        for test in tests.order_by('id'):
+            snapshot = snapshots.get(test.id)
+            if options['stale_only'] and snapshot is not None and not snapshot_is_stale(snapshot, test):
+                continue
+            snapshot = build_item_analysis(test, chunk_size=max(1, options['chunk_size']))
+            count += 1
+            self.stdout.write(f'{test.name}: результатов {snapshot.result_count}')
+        self.stdout.write(self.style.SUCCESS(f'Анализ заданий обновлён для тестов: {count}'))
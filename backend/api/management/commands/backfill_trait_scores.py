@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.models import TestResult
+from api.trait_scores import missing_trait_scores, rebuild_trait_scores
+
+
+class Command(BaseCommand):
+    help = 'Заполняет таблицу баллов черт (TraitScore) по сохранённым результатам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test-id', type=int, help='Только результаты теста')
+        parser.add_argument('--user', action='append', type=int, dest='user_ids',
+                            help='ID пользователя (можно указать несколько раз)')
+        parser.add_argument('--all', action='store_true',
+                            help='Перезаписать баллы всех результатов, а не только ещё не заполненных')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Размер пачки результатов')
+
+    def handle(self, *args, **options):
+        results = TestResult.objects.all()
+        if options['test_id']:
+            results = results.filter(test_id=options['test_id'])
+        if options['user_ids']:
+            results = results.filter(user_id__in=options['user_ids'])
+        if not options['all']:
+            results = missing_trait_scores(results)
+
+        processed, written = rebuild_trait_scores(results, chunk_size=max(1, options['chunk_size']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано результатов: {processed}, записано баллов черт: {written}'
+        ))
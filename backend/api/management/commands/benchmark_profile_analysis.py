@@ -0,0 +1,114 @@
+from collections import defaultdict
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import utils
+from api.utils import calculate_correlation, correlations_from_moments, np, pair_moments_from_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает прежний попарный расчёт корреляций черт динамического профиля с текущим '
+        '(ко-моменты пар: pair_moments_from_scores + correlations_from_moments) без numpy и с numpy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--traits', type=int, nargs='+', default=[10, 50, 200], help='Числа различных черт')
+        parser.add_argument('--tests', type=int, default=40, help='Различных тестов у пользователя')
+        parser.add_argument('--results', type=int, default=300, help='Результатов у пользователя')
+        parser.add_argument('--repeat', type=int, default=3, help='Повторов каждого замера')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('numpy не установлен')
+        rng = random.Random(options['seed'])
+        for n_traits in options['traits']:
+            results = self._synthetic(rng, n_traits, options['tests'], options['results'])
+            test_scores = defaultdict(dict)
+            for result in results:
+                test_scores[result.test.id].update(result.score)
+
+            timings = {}
+            outputs = {}
+            for label, func in (
+                ('попарно', self._legacy),
+                ('ко-моменты', self._moments_python),
+                ('numpy', self._moments),
+            ):
+                source = results if label == 'попарно' else test_scores
+                best = None
+                for _ in range(max(1, options['repeat'])):
+                    start = time.perf_counter()
+                    outputs[label] = func(source)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                timings[label] = best
+
+            reference = outputs['попарно']
+            for label, output in outputs.items():
+                if output != reference:
+                    raise CommandError(f'{n_traits} черт: результат "{label}" расходится с попарным расчётом')
+
+            self.stdout.write(
+                f'Черт: {n_traits:>4}, тестов: {len(test_scores)}, значимых корреляций: {len(reference)}'
+            )
+            for label, elapsed in timings.items():
+                self.stdout.write(
+                    f'  {label:>10}: {elapsed * 1000:9.2f} мс (x{timings["попарно"] / elapsed:.1f})'
+                )
+        self.stdout.write(self.style.SUCCESS('Результаты совпадают'))
+
+    @staticmethod
+    def _significant(rows):
+        return sorted(
+            (t1, t2, round(r, 3)) if t1 < t2 else (t2, t1, round(r, 3))
+            for t1, t2, r in rows if abs(r) > 0.3
+        )
+
+    def _legacy(self, results):
+        """Прежний алгоритм analyze_user_patterns: calculate_correlation для каждой пары"""
+        all_traits = set()
+        trait_scores_by_test = defaultdict(dict)
+        for result in results:
+            all_traits.update(result.score.keys())
+            for trait, score in result.score.items():
+                trait_scores_by_test[result.test.id][trait] = score
+        trait_list = list(all_traits)
+        rows = []
+        for i, trait1 in enumerate(trait_list):
+            for trait2 in trait_list[i+1:]:
+                rows.append((trait1, trait2, calculate_correlation(trait_scores_by_test, trait1, trait2)))
+        return self._significant(rows)
+
+    def _moments(self, test_scores):
+        return self._significant(correlations_from_moments(pair_moments_from_scores(test_scores)))
+
+    def _moments_python(self, test_scores):
+        """Тот же путь профиля, что и _moments, но без numpy (как при неустановленном numpy)"""
+        utils.np = None
+        try:
+            return self._moments(test_scores)
+        finally:
+            utils.np = np
+
+    @staticmethod
+    def _synthetic(rng, n_traits, n_tests, n_results):
+        """Тесты с пересекающимися наборами черт и коррелированными баллами"""
+        traits = [f'trait_{i}' for i in range(n_traits)]
+        tests = []
+        for test_id in range(1, n_tests + 1):
+            size = max(2, min(n_traits, rng.randint(n_traits // 4 or 2, n_traits // 2 or 2)))
+            tests.append((SimpleNamespace(id=test_id, name=f'Test {test_id}'), rng.sample(traits, size)))
+        start = datetime(2025, 1, 1)
+        results = []
+        for i in range(n_results):
+            test, test_traits = rng.choice(tests)
+            base = rng.randint(0, 100)
+            score = {t: max(0, min(100, base + rng.randint(-40, 40))) for t in test_traits}
+            results.append(SimpleNamespace(test=test, score=score, completed_at=start + timedelta(hours=i)))
+        return results
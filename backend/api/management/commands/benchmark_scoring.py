@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+import random
+import time
+
+from api.models import Test
+from api.scoring import ScoringPlan, VectorScoringPlan, np
+from api.scoring_cache import build_scoring_plan
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость и результаты python- и numpy-подсчёта баллов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test-id', type=int, help='ID теста из БД (иначе синтетический тест)')
+        parser.add_argument('--questions', type=int, default=120, help='Вопросов в синтетическом тесте')
+        parser.add_argument('--traits', type=int, default=6, help='Черт в синтетическом тесте')
+        parser.add_argument('--submissions', type=int, default=2000, help='Количество наборов ответов')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('numpy не установлен')
+
+        rng = random.Random(options['seed'])
+        if options.get('test_id'):
+            try:
+                test = Test.objects.get(id=options['test_id'])
+            except Test.DoesNotExist:
+                raise CommandError(f'Тест не найден: {options["test_id"]}')
+            base = build_scoring_plan(test)
+            args = (test.id, base.version, test.name, test.result_definitions)
+            rows = [(a, int(q), o, v, t) for a, (q, o, t, v) in base.answers.items()]
+            question_ids = [int(q) for q in base.question_max]
+        else:
+            args = (0, 0, 'Synthetic', {})
+            rows, question_ids = self._synthetic(options['questions'], options['traits'])
+
+        python_plan = ScoringPlan(*args, rows, question_ids)
+        vector_plan = VectorScoringPlan(*args, rows, question_ids)
+
+        by_question = {}
+        for answer_id, (qid, _, _, _) in python_plan.answers.items():
+            by_question.setdefault(qid, []).append(answer_id)
+        submissions = [
+            {qid: rng.choice(ids) for qid, ids in by_question.items()}
+            for _ in range(options['submissions'])
+        ]
+
+        for answers in submissions:
+            if python_plan.score(answers) != vector_plan.score(answers):
+                raise CommandError(f'Результаты расходятся для ответов: {answers}')
+
+        self.stdout.write(f'Вопросов: {python_plan.question_count}, ответов: {len(rows)}, '
+                          f'наборов: {len(submissions)}')
+        timings = {}
+        for label, plan in (('python', python_plan), ('numpy', vector_plan)):
+            start = time.perf_counter()
+            for answers in submissions:
+                plan.score(answers)
+            elapsed = time.perf_counter() - start
+            timings[label] = elapsed
+            self.stdout.write(f'{label:>6}: {elapsed * 1e6 / len(submissions):8.1f} мкс/набор')
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты совпадают. Ускорение numpy: x{timings["python"] / timings["numpy"]:.2f}'
+        ))
+
+    def _synthetic(self, n_questions, n_traits):
+        rows = []
+        answer_id = 0
+        for q in range(1, n_questions + 1):
+            trait = f'trait_{q % n_traits}'
+            reverse = q % 4 == 0
+            for v in range(1, 6):
+                answer_id += 1
+                rows.append((answer_id, q, q, 6 - v if reverse else v, trait))
+        return rows, list(range(1, n_questions + 1))
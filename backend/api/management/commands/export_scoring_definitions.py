@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+import json
+
+from api.models import Test
+from api.scoring import DimensionScheme, ScoringConfigError
+from api.scoring_cache import scoring_definition
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает определения тестов для подсчёта баллов вне приложения (python -m api.scoring_cli). '
+        'Ответы из других тестов учитываются, только если эти тесты тоже выгружены; '
+        'иначе строка результата получает warning.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test-id', type=int, action='append', help='ID теста (можно несколько; по умолчанию все)')
+        parser.add_argument('--output', type=str, required=True, help='Путь к JSON файлу')
+
+    def handle(self, *args, **options):
+        tests = Test.objects.all().order_by('id')
+        if options.get('test_id'):
+            tests = tests.filter(id__in=options['test_id'])
+
+        definitions = []
+        for test in tests:
+            definition = scoring_definition(test)
+            try:
+                DimensionScheme.compile(
+                    definition['result_definitions'], {q['order'] for q in definition['questions'] if q['answers']}
+                )
+            except ScoringConfigError as e:
+                self.stdout.write(self.style.WARNING(f'Пропуск "{test.name}": {e}'))
+                continue
+            definitions.append(definition)
+
+        if not definitions:
+            raise CommandError('Нет тестов для выгрузки')
+
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(definitions, f, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f'Выгружено тестов: {len(definitions)} -> {options["output"]}'))
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import time
+
+from api.ingestion import flush_pending_results, pending_count, purge_flushed_results
+
+
+class Command(BaseCommand):
+    help = 'Переносит буферизованные результаты тестов в TestResult пачками (каждые N мс или M строк).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval-ms', type=int, default=getattr(settings, 'RESULT_BUFFER_FLUSH_INTERVAL_MS', 500),
+                            help='Максимальная задержка переноса, мс')
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'RESULT_BUFFER_FLUSH_SIZE', 500),
+                            help='Перенос без ожидания, когда накопилось столько строк')
+        parser.add_argument('--once', action='store_true', help='Перенести всё накопленное и завершиться')
+
+    def handle(self, *args, **options):
+        interval = max(1, options['interval_ms']) / 1000
+        batch_size = max(1, options['batch_size'])
+
+        if options['once']:
+            total = 0
+            while True:
+                flushed = flush_pending_results(batch_size)
+                if not flushed:
+                    break
+                total += flushed
+            purged = purge_flushed_results()
+            self.stdout.write(self.style.SUCCESS(f'Перенесено: {total}, удалено старых строк буфера: {purged}'))
+            return
+
+        self.stdout.write(f'Перенос буфера: каждые {options["interval_ms"]} мс или {batch_size} строк')
+        poll = min(interval, 0.05)
+        last_flush = time.monotonic()
+        last_purge = last_flush
+        while True:
+            now = time.monotonic()
+            due = now - last_flush >= interval
+            if due or pending_count(batch_size) >= batch_size:
+                flushed = flush_pending_results(batch_size)
+                last_flush = now
+                if flushed:
+                    self.stdout.write(f'Перенесено: {flushed}')
+                    # Если буфер заполнен — продолжаем без паузы
+                    if flushed >= batch_size:
+                        continue
+            if now - last_purge >= 3600:
+                purge_flushed_results()
+                last_purge = now
+            time.sleep(poll)
@@ -5,6 +5,8 @@ import json
 import os
 
 from api.models import Test, Question, Answer
+from api.scoring import DimensionScheme, ScoringConfigError
+from api.scoring_cache import build_scoring_plan
 
 
 class Command(BaseCommand):
@@ -53,6 +55,17 @@ class Command(BaseCommand):
                 skipped += 1
                 continue
 
+            # Схема подсчёта проверяется до записи: некорректный тест не импортируется
+            try:
+                DimensionScheme.compile(
+                    {key: t.get(key) for key in ['scoring', 'graph'] if t.get(key) is not None},
+                    range(1, len(t.get('questions') or []) + 1)
+                )
+            except ScoringConfigError as e:
+                self.stdout.write(self.style.ERROR(f'Некорректная схема подсчёта в "{name}": {e}'))
+                skipped += 1
+                continue
+
             try:
                 with transaction.atomic():
                     if force:
@@ -156,8 +169,14 @@ class Command(BaseCommand):
                                 is_correct=bool(a.get('is_correct', False))
                             )
 
+                    # Полный план по записанным вопросам и ответам; ошибка откатывает импорт теста
+                    build_scoring_plan(test_obj)
+
                     imported += 1
                     self.stdout.write(self.style.SUCCESS(f'Импортирован: {name} (вопросов: {len(questions)})'))
+            except ScoringConfigError as e:
+                self.stdout.write(self.style.ERROR(f'Некорректная схема подсчёта в "{name}": {e}'))
+                skipped += 1
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f'Ошибка при импорте "{name}": {e}'))
                 skipped += 1
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import time
+
+from api.profile_queue import process_profile_queue, profile_queue_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает динамические профили из очереди (PROFILE_RECOMPUTE_MODE = "queued").'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval-ms', type=int, default=getattr(settings, 'PROFILE_RECOMPUTE_INTERVAL_MS', 1000),
+                            help='Пауза между опросами пустой очереди, мс')
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'PROFILE_RECOMPUTE_BATCH_SIZE', 100),
+                            help='Заданий за один проход')
+        parser.add_argument('--once', action='store_true', help='Выполнить все готовые задания и завершиться')
+        parser.add_argument('--stats', action='store_true', help='Показать глубину очереди и лаг и завершиться')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+
+        if options['stats']:
+            for key, value in profile_queue_stats().items():
+                self.stdout.write(f'{key}: {value}')
+            return
+
+        if options['once']:
+            total_done = total_failed = 0
+            while True:
+                done, failed = process_profile_queue(batch_size)
+                total_done += done
+                total_failed += failed
+                # Задания с ошибкой ждут повтора — не крутимся на них
+                if done + failed < batch_size or not done:
+                    break
+            stats = profile_queue_stats()
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересчитано профилей: {total_done}, с ошибкой: {total_failed}, '
+                f'в очереди: {stats["depth"]}, лаг: {stats["lag_seconds"]} с'
+            ))
+            return
+
+        interval = max(1, options['interval_ms']) / 1000
+        self.stdout.write(f'Очередь пересчёта профилей: по {batch_size} заданий, опрос каждые {options["interval_ms"]} мс')
+        while True:
+            done, failed = process_profile_queue(batch_size)
+            if done or failed:
+                self.stdout.write(f'Пересчитано: {done}, с ошибкой: {failed}')
+            # Полная пачка — продолжаем без паузы
+            if done + failed < batch_size:
+                time.sleep(interval)
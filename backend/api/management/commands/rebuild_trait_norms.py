@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.norms import rebuild_trait_norms
+from api.trait_scores import missing_trait_scores, rebuild_trait_scores
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает популяционные нормы черт (TraitNormBucket) по всей истории результатов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test-id', action='append', type=int, dest='test_ids',
+                            help='ID теста (можно указать несколько раз); по умолчанию — все')
+
+    def handle(self, *args, **options):
+        test_ids = options['test_ids']
+        # Нормы строятся по TraitScore — сначала дозаполняем баллы старых результатов
+        missing = missing_trait_scores()
+        if test_ids:
+            missing = missing.filter(test_id__in=test_ids)
+        processed, _ = rebuild_trait_scores(missing)
+        if processed:
+            self.stdout.write(f'Заполнены баллы черт результатов: {processed}')
+
+        count = rebuild_trait_norms(test_ids)
+        self.stdout.write(self.style.SUCCESS(f'Нормы пересобраны для пар (тест, черта): {count}'))
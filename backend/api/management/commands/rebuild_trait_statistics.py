@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from api.models import UserProfile
+from api.trait_stats import refresh_profile_statistics, reset_profile_statistics
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает накопленную статистику черт пользователей по всей истории результатов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', type=int, dest='user_ids',
+                            help='ID пользователя (можно указать несколько раз); по умолчанию — все с результатами')
+        parser.add_argument('--update-profiles', action='store_true',
+                            help='Сразу пересчитать и динамические профили')
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.select_related('user')
+        if options['user_ids']:
+            profiles = profiles.filter(user_id__in=options['user_ids'])
+        else:
+            profiles = profiles.filter(user__test_results__isnull=False).distinct()
+
+        count = 0
+        for profile in profiles.iterator():
+            reset_profile_statistics([profile.user_id])
+            profile.refresh_from_db()
+            if options['update_profiles']:
+                profile.update_dynamic_profile()
+            else:
+                refresh_profile_statistics(profile)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Статистика черт пересобрана для пользователей: {count}'))
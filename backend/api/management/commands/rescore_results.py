@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+import os
+
+from api.models import Test
+from api.rescoring import rescore_test_results
+from api.scoring import ScoringConfigError
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённые результаты теста по текущей схеме подсчёта.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test-id', type=int, required=True, help='ID теста')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Размер пачки результатов')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Количество процессов для подсчёта')
+        parser.add_argument('--dry-run', action='store_true', help='Только статистика расхождений, без записи')
+        parser.add_argument('--checkpoint', type=str, help='Файл контрольной точки для возобновления')
+        parser.add_argument('--skip-profiles', action='store_true', help='Не пересчитывать динамические профили пользователей')
+
+    def handle(self, *args, **options):
+        try:
+            test = Test.objects.get(id=options['test_id'])
+        except Test.DoesNotExist:
+            raise CommandError(f'Тест не найден: {options["test_id"]}')
+
+        self.stdout.write(f'Пересчёт результатов теста "{test.name}"' + (' (dry-run)' if options['dry_run'] else ''))
+        try:
+            stats = rescore_test_results(
+                test,
+                chunk_size=max(1, options['chunk_size']),
+                workers=options['workers'],
+                dry_run=options['dry_run'],
+                checkpoint=options.get('checkpoint'),
+                update_profiles=not options['skip_profiles'],
+                log=self.stdout.write,
+            )
+        except (ScoringConfigError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for line in stats.summary_lines():
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS('Готово' if not options['dry_run'] else 'Готово (изменения не записаны)'))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_question_dimension_test_result_definitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='scoring_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия схемы подсчёта'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0007_test_scoring_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingTestResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answers', models.JSONField(default=dict, verbose_name='Ответы')),
+                ('personality_map', models.JSONField(default=dict, verbose_name='Карта личности')),
+                ('score', models.JSONField(default=dict, verbose_name='Баллы по чертам')),
+                ('response_time', models.JSONField(default=dict, verbose_name='Время ответов')),
+                ('metadata', models.JSONField(default=dict, verbose_name='Дополнительные метаданные')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата отправки')),
+                ('flushed_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата переноса')),
+                ('result', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pending', to='api.testresult', verbose_name='Сохранённый результат')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.test', verbose_name='Тест')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_test_results', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Результат в буфере',
+                'verbose_name_plural': 'Результаты в буфере',
+                'indexes': [models.Index(fields=['flushed_at', 'id'], name='api_pending_flushed_64603f_idx')],
+            },
+        ),
+    ]
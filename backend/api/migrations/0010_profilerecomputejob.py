@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0009_submissionidempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileRecomputeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_count', models.PositiveIntegerField(default=1, verbose_name='Запросов пересчёта')),
+                ('processed_count', models.PositiveIntegerField(default=0, verbose_name='Учтено запросов')),
+                ('first_requested_at', models.DateTimeField(verbose_name='Первый необработанный запрос')),
+                ('requested_at', models.DateTimeField(verbose_name='Последний запрос')),
+                ('available_at', models.DateTimeField(verbose_name='Не раньше')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Взято в работу')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Неудачных попыток')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Последняя ошибка')),
+                ('failed_at', models.DateTimeField(blank=True, null=True, verbose_name='Попытки исчерпаны')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile_recompute_job', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Пересчёт профиля в очереди',
+                'verbose_name_plural': 'Очередь пересчёта профилей',
+                'indexes': [models.Index(fields=['failed_at', 'available_at'], name='api_profile_failed__1b8de3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0010_profilerecomputejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='trait_stats_last_result',
+            field=models.PositiveIntegerField(default=0, verbose_name='Последний учтённый результат'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='trait_stats_results',
+            field=models.PositiveIntegerField(default=0, verbose_name='Учтено результатов'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='trait_stats_tests',
+            field=models.JSONField(default=dict, verbose_name='Последние баллы черт по тестам'),
+        ),
+        migrations.CreateModel(
+            name='TraitStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('trait', 'Ключ черты'), ('display', 'Отображаемое имя черты'), ('confidence', 'Уровень уверенности')], max_length=20, verbose_name='Вид')),
+                ('trait', models.CharField(max_length=255, verbose_name='Черта')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('total', models.FloatField(default=0, verbose_name='Сумма')),
+                ('mean', models.FloatField(default=0, verbose_name='Среднее')),
+                ('m2', models.FloatField(default=0, verbose_name='Сумма квадратов отклонений')),
+                ('first_score', models.FloatField(blank=True, null=True, verbose_name='Первый балл')),
+                ('last_score', models.FloatField(blank=True, null=True, verbose_name='Последний балл')),
+                ('history', models.JSONField(default=list, verbose_name='История')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trait_statistics', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Статистика черты',
+                'verbose_name_plural': 'Статистика черт',
+                'unique_together': {('user', 'kind', 'trait')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TraitPairStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trait1', models.CharField(max_length=255, verbose_name='Черта 1')),
+                ('trait2', models.CharField(max_length=255, verbose_name='Черта 2')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+                ('sum_x', models.FloatField(default=0)),
+                ('sum_y', models.FloatField(default=0)),
+                ('sum_xy', models.FloatField(default=0)),
+                ('sum_xx', models.FloatField(default=0)),
+                ('sum_yy', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trait_pair_statistics', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Статистика пары черт',
+                'verbose_name_plural': 'Статистика пар черт',
+                'unique_together': {('user', 'trait1', 'trait2')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_trait_statistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='dynamic_profile_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия динамического профиля'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+def reset_trait_statistics(apps, schema_editor):
+    # История в старом формате (список точек) пересобирается при следующем обновлении профиля
+    UserProfile = apps.get_model('api', 'UserProfile')
+    UserProfile.objects.update(trait_stats_last_result=0, trait_stats_results=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_userprofile_dynamic_profile_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='traitstatistic',
+            name='history',
+            field=models.JSONField(default=dict, verbose_name='История'),
+        ),
+        migrations.RunPython(reset_trait_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_traitstatistic_bounded_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='dynamic_profile_last_result',
+            field=models.PositiveIntegerField(default=0, verbose_name='Последний результат в профиле'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='dynamic_profile_results',
+            field=models.PositiveIntegerField(default=0, verbose_name='Результатов в профиле'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:20
+
+from django.db import migrations, models
+
+
+def mark_profiles_stale(apps, schema_editor):
+    # Сохранённые профили собраны до появления счётчика — пересоберутся при первом чтении
+    UserProfile = apps.get_model('api', 'UserProfile')
+    UserProfile.objects.update(results_version=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_userprofile_dynamic_profile_watermark'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='dynamic_profile_last_result',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='dynamic_profile_results',
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='dynamic_profile_results_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия результатов в профиле'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='results_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия результатов'),
+        ),
+        migrations.RunPython(mark_profiles_stale, migrations.RunPython.noop),
+    ]
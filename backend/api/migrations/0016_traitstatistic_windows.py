@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:50
+
+from django.db import migrations, models
+
+
+def reset_trait_statistics(apps, schema_editor):
+    # Окна заполняются при пересборке статистики; профили тоже пересобираются
+    UserProfile = apps.get_model('api', 'UserProfile')
+    UserProfile.objects.update(
+        trait_stats_last_result=0, trait_stats_results=0, results_version=models.F('results_version') + 1
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_userprofile_results_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='traitstatistic',
+            name='windows',
+            field=models.JSONField(default=dict, verbose_name='Скользящие окна'),
+        ),
+        migrations.RunPython(reset_trait_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_traitstatistic_windows'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='dynamic_profile_changes',
+            field=models.JSONField(default=list, verbose_name='Изменения динамического профиля'),
+        ),
+    ]
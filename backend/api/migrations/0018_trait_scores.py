@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0017_userprofile_dynamic_profile_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trait',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Ключ черты')),
+            ],
+            options={
+                'verbose_name': 'Черта',
+                'verbose_name_plural': 'Черты',
+            },
+        ),
+        migrations.CreateModel(
+            name='TraitScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('raw', models.FloatField(blank=True, null=True, verbose_name='Сырой балл')),
+                ('normalized', models.FloatField(verbose_name='Балл')),
+                ('completed_at', models.DateTimeField(verbose_name='Дата завершения')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trait_scores', to='api.testresult', verbose_name='Результат')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trait_scores', to='api.test', verbose_name='Тест')),
+                ('trait', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='scores', to='api.trait', verbose_name='Черта')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trait_scores', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Балл черты',
+                'verbose_name_plural': 'Баллы черт',
+                'indexes': [models.Index(fields=['user', 'trait'], name='api_traitsc_user_id_e3fde9_idx'), models.Index(fields=['test', 'trait'], name='api_traitsc_test_id_416a8a_idx')],
+                'unique_together': {('result', 'trait')},
+            },
+        ),
+    ]
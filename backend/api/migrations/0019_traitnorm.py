@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_trait_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TraitNorm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество результатов')),
+                ('histogram', models.JSONField(default=dict, verbose_name='Гистограмма')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trait_norms', to='api.test', verbose_name='Тест')),
+                ('trait', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='norms', to='api.trait', verbose_name='Черта')),
+            ],
+            options={
+                'verbose_name': 'Норма черты',
+                'verbose_name_plural': 'Нормы черт',
+                'unique_together': {('test', 'trait')},
+            },
+        ),
+    ]
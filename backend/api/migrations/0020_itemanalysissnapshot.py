@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_traitnorm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemAnalysisSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scoring_version', models.PositiveIntegerField(default=0, verbose_name='Версия схемы подсчёта')),
+                ('result_count', models.PositiveIntegerField(default=0, verbose_name='Количество результатов')),
+                ('last_result', models.PositiveIntegerField(default=0, verbose_name='Последний учтённый результат')),
+                ('data', models.JSONField(default=dict, verbose_name='Анализ заданий')),
+                ('computed_at', models.DateTimeField(verbose_name='Дата расчёта')),
+                ('test', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='item_analysis', to='api.test', verbose_name='Тест')),
+            ],
+            options={
+                'verbose_name': 'Анализ заданий теста',
+                'verbose_name_plural': 'Анализ заданий тестов',
+            },
+        ),
+    ]
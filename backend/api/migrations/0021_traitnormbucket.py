@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def histograms_to_buckets(apps, schema_editor):
+    TraitNorm = apps.get_model('api', 'TraitNorm')
+    TraitNormBucket = apps.get_model('api', 'TraitNormBucket')
+    buckets = []
+    for norm in TraitNorm.objects.iterator():
+        histogram = norm.histogram if isinstance(norm.histogram, dict) else {}
+        for value, count in zip(histogram.get('values', []), histogram.get('counts', [])):
+            if count > 0:
+                buckets.append(TraitNormBucket(test_id=norm.test_id, trait_id=norm.trait_id, value=value, count=count))
+    TraitNormBucket.objects.bulk_create(buckets, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_itemanalysissnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TraitNormBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.FloatField(verbose_name='Балл')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество результатов')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trait_norm_buckets', to='api.test', verbose_name='Тест')),
+                ('trait', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='norm_buckets', to='api.trait', verbose_name='Черта')),
+            ],
+            options={
+                'verbose_name': 'Корзина нормы черты',
+                'verbose_name_plural': 'Корзины норм черт',
+                'unique_together': {('test', 'trait', 'value')},
+            },
+        ),
+        migrations.RunPython(histograms_to_buckets, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='TraitNorm',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_traitnormbucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='dynamic_profile_claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Сборка профиля начата'),
+        ),
+    ]
@@ -1,8 +1,29 @@
+from copy import deepcopy
+from datetime import timedelta
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import JSONField
+from django.utils import timezone
 import json
 
+from .scoring import DimensionScheme, ScoringConfigError
+
+
+def validate_scoring_config(result_definitions, question_orders, field='result_definitions'):
+    """
+    Проверяет схему подсчёта так же, как её соберёт ScoringPlan: некорректная
+    схема отклоняется при сохранении, а не при отправке ответов.
+    question_orders — номера вопросов с вариантами ответа (пусто — не проверять).
+    """
+    try:
+        DimensionScheme.compile(result_definitions, question_orders or None)
+    except ScoringConfigError as e:
+        raise ValidationError({field: f'Некорректная схема подсчёта: {e}'})
+
 
 class Test(models.Model):
     name = models.CharField(max_length=200, verbose_name="Название теста")
@@ -19,6 +40,8 @@ class Test(models.Model):
     image_url = models.URLField(blank=True, null=True, verbose_name="URL изображения теста")
     # Полные определения результатов (например, MBTI типы, описания, советы)
     result_definitions = models.JSONField(default=dict, verbose_name="Определения результатов", blank=True)
+    # Версия схемы подсчёта: увеличивается при любом изменении теста, вопросов или ответов
+    scoring_version = models.PositiveIntegerField(default=0, editable=False, verbose_name="Версия схемы подсчёта")
     
     
     class Meta:
@@ -29,6 +52,53 @@ class Test(models.Model):
     def __str__(self):
         return self.name
 
+    # Поля теста, от которых зависит план подсчёта (имена черт берутся из названия теста)
+    SCORING_FIELDS = ('name', 'result_definitions')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_scoring_fields()
+        return instance
+
+    def remember_scoring_fields(self):
+        """Запоминает поля подсчёта (копией: JSON могут изменить на месте)"""
+        self._loaded_scoring_fields = deepcopy({
+            field: self.__dict__[field] for field in self.SCORING_FIELDS if field in self.__dict__
+        })
+
+    def scoring_fields_changed(self, update_fields=None):
+        """Изменились ли с загрузки поля, влияющие на подсчёт (без запросов к БД)"""
+        if update_fields is not None and not set(self.SCORING_FIELDS) & set(update_fields):
+            return False
+        loaded = getattr(self, '_loaded_scoring_fields', None)
+        if loaded is None or len(loaded) != len(self.SCORING_FIELDS):
+            # Объект создан не из БД или загружен без этих полей — считаем изменённым
+            return True
+        return any(loaded[field] != getattr(self, field) for field in self.SCORING_FIELDS)
+
+    def scoring_question_orders(self, exclude_question=None):
+        """Номера вопросов теста, у которых есть варианты ответа (их видит ScoringPlan)"""
+        if self.pk is None:
+            return set()
+        answers = Answer.objects.filter(question__test_id=self.pk)
+        if exclude_question is not None:
+            answers = answers.exclude(question_id=exclude_question)
+        return set(answers.values_list('question__order', flat=True))
+
+    def clean(self):
+        super().clean()
+        validate_scoring_config(self.result_definitions, self.scoring_question_orders())
+
+    def save(self, *args, **kwargs):
+        # scoring_version увеличивается только в БД (bump_scoring_version); полное сохранение
+        # загруженного теста не должно возвращать старое значение из объекта
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != 'scoring_version'
+            ]
+        super().save(*args, **kwargs)
+
 
 class PsyToolkitTest(models.Model):
     """Модель для хранения информации о тестах из PsyToolkit"""
@@ -75,6 +145,16 @@ class Question(models.Model):
     def __str__(self):
         return f"{self.test.name} - Вопрос {self.order}"
 
+    def clean(self):
+        """Новый номер вопроса не должен ломать схему измерений теста"""
+        super().clean()
+        if self.test_id is None:
+            return
+        orders = self.test.scoring_question_orders(exclude_question=self.pk)
+        if self.pk is not None and self.answers.exists():
+            orders.add(self.order)
+        validate_scoring_config(self.test.result_definitions, orders, field='order')
+
 
 class Answer(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='answers', verbose_name="Вопрос")
@@ -93,6 +173,15 @@ class Answer(models.Model):
         return f"{self.question.text[:50]} - {self.text}"
 
 
+# Поля, которые пишет сборка динамического профиля
+DYNAMIC_PROFILE_FIELDS = (
+    'dynamic_profile', 'dynamic_profile_version', 'results_version',
+    'dynamic_profile_results_version', 'dynamic_profile_changes', 'updated_at'
+)
+# Сколько раз пересобирать профиль, если параллельно записана более старая сборка
+DYNAMIC_PROFILE_WRITE_ATTEMPTS = 3
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile', verbose_name="Пользователь")
     created_at = models.DateTimeField(auto_now_add=True)
@@ -100,9 +189,23 @@ class UserProfile(models.Model):
     # Новые поля для динамического профиля
     history = models.JSONField(default=list, verbose_name="История тестов")
     dynamic_profile = models.JSONField(default=dict, verbose_name="Динамический профиль")
+    # Номер сборки dynamic_profile (0 — ещё не собирался); основа ETag
+    dynamic_profile_version = models.PositiveIntegerField(default=0, verbose_name="Версия динамического профиля")
+    # Журнал изменений последних версий профиля (api.profile_changes)
+    dynamic_profile_changes = models.JSONField(default=list, verbose_name="Изменения динамического профиля")
     # Новые поля для PsyToolkit
     psy_toolkit_preferences = models.JSONField(default=dict, verbose_name="Предпочтения PsyToolkit")
     completed_psy_toolkit_tests = models.JSONField(default=list, verbose_name="Завершенные PsyToolkit тесты")
+    # Состояние накопленной статистики черт (TraitStatistic, TraitPairStatistic)
+    trait_stats_last_result = models.PositiveIntegerField(default=0, verbose_name="Последний учтённый результат")
+    trait_stats_results = models.PositiveIntegerField(default=0, verbose_name="Учтено результатов")
+    trait_stats_tests = models.JSONField(default=dict, verbose_name="Последние баллы черт по тестам")
+    # Счётчик изменений результатов пользователя (запись только увеличивает его)
+    # и его значение, по которому собран dynamic_profile
+    results_version = models.PositiveIntegerField(default=0, verbose_name="Версия результатов")
+    dynamic_profile_results_version = models.PositiveIntegerField(default=0, verbose_name="Версия результатов в профиле")
+    # Когда запрос взялся собирать устаревший профиль (None — никто не собирает)
+    dynamic_profile_claimed_at = models.DateTimeField(null=True, blank=True, verbose_name="Сборка профиля начата")
 
     class Meta:
         verbose_name = "Профиль пользователя"
@@ -111,31 +214,121 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"Профиль {self.user.username}"
 
+    def result_watermark(self):
+        """(id последнего результата, число результатов) пользователя — один запрос"""
+        state = TestResult.objects.filter(user_id=self.user_id).aggregate(last=models.Max('id'), count=models.Count('id'))
+        return state['last'] or 0, state['count']
+
+    def dynamic_profile_is_stale(self):
+        """Есть ли изменения результатов, не учтённые в сохранённом dynamic_profile (без запросов)"""
+        return not self.dynamic_profile_version or self.results_version != self.dynamic_profile_results_version
+
+    def stored_profile_is_current(self):
+        """Собран ли профиль в БД по последней версии результатов (один запрос)"""
+        version, results_version, built_from = UserProfile.objects.filter(pk=self.pk).values_list(
+            'dynamic_profile_version', 'results_version', 'dynamic_profile_results_version'
+        ).get()
+        return bool(version) and results_version == built_from
+
+    def ensure_dynamic_profile(self):
+        """
+        Собирает dynamic_profile, если он устарел. Сборку забирает один запрос —
+        условным UPDATE поля dynamic_profile_claimed_at (работает и там, где
+        select_for_update() ничего не блокирует, например в SQLite); остальные
+        читатели ждут до DYNAMIC_PROFILE_BUILD_WAIT секунд и берут готовый
+        профиль, а не дождавшись — собирают сами (запись профиля всё равно
+        сравнение-с-обменом). Забытая упавшим процессом сборка считается
+        брошенной через DYNAMIC_PROFILE_CLAIM_STALE_SECONDS секунд.
+        Возвращает True, если профиль был пересобран.
+        """
+        if not self.dynamic_profile_is_stale():
+            return False
+        stale = timedelta(seconds=getattr(settings, 'DYNAMIC_PROFILE_CLAIM_STALE_SECONDS', 60))
+        deadline = time.monotonic() + getattr(settings, 'DYNAMIC_PROFILE_BUILD_WAIT', 5)
+        while True:
+            now = timezone.now()
+            claimed = UserProfile.objects.filter(pk=self.pk).filter(
+                models.Q(dynamic_profile_claimed_at__isnull=True) | models.Q(dynamic_profile_claimed_at__lt=now - stale)
+            ).update(dynamic_profile_claimed_at=now)
+            if claimed:
+                try:
+                    if self.stored_profile_is_current():
+                        # Профиль собрал другой запрос, пока мы ждали
+                        self.refresh_from_db(fields=DYNAMIC_PROFILE_FIELDS)
+                        return False
+                    return self.update_dynamic_profile()
+                finally:
+                    UserProfile.objects.filter(pk=self.pk, dynamic_profile_claimed_at=now).update(
+                        dynamic_profile_claimed_at=None
+                    )
+            if self.stored_profile_is_current():
+                self.refresh_from_db(fields=DYNAMIC_PROFILE_FIELDS)
+                return False
+            if time.monotonic() >= deadline:
+                return self.update_dynamic_profile()
+            time.sleep(0.05)
+
     def update_dynamic_profile(self):
-        """Обновляет динамический профиль на основе всех результатов тестов"""
-        from .utils import analyze_user_patterns, generate_dynamic_personality_map
-        
-        # Оптимизированный запрос: получаем все результаты с связанными тестами
-        test_results = TestResult.objects.filter(user=self.user).select_related('test').order_by('completed_at')
+        """
+        Пересобирает динамический профиль по накопленной статистике черт.
+
+        Запись — сравнение-с-обменом по dynamic_profile_version и только полей
+        профиля. Если версию успел сменить другой процесс и его сборка учитывает
+        не меньше изменений результатов, наша сборка отбрасывается (объект
+        перечитывается); иначе сборка повторяется. Возвращает True, если
+        записана эта сборка.
+        """
+        from .profile_changes import append_profile_change, diff_profiles
+        from .trait_stats import refresh_profile_statistics
+        from .utils import dynamic_map_from_statistics, patterns_from_statistics
         
-        if not test_results.exists():
-            self.dynamic_profile = {
-                'traits': {},
-                'connections': [],
-                'inconsistencies': [],
-                'patterns': [],
-                'overall_score': 0,
-                'last_updated': None
+        for attempt in range(DYNAMIC_PROFILE_WRITE_ATTEMPTS):
+            # Версия результатов читается до статистики: изменения во время сборки оставят профиль устаревшим
+            results_version, previous, version, changes = UserProfile.objects.filter(pk=self.pk).values_list(
+                'results_version', 'dynamic_profile', 'dynamic_profile_version', 'dynamic_profile_changes'
+            ).get()
+            # Учитываем только результаты, добавленные после прошлого обновления
+            stats = refresh_profile_statistics(self)
+            
+            if not stats.results:
+                dynamic_profile = {
+                    'traits': {},
+                    'connections': [],
+                    'inconsistencies': [],
+                    'patterns': [],
+                    'overall_score': 0,
+                    'last_updated': None
+                }
+            else:
+                # Анализируем паттерны и генерируем динамическую карту
+                patterns = patterns_from_statistics(stats)
+                dynamic_profile = dynamic_map_from_statistics(stats, patterns)
+            
+            fields = {
+                'dynamic_profile': dynamic_profile,
+                'dynamic_profile_version': version + 1,
+                'dynamic_profile_results_version': results_version,
+                'dynamic_profile_changes': append_profile_change(
+                    changes, diff_profiles(previous, dynamic_profile, version + 1)
+                ),
+                'updated_at': timezone.now(),
             }
-            self.save()
-            return
-        
-        # Анализируем паттерны и генерируем динамическую карту
-        patterns = analyze_user_patterns(test_results)
-        dynamic_map = generate_dynamic_personality_map(test_results, patterns)
+            # Счётчик results_version не перезаписываем: его увеличивают параллельные записи
+            if UserProfile.objects.filter(pk=self.pk, dynamic_profile_version=version).update(**fields):
+                for field, value in fields.items():
+                    setattr(self, field, value)
+                self.results_version = results_version
+                return True
+            
+            built_from = UserProfile.objects.filter(pk=self.pk).values_list(
+                'dynamic_profile_results_version', flat=True
+            ).get()
+            if built_from >= results_version:
+                # Записанная сборка не старше нашей — берём её
+                break
         
-        self.dynamic_profile = dynamic_map
-        self.save()
+        self.refresh_from_db(fields=DYNAMIC_PROFILE_FIELDS)
+        return False
 
 
 class TestResult(models.Model):
@@ -172,14 +365,271 @@ class TestResult(models.Model):
         scores = self.score if isinstance(self.score, dict) else {}
         return scores.get(trait, 0)
 
+    # Поля, от которых зависят TraitScore, нормы и статистика профиля
+    PROFILE_FIELDS = ('user_id', 'test_id', 'score', 'personality_map', 'completed_at')
+
     def save(self, *args, **kwargs):
-        """Переопределяем save для автоматического обновления профиля"""
-        is_new = self.pk is None
+        """
+        Переопределяем save для автоматического обновления профиля. При
+        изменении сохранённого результата (баллы, дата, пользователь, тест)
+        баллы черт перезаписываются, а статистика прежнего и нового
+        пользователя пересобирается заново.
+        """
+        update_fields = kwargs.get('update_fields')
+        previous = None
+        if self.pk is not None:
+            if update_fields is not None and not {'user', 'test', *self.PROFILE_FIELDS} & set(update_fields):
+                super().save(*args, **kwargs)
+                return
+            previous = TestResult.objects.filter(pk=self.pk).values(*self.PROFILE_FIELDS).first()
         super().save(*args, **kwargs)
-        
-        # Обновляем динамический профиль пользователя
-        if is_new:
-            self.user.profile.update_dynamic_profile()
+
+        user_ids = {self.user_id}
+        if previous is not None:
+            if all(previous[field] == getattr(self, field) for field in self.PROFILE_FIELDS):
+                return
+            # Учтённый результат изменился — инкрементальная статистика неверна
+            from .trait_stats import reset_profile_statistics
+            user_ids.add(previous['user_id'])
+            reset_profile_statistics(user_ids)
+
+        # Баллы черт в TraitScore — при создании и при изменении результата
+        from .trait_scores import store_trait_scores
+        store_trait_scores([self], replace=previous is not None)
+
+        # Обновляем динамический профиль пользователя (сразу или через очередь)
+        from .profile_queue import request_profile_recompute
+        request_profile_recompute(user_ids)
+
+    @classmethod
+    def create_many(cls, results, completed_at=None):
+        """
+        Создаёт результаты одним bulk_create и обновляет динамический профиль
+        каждого затронутого пользователя один раз (save() не вызывается).
+        completed_at — список дат завершения (auto_now_add перезаписывает их при вставке).
+        """
+        created = cls.objects.bulk_create(results)
+        if completed_at is not None:
+            for result, value in zip(created, completed_at):
+                result.completed_at = value
+            cls.objects.bulk_update(created, ['completed_at'])
+        from .trait_scores import store_trait_scores
+        store_trait_scores(created)
+        from .profile_queue import request_profile_recompute
+        request_profile_recompute({r.user_id for r in created})
+        return created
+
+
+class PendingTestResult(models.Model):
+    """
+    Буфер отправленных результатов (режим RESULT_INGESTION_MODE = 'buffered').
+
+    Запись подтверждается клиенту сразу после вставки строки сюда; перенос в
+    TestResult пачками выполняет команда flush_result_buffer.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pending_test_results', verbose_name="Пользователь")
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, verbose_name="Тест")
+    answers = models.JSONField(default=dict, verbose_name="Ответы")
+    personality_map = models.JSONField(default=dict, verbose_name="Карта личности")
+    score = models.JSONField(default=dict, verbose_name="Баллы по чертам")
+    response_time = models.JSONField(default=dict, verbose_name="Время ответов")
+    metadata = models.JSONField(default=dict, verbose_name="Дополнительные метаданные")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата отправки")
+    result = models.OneToOneField(TestResult, on_delete=models.SET_NULL, null=True, blank=True, related_name='pending', verbose_name="Сохранённый результат")
+    flushed_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата переноса")
+
+    class Meta:
+        verbose_name = "Результат в буфере"
+        verbose_name_plural = "Результаты в буфере"
+        indexes = [models.Index(fields=['flushed_at', 'id'])]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.test.name} - буфер #{self.id}"
+
+    @property
+    def public_id(self):
+        """Идентификатор результата для клиента до переноса в TestResult"""
+        return f'p{self.id}'
+
+
+class SubmissionIdempotencyKey(models.Model):
+    """Ключ идемпотентности отправки теста (заголовок Idempotency-Key) -> результат"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys', verbose_name="Пользователь")
+    key = models.CharField(max_length=255, verbose_name="Ключ")
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, verbose_name="Тест")
+    request_hash = models.CharField(max_length=64, verbose_name="Хэш запроса")
+    # id TestResult или 'p<id>' для буферизованного результата; пусто, пока запрос выполняется
+    result_ref = models.CharField(max_length=32, blank=True, default='', verbose_name="Результат")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"{self.user.username} - {self.key}"
+
+
+class ProfileRecomputeJob(models.Model):
+    """
+    Задание на пересчёт динамического профиля (режим PROFILE_RECOMPUTE_MODE = 'queued').
+
+    На пользователя не больше одной строки: повторные запросы только
+    увеличивают request_count, поэтому N отправок подряд дают один пересчёт.
+    Задание ждёт обработки, пока request_count > processed_count.
+    Обрабатывает команда process_profile_queue.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile_recompute_job', verbose_name="Пользователь")
+    request_count = models.PositiveIntegerField(default=1, verbose_name="Запросов пересчёта")
+    # request_count, прочитанный перед последним успешным пересчётом
+    processed_count = models.PositiveIntegerField(default=0, verbose_name="Учтено запросов")
+    first_requested_at = models.DateTimeField(verbose_name="Первый необработанный запрос")
+    requested_at = models.DateTimeField(verbose_name="Последний запрос")
+    available_at = models.DateTimeField(verbose_name="Не раньше")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Взято в работу")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Неудачных попыток")
+    last_error = models.TextField(blank=True, default='', verbose_name="Последняя ошибка")
+    failed_at = models.DateTimeField(null=True, blank=True, verbose_name="Попытки исчерпаны")
+
+    class Meta:
+        verbose_name = "Пересчёт профиля в очереди"
+        verbose_name_plural = "Очередь пересчёта профилей"
+        indexes = [models.Index(fields=['failed_at', 'available_at'])]
+
+    def __str__(self):
+        return f"{self.user.username} - запросов {self.request_count}"
+
+
+class TraitStatistic(models.Model):
+    """
+    Накопленная статистика черты пользователя: количество, сумма, среднее и M2
+    (алгоритм Уэлфорда), первый и последний балл.
+    """
+    KIND_CHOICES = [
+        ('trait', 'Ключ черты'),
+        ('display', 'Отображаемое имя черты'),
+        ('confidence', 'Уровень уверенности'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='trait_statistics', verbose_name="Пользователь")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Вид")
+    trait = models.CharField(max_length=255, verbose_name="Черта")
+    count = models.PositiveIntegerField(default=0, verbose_name="Количество")
+    total = models.FloatField(default=0, verbose_name="Сумма")
+    mean = models.FloatField(default=0, verbose_name="Среднее")
+    m2 = models.FloatField(default=0, verbose_name="Сумма квадратов отклонений")
+    first_score = models.FloatField(null=True, blank=True, verbose_name="Первый балл")
+    last_score = models.FloatField(null=True, blank=True, verbose_name="Последний балл")
+    # Прореженная история черты, utils.TraitHistory (только для вида 'trait')
+    history = models.JSONField(default=dict, verbose_name="История")
+    # EWMA и дневные корзины скользящих окон, utils.TraitWindows (только для вида 'trait')
+    windows = models.JSONField(default=dict, verbose_name="Скользящие окна")
+
+    class Meta:
+        verbose_name = "Статистика черты"
+        verbose_name_plural = "Статистика черт"
+        unique_together = ('user', 'kind', 'trait')
+
+    def __str__(self):
+        return f"{self.user.username} - {self.trait} ({self.kind})"
+
+
+class TraitPairStatistic(models.Model):
+    """Ко-моменты пары черт пользователя по последним баллам каждого теста"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='trait_pair_statistics', verbose_name="Пользователь")
+    trait1 = models.CharField(max_length=255, verbose_name="Черта 1")
+    trait2 = models.CharField(max_length=255, verbose_name="Черта 2")
+    count = models.IntegerField(default=0, verbose_name="Количество")
+    sum_x = models.FloatField(default=0)
+    sum_y = models.FloatField(default=0)
+    sum_xy = models.FloatField(default=0)
+    sum_xx = models.FloatField(default=0)
+    sum_yy = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name = "Статистика пары черт"
+        verbose_name_plural = "Статистика пар черт"
+        unique_together = ('user', 'trait1', 'trait2')
+
+    def __str__(self):
+        return f"{self.user.username} - {self.trait1} / {self.trait2}"
+
+
+class Trait(models.Model):
+    """Словарь ключей черт (Answer.personality_trait и измерения схем): ключ -> целый id"""
+    name = models.CharField(max_length=255, unique=True, verbose_name="Ключ черты")
+
+    class Meta:
+        verbose_name = "Черта"
+        verbose_name_plural = "Черты"
+
+    def __str__(self):
+        return self.name
+
+
+class TraitScore(models.Model):
+    """
+    Балл черты в результате теста — нормализованная копия TestResult.score
+    (и сырого балла из personality_map) для запросов по многим результатам.
+    Заполняется при сохранении результата (api.trait_scores).
+    """
+    result = models.ForeignKey(TestResult, on_delete=models.CASCADE, related_name='trait_scores', verbose_name="Результат")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='trait_scores', verbose_name="Пользователь")
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='trait_scores', verbose_name="Тест")
+    trait = models.ForeignKey(Trait, on_delete=models.PROTECT, related_name='scores', verbose_name="Черта")
+    raw = models.FloatField(null=True, blank=True, verbose_name="Сырой балл")
+    normalized = models.FloatField(verbose_name="Балл")
+    completed_at = models.DateTimeField(verbose_name="Дата завершения")
+
+    class Meta:
+        verbose_name = "Балл черты"
+        verbose_name_plural = "Баллы черт"
+        unique_together = ('result', 'trait')
+        indexes = [
+            models.Index(fields=['user', 'trait']),
+            models.Index(fields=['test', 'trait']),
+        ]
+
+    def __str__(self):
+        return f"{self.result_id} - {self.trait_id}: {self.normalized}"
+
+
+class TraitNormBucket(models.Model):
+    """
+    Корзина популяционной нормы черты в тесте: сколько результатов имеют
+    нормализованный балл value (api.norms). Счётчики меняются через F(), без
+    блокировки всей гистограммы.
+    """
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='trait_norm_buckets', verbose_name="Тест")
+    trait = models.ForeignKey(Trait, on_delete=models.PROTECT, related_name='norm_buckets', verbose_name="Черта")
+    value = models.FloatField(verbose_name="Балл")
+    count = models.IntegerField(default=0, verbose_name="Количество результатов")
+
+    class Meta:
+        verbose_name = "Корзина нормы черты"
+        verbose_name_plural = "Корзины норм черт"
+        unique_together = ('test', 'trait', 'value')
+
+    def __str__(self):
+        return f"{self.test_id} - {self.trait_id}: {self.value} ({self.count})"
+
+
+class ItemAnalysisSnapshot(models.Model):
+    """Последний анализ заданий теста по всем результатам (api.item_analysis)"""
+    test = models.OneToOneField(Test, on_delete=models.CASCADE, related_name='item_analysis', verbose_name="Тест")
+    scoring_version = models.PositiveIntegerField(default=0, verbose_name="Версия схемы подсчёта")
+    result_count = models.PositiveIntegerField(default=0, verbose_name="Количество результатов")
+    # id последнего учтённого результата: по нему видно, что появились новые
+    last_result = models.PositiveIntegerField(default=0, verbose_name="Последний учтённый результат")
+    data = models.JSONField(default=dict, verbose_name="Анализ заданий")
+    computed_at = models.DateTimeField(verbose_name="Дата расчёта")
+
+    class Meta:
+        verbose_name = "Анализ заданий теста"
+        verbose_name_plural = "Анализ заданий тестов"
+
+    def __str__(self):
+        return f"{self.test.name} - {self.result_count} результатов"
 
 
 class PsyToolkitImportLog(models.Model):
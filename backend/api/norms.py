@@ -0,0 +1,192 @@
+"""
+Популяционные нормы: распределение баллов черт по всем пользователям.
+
+Для каждой пары (тест, черта) хранится гистограмма нормализованных баллов:
+строка TraitNormBucket на каждое значение (округлённое до NORM_PRECISION
+знаков) с числом результатов. Счётчики меняются вместе с таблицей
+TraitScore: запись баллов результата добавляет их в нормы, перезапись и
+удаление результата — вычитают прежние (api.trait_scores, api.signals).
+Изменение — UPDATE count = count + n по одной корзине, поэтому параллельные
+отправки одного теста ждут друг друга, только попадая в один и тот же балл.
+Команда rebuild_trait_norms пересобирает нормы по TraitScore.
+
+Процентиль балла — доля результатов ниже него плюс половина равных ему;
+ищется двоичным поиском по гистограмме, без чтения TestResult.
+"""
+from bisect import bisect_left
+from itertools import accumulate
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import TraitNormBucket, TraitScore
+
+# Точность округления баллов в гистограмме (нормализованные баллы — целые 0..100)
+NORM_PRECISION = 1
+
+
+def norm_value(score):
+    return round(float(score), NORM_PRECISION)
+
+
+def norm_min_sample():
+    """Меньше результатов — процентиль не показывается"""
+    return getattr(settings, 'NORMS_MIN_SAMPLE', 30)
+
+
+class ScoreHistogram:
+    """Гистограмма баллов в колоночном виде: values по возрастанию и counts"""
+
+    __slots__ = ('values', 'counts', '_cumulative')
+
+    def __init__(self, values=None, counts=None):
+        self.values = values or []
+        self.counts = counts or []
+        self._cumulative = None
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            return cls()
+        return cls(list(data.get('values', [])), list(data.get('counts', [])))
+
+    def to_dict(self):
+        return {'values': self.values, 'counts': self.counts}
+
+    @property
+    def total(self):
+        return self.cumulative[-1] if self.counts else 0
+
+    @property
+    def cumulative(self):
+        if self._cumulative is None:
+            self._cumulative = list(accumulate(self.counts))
+        return self._cumulative
+
+    def add(self, value, count=1):
+        """Добавляет count результатов с баллом value (count < 0 — вычитает)"""
+        value = norm_value(value)
+        i = bisect_left(self.values, value)
+        if i < len(self.values) and self.values[i] == value:
+            self.counts[i] += count
+            if self.counts[i] <= 0:
+                del self.values[i]
+                del self.counts[i]
+        elif count > 0:
+            self.values.insert(i, value)
+            self.counts.insert(i, count)
+        self._cumulative = None
+
+    def percentile(self, value):
+        """Процентиль балла (0..100) или None для пустой гистограммы"""
+        total = self.total
+        if not total:
+            return None
+        value = norm_value(value)
+        i = bisect_left(self.values, value)
+        below = self.cumulative[i - 1] if i else 0
+        equal = self.counts[i] if i < len(self.values) and self.values[i] == value else 0
+        return round(100 * (below + equal / 2) / total, 1)
+
+
+def norm_deltas(rows, sign=1, deltas=None):
+    """
+    Изменения норм по строкам (test_id, trait_id, балл):
+    {(test_id, trait_id): {значение: ±количество}}
+    """
+    deltas = {} if deltas is None else deltas
+    for test_id, trait_id, score in rows:
+        group = deltas.setdefault((test_id, trait_id), {})
+        value = norm_value(score)
+        group[value] = group.get(value, 0) + sign
+    return deltas
+
+
+def apply_norm_deltas(deltas):
+    """Применяет изменения к счётчикам корзин TraitNormBucket"""
+    changes = sorted(
+        (test_id, trait_id, value, count)
+        for (test_id, trait_id), group in deltas.items()
+        for value, count in group.items() if count
+    )
+    if not changes:
+        return
+    with transaction.atomic():
+        # Недостающие корзины создаются пустыми; вычитать можно лишь из существующих
+        TraitNormBucket.objects.bulk_create(
+            [
+                TraitNormBucket(test_id=test_id, trait_id=trait_id, value=value)
+                for test_id, trait_id, value, count in changes if count > 0
+            ],
+            ignore_conflicts=True
+        )
+        # Одинаковый порядок изменений — параллельные записи не ждут друг друга по кругу
+        for test_id, trait_id, value, count in changes:
+            TraitNormBucket.objects.filter(test_id=test_id, trait_id=trait_id, value=value).update(
+                count=F('count') + count
+            )
+
+
+def rebuild_trait_norms(test_ids=None):
+    """
+    Пересобирает нормы по TraitScore (GROUP BY на стороне БД).
+    Возвращает число пар (тест, черта).
+    """
+    scores = TraitScore.objects.all()
+    buckets = TraitNormBucket.objects.all()
+    if test_ids is not None:
+        scores = scores.filter(test_id__in=test_ids)
+        buckets = buckets.filter(test_id__in=test_ids)
+    # Различных баллов немного (обычно целые 0..100), округляются они уже в Python
+    rows = scores.values_list('test_id', 'trait_id', 'normalized').annotate(n=Count('id')).order_by()
+    histograms = {}
+    for test_id, trait_id, value, count in rows.iterator():
+        histograms.setdefault((test_id, trait_id), ScoreHistogram()).add(value, count)
+    with transaction.atomic():
+        buckets.delete()
+        TraitNormBucket.objects.bulk_create([
+            TraitNormBucket(test_id=test_id, trait_id=trait_id, value=value, count=count)
+            for (test_id, trait_id), histogram in histograms.items()
+            for value, count in zip(histogram.values, histogram.counts)
+        ], batch_size=1000)
+    return len(histograms)
+
+
+def load_norms(test_ids):
+    """{test_id: {ключ черты: ScoreHistogram}} одним запросом"""
+    norms = {test_id: {} for test_id in test_ids}
+    rows = (
+        TraitNormBucket.objects.filter(test_id__in=test_ids, count__gt=0)
+        .order_by('value').values_list('test_id', 'trait__name', 'value', 'count')
+    )
+    for test_id, trait, value, count in rows:
+        histogram = norms[test_id].setdefault(trait, ScoreHistogram())
+        # Корзины приходят по возрастанию балла
+        histogram.values.append(value)
+        histogram.counts.append(count)
+    return norms
+
+
+def score_percentiles(test_norms, scores):
+    """
+    {ключ черты: процентиль} для баллов результата по нормам теста; None —
+    норм по черте нет или в них меньше NORMS_MIN_SAMPLE результатов.
+    """
+    if not isinstance(scores, dict):
+        return {}
+    min_sample = norm_min_sample()
+    percentiles = {}
+    for trait, score in scores.items():
+        histogram = test_norms.get(trait)
+        if (histogram is None or histogram.total < min_sample
+                or not isinstance(score, (int, float))):
+            percentiles[trait] = None
+        else:
+            percentiles[trait] = histogram.percentile(score)
+    return percentiles
+
+
+def result_percentiles(test_id, scores):
+    """Процентили баллов одного результата"""
+    return score_percentiles(load_norms([test_id])[test_id], scores)
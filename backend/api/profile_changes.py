@@ -0,0 +1,88 @@
+"""
+Изменения динамического профиля между версиями (синхронизация клиентов).
+
+При каждой сборке профиля (UserProfile.update_dynamic_profile) в
+UserProfile.dynamic_profile_changes добавляется запись: какие черты, связи и
+несоответствия появились, изменились или исчезли по сравнению с предыдущей
+версией (только ключи, без значений). Хранятся последние
+DYNAMIC_PROFILE_CHANGE_LOG_SIZE записей. Для ?since=<версия> записи
+объединяются, а значения берутся из текущего профиля; если журнал не
+покрывает разрыв версий, клиент получает полный снимок.
+"""
+from django.conf import settings
+
+from .profile_sections import SUMMARY_FIELDS
+
+PROFILE_PARTS = ('traits', 'connections', 'inconsistencies')
+
+
+def change_log_size():
+    return getattr(settings, 'DYNAMIC_PROFILE_CHANGE_LOG_SIZE', 20)
+
+
+def keyed_profile(profile):
+    """{часть: {ключ: значение}}; ключ связи — (from, to), несоответствия — (trait, type)"""
+    profile = profile if isinstance(profile, dict) else {}
+    return {
+        'traits': dict(profile.get('traits') or {}),
+        'connections': {(c['from'], c['to']): c for c in profile.get('connections') or []},
+        'inconsistencies': {(i['trait'], i['type']): i for i in profile.get('inconsistencies') or []},
+    }
+
+
+def diff_profiles(old, new, version):
+    """Запись журнала: ключи изменившихся и исчезнувших элементов новой версии"""
+    old, new = keyed_profile(old), keyed_profile(new)
+    entry = {'version': version}
+    for part in PROFILE_PARTS:
+        entry[part] = [key for key, value in new[part].items() if old[part].get(key) != value]
+        entry[f'removed_{part}'] = [key for key in old[part] if key not in new[part]]
+    return entry
+
+
+def append_profile_change(log, entry):
+    return (list(log or []) + [entry])[-change_log_size():]
+
+
+def as_key(key):
+    # JSON хранит кортежи ключей как списки
+    return tuple(key) if isinstance(key, list) else key
+
+
+def profile_delta(profile, since):
+    """
+    Изменения профиля после версии since или None, если их не восстановить
+    по журналу (тогда нужен полный снимок).
+    """
+    version = profile.dynamic_profile_version
+    entries = [e for e in profile.dynamic_profile_changes or [] if since < e['version'] <= version]
+    if since > version or len(entries) != version - since:
+        return None
+
+    changed = {part: {} for part in PROFILE_PARTS}
+    removed = {part: {} for part in PROFILE_PARTS}
+    for entry in sorted(entries, key=lambda e: e['version']):
+        for part in PROFILE_PARTS:
+            for key in map(as_key, entry[part]):
+                changed[part][key] = None
+                removed[part].pop(key, None)
+            for key in map(as_key, entry[f'removed_{part}']):
+                removed[part][key] = None
+                changed[part].pop(key, None)
+
+    current = keyed_profile(profile.dynamic_profile)
+    stored = profile.dynamic_profile if isinstance(profile.dynamic_profile, dict) else {}
+    return {
+        'version': version,
+        'since': since,
+        'full': False,
+        'traits': {key: current['traits'][key] for key in changed['traits'] if key in current['traits']},
+        'connections': [current['connections'][key] for key in changed['connections'] if key in current['connections']],
+        'inconsistencies': [
+            current['inconsistencies'][key] for key in changed['inconsistencies'] if key in current['inconsistencies']
+        ],
+        'removed_traits': list(removed['traits']),
+        'removed_connections': [{'from': a, 'to': b} for a, b in removed['connections']],
+        'removed_inconsistencies': [{'trait': t, 'type': kind} for t, kind in removed['inconsistencies']],
+        'summary': {field: stored.get(field) for field in SUMMARY_FIELDS},
+    }
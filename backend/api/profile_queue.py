@@ -0,0 +1,170 @@
+"""
+Очередь пересчёта динамического профиля.
+
+Любое изменение результатов пользователя увеличивает UserProfile.results_version,
+после чего профиль считается устаревшим. Дальше всё зависит от
+PROFILE_RECOMPUTE_MODE: 'lazy' — больше ничего не делается, профиль
+собирается при первом чтении (UserProfile.ensure_dynamic_profile); 'sync' —
+профиль пересобирается сразу в запросе.
+
+В режиме 'queued' сохранение результата не
+пересчитывает профиль в запросе, а отмечает пользователя в очереди
+(ProfileRecomputeJob). Запросы одного пользователя схлопываются в одну
+строку: request_count растёт, а воркер (команда process_profile_queue)
+пересчитывает профиль один раз и записывает processed_count. Запросы,
+пришедшие во время пересчёта, оставляют задание в очереди.
+Ошибки повторяются с экспоненциальной задержкой до
+PROFILE_RECOMPUTE_MAX_ATTEMPTS раз.
+"""
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DateTimeField, F, Min, PositiveIntegerField, Q, Value, When
+from django.utils import timezone
+
+from .models import ProfileRecomputeJob, UserProfile
+
+logger = logging.getLogger(__name__)
+
+
+def profile_recompute_mode():
+    return getattr(settings, 'PROFILE_RECOMPUTE_MODE', 'lazy')
+
+
+def is_queued_recompute():
+    return profile_recompute_mode() == 'queued'
+
+
+def mark_profiles_changed(user_ids):
+    """Отмечает, что результаты пользователей изменились (профили устарели)"""
+    UserProfile.objects.filter(user_id__in=list(user_ids)).update(results_version=F('results_version') + 1)
+
+
+def request_profile_recompute(user_ids):
+    """Отмечает профили устаревшими и, в зависимости от режима, пересчитывает их или ставит в очередь"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    mark_profiles_changed(user_ids)
+    mode = profile_recompute_mode()
+    if mode == 'queued':
+        enqueue_profile_recompute(user_ids)
+    elif mode == 'sync':
+        for profile in UserProfile.objects.filter(user_id__in=user_ids).select_related('user'):
+            profile.ensure_dynamic_profile()
+
+
+def pending_jobs():
+    return ProfileRecomputeJob.objects.filter(request_count__gt=F('processed_count'), failed_at__isnull=True)
+
+
+def enqueue_profile_recompute(user_ids):
+    """Ставит пересчёт в очередь (не больше одного задания на пользователя)"""
+    now = timezone.now()
+    user_ids = set(user_ids)
+    was_failed = Q(failed_at__isnull=False)
+    bump = {
+        'request_count': F('request_count') + 1,
+        'requested_at': now,
+        # Лаг считаем от первого запроса, ещё не учтённого пересчётом
+        'first_requested_at': Case(
+            When(Q(request_count=F('processed_count')) | was_failed, then=Value(now)),
+            default=F('first_requested_at'),
+            output_field=DateTimeField(),
+        ),
+        # Задание с исчерпанными попытками снова становится активным
+        'attempts': Case(When(was_failed, then=Value(0)), default=F('attempts'), output_field=PositiveIntegerField()),
+        'available_at': Case(When(was_failed, then=Value(now)), default=F('available_at'), output_field=DateTimeField()),
+        'failed_at': None,
+    }
+    # Строки заданий не удаляются, поэтому update не может потерять запрос
+    existing = set(ProfileRecomputeJob.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    if existing:
+        ProfileRecomputeJob.objects.filter(user_id__in=existing).update(**bump)
+    missing = user_ids - existing
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            ProfileRecomputeJob.objects.bulk_create([
+                ProfileRecomputeJob(
+                    user_id=user_id, request_count=1, processed_count=0,
+                    first_requested_at=now, requested_at=now, available_at=now
+                )
+                for user_id in missing
+            ])
+    except IntegrityError:
+        # Задание создано параллельным запросом — учитываем свой запрос в нём
+        ProfileRecomputeJob.objects.filter(user_id__in=missing).update(**bump)
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'PROFILE_RECOMPUTE_RETRY_SECONDS', 30)
+    return timedelta(seconds=base * 2 ** max(0, attempts - 1))
+
+
+def claim_job(job, now):
+    """Берёт задание в работу; False, если его уже взял другой воркер"""
+    return ProfileRecomputeJob.objects.filter(pk=job.pk, locked_at=job.locked_at).update(locked_at=now) == 1
+
+
+def process_profile_queue(limit=None):
+    """Выполняет до limit готовых заданий. Возвращает (выполнено, с ошибкой)"""
+    limit = limit or getattr(settings, 'PROFILE_RECOMPUTE_BATCH_SIZE', 100)
+    max_attempts = getattr(settings, 'PROFILE_RECOMPUTE_MAX_ATTEMPTS', 5)
+    stale = timedelta(seconds=getattr(settings, 'PROFILE_RECOMPUTE_STALE_SECONDS', 300))
+    now = timezone.now()
+    jobs = list(
+        pending_jobs()
+        .filter(available_at__lte=now)
+        .filter(Q(locked_at__isnull=True) | Q(locked_at__lt=now - stale))
+        .order_by('first_requested_at')[:limit]
+    )
+
+    done = failed = 0
+    for job in jobs:
+        now = timezone.now()
+        if not claim_job(job, now):
+            continue
+        # Запросы после этого чтения оставят задание в очереди
+        target = ProfileRecomputeJob.objects.filter(pk=job.pk).values_list('request_count', flat=True).first()
+        try:
+            profile = UserProfile.objects.filter(user_id=job.user_id).select_related('user').first()
+            # Профиль мог уже собрать читатель — тогда пересчёт не нужен
+            if profile is not None:
+                profile.ensure_dynamic_profile()
+        except Exception as e:
+            failed += 1
+            attempts = job.attempts + 1
+            logger.exception(f"Ошибка пересчёта профиля пользователя {job.user_id} (попытка {attempts})")
+            ProfileRecomputeJob.objects.filter(pk=job.pk).update(
+                locked_at=None,
+                attempts=attempts,
+                last_error=f'{type(e).__name__}: {e}',
+                available_at=timezone.now() + retry_delay(attempts),
+                failed_at=timezone.now() if attempts >= max_attempts else None,
+            )
+            continue
+        done += 1
+        ProfileRecomputeJob.objects.filter(pk=job.pk).update(
+            processed_count=target, locked_at=None, attempts=0, last_error=''
+        )
+    return done, failed
+
+
+def profile_queue_stats():
+    """Глубина очереди и лаг (секунды с самого старого необработанного запроса)"""
+    now = timezone.now()
+    pending = pending_jobs()
+    oldest = pending.aggregate(oldest=Min('first_requested_at'))['oldest']
+    return {
+        'mode': profile_recompute_mode(),
+        'depth': pending.count(),
+        'ready': pending.filter(available_at__lte=now).count(),
+        'in_progress': pending.filter(locked_at__isnull=False).count(),
+        'retrying': pending.filter(attempts__gt=0).count(),
+        'failed': ProfileRecomputeJob.objects.filter(failed_at__isnull=False).count(),
+        'lag_seconds': round((now - oldest).total_seconds(), 3) if oldest else 0,
+    }
@@ -0,0 +1,117 @@
+"""
+Разделы динамического профиля по запросу (?sections=traits,connections).
+
+Если сохранённый dynamic_profile учитывает все результаты пользователя,
+разделы просто берутся из него. Иначе каждый запрошенный раздел считается
+отдельно по накопленной статистике черт (api.trait_stats) и кэшируется под
+ключом с версией результатов (UserProfile.results_version): новый результат
+меняет ключ, и раздел пересчитывается только когда его снова запросят. Для раздела
+читаются только нужные ему виды статистики — без корреляций, если они не
+запрошены. Если статистика ещё не собрана (или сброшена), разделы, которым
+хватает количества, среднего и дисперсии черт, считаются по агрегатам БД
+(api.trait_aggregates) без полной пересборки.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import TestResult
+from .trait_aggregates import statistics_from_aggregates
+from .trait_stats import load_profile_statistics, refresh_profile_statistics
+from .utils import (
+    confidence_patterns_from_statistics, connections_from_correlations,
+    correlation_patterns_from_statistics, dynamic_traits_from_statistics,
+    inconsistency_patterns_from_statistics, map_inconsistencies,
+    patterns_from_statistics, profile_summary_from_statistics,
+    trait_evolution_from_statistics
+)
+
+
+def summary_section(stats):
+    return profile_summary_from_statistics(stats)
+
+
+def traits_section(stats):
+    return dynamic_traits_from_statistics(stats, trait_evolution_from_statistics(stats))
+
+
+def connections_section(stats):
+    return connections_from_correlations(correlation_patterns_from_statistics(stats), stats.display)
+
+
+def inconsistencies_section(stats):
+    return map_inconsistencies(inconsistency_patterns_from_statistics(stats))
+
+
+def patterns_section(stats):
+    return patterns_from_statistics(stats)
+
+
+# Раздел: (виды статистики, функция расчёта, можно ли считать по агрегатам БД)
+PROFILE_SECTIONS = {
+    'summary': (('display',), summary_section, True),
+    'traits': (('trait', 'display'), traits_section, False),
+    'connections': (('display', 'pair'), connections_section, False),
+    'inconsistencies': (('trait',), inconsistencies_section, True),
+    'patterns': (('trait', 'confidence', 'pair'), patterns_section, False),
+}
+# Поля сохранённого профиля, составляющие раздел summary
+SUMMARY_FIELDS = ('overall_score', 'last_updated', 'total_tests', 'unique_traits')
+
+
+def parse_sections(value):
+    """Список разделов из параметра sections; ValueError для неизвестных"""
+    sections = []
+    for name in (value or '').split(','):
+        name = name.strip()
+        if not name or name in sections:
+            continue
+        if name not in PROFILE_SECTIONS:
+            raise ValueError(f'Неизвестный раздел профиля: {name}. Доступны: {", ".join(PROFILE_SECTIONS)}')
+        sections.append(name)
+    return sections
+
+
+def profile_section_cache_key(profile, section):
+    return f'dynamic_profile_section:{profile.user_id}:{profile.results_version}:{section}'
+
+
+def stored_sections(profile, sections):
+    """Разделы из сохранённого dynamic_profile"""
+    stored = profile.dynamic_profile or {}
+    data = {}
+    for section in sections:
+        if section == 'summary':
+            data['summary'] = {field: stored.get(field) for field in SUMMARY_FIELDS}
+        else:
+            data[section] = stored.get(section)
+    return data
+
+
+def get_profile_sections(profile, sections):
+    """Возвращает {раздел: данные} для запрошенных разделов"""
+    if not profile.dynamic_profile_is_stale():
+        return stored_sections(profile, sections)
+
+    keys = {section: profile_section_cache_key(profile, section) for section in sections}
+    cached = cache.get_many(list(keys.values()))
+    data = {section: cached[key] for section, key in keys.items() if key in cached}
+    missing = [section for section in sections if section not in data]
+    if not missing:
+        return data
+
+    if not profile.trait_stats_results and all(PROFILE_SECTIONS[section][2] for section in missing):
+        # Статистика не собрана: полная пересборка дорога, а этим разделам хватает агрегатов
+        stats = statistics_from_aggregates(TestResult.objects.filter(user_id=profile.user_id))
+    elif profile.result_watermark() != (profile.trait_stats_last_result, profile.trait_stats_results):
+        # Учитываем новые результаты в статистике (без пересборки всего профиля)
+        stats = refresh_profile_statistics(profile)
+    else:
+        kinds = {kind for section in missing for kind in PROFILE_SECTIONS[section][0]}
+        stats, _ = load_profile_statistics(
+            profile.user_id, profile.trait_stats_results, profile.trait_stats_tests, kinds
+        )
+
+    computed = {section: PROFILE_SECTIONS[section][1](stats) for section in missing}
+    cache.set_many({keys[section]: value for section, value in computed.items()}, settings.CACHE_TIMEOUT_LONG)
+    data.update(computed)
+    return data
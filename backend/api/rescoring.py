@@ -0,0 +1,188 @@
+"""
+Пересчёт сохранённых результатов теста по текущей схеме подсчёта.
+
+Результаты читаются потоком (.iterator()), считаются пачками в пуле процессов
+(план теста не зависит от Django и передаётся каждому процессу один раз),
+а изменившиеся строки записываются через bulk_update — без TestResult.save()
+и без пересчёта профиля на каждую строку. Баллы черт этих строк в TraitScore
+перезаписываются в той же транзакции.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+
+from django.db import connections, transaction
+
+from .models import TestResult
+from .profile_queue import request_profile_recompute
+from .scoring import init_scoring_worker, score_rows
+from .scoring_cache import build_scoring_plan, load_extra_answers
+from .trait_scores import rebuild_trait_scores
+from .trait_stats import reset_profile_statistics
+
+
+class RescoreStats:
+    """Статистика пересчёта (в режиме dry-run — статистика расхождений)"""
+
+    def __init__(self):
+        self.processed = 0
+        self.changed = 0
+        self.dominant_changed = 0
+        self.last_id = 0
+        self.user_ids = set()
+        # черта -> [количество изменений, сумма |Δ|, максимум |Δ|]
+        self.trait_deltas = {}
+
+    def add(self, old_map, old_scores, new_map, new_scores):
+        self.processed += 1
+        if old_map == new_map and old_scores == new_scores:
+            return False
+        self.changed += 1
+        if (old_map or {}).get('dominant_style') != new_map.get('dominant_style'):
+            self.dominant_changed += 1
+        old_scores = old_scores if isinstance(old_scores, dict) else {}
+        for trait in set(old_scores) | set(new_scores):
+            old, new = old_scores.get(trait), new_scores.get(trait)
+            if old == new:
+                continue
+            try:
+                delta = abs(new - old)
+            except TypeError:
+                delta = None
+            entry = self.trait_deltas.setdefault(trait, [0, 0, 0])
+            entry[0] += 1
+            if delta is not None:
+                entry[1] += delta
+                entry[2] = max(entry[2], delta)
+        return True
+
+    def summary_lines(self):
+        lines = [
+            f'Обработано: {self.processed}, изменилось: {self.changed}, '
+            f'без изменений: {self.processed - self.changed}, '
+            f'сменился доминирующий стиль: {self.dominant_changed}, '
+            f'затронуто пользователей: {len(self.user_ids)}'
+        ]
+        for trait, (count, total, maximum) in sorted(self.trait_deltas.items(), key=lambda x: -x[1][0]):
+            lines.append(f'  {trait}: изменений {count}, средний |Δ| {round(total / count, 2)}, максимум |Δ| {maximum}')
+        return lines
+
+
+def read_checkpoint(path, test):
+    """
+    Возвращает (id последнего обработанного результата, id пользователей с
+    изменившимися результатами) из файла контрольной точки
+    """
+    if not path or not os.path.exists(path):
+        return 0, set()
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('test_id') != test.id or data.get('scoring_version') != test.scoring_version:
+        raise ValueError(
+            f'Контрольная точка {path} относится к другому тесту или версии схемы подсчёта'
+        )
+    return int(data.get('last_id') or 0), set(data.get('user_ids') or ())
+
+
+def write_checkpoint(path, test, stats):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'test_id': test.id,
+            'scoring_version': test.scoring_version,
+            'last_id': stats.last_id,
+            'processed': stats.processed,
+            'changed': stats.changed,
+            # Профили этих пользователей пересчитываются в конце, в том числе после возобновления
+            'user_ids': sorted(stats.user_ids),
+        }, f)
+    os.replace(tmp_path, path)
+
+
+def _iter_chunks(test, start_after, chunk_size):
+    rows = (
+        TestResult.objects.filter(test=test, id__gt=start_after)
+        .order_by('id')
+        .values_list('id', 'user_id', 'answers', 'personality_map', 'score')
+        .iterator(chunk_size=chunk_size)
+    )
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def rescore_test_results(test, chunk_size=1000, workers=1, dry_run=False,
+                         checkpoint=None, update_profiles=True, log=None):
+    """
+    Пересчитывает все результаты теста. workers > 1 — подсчёт в пуле процессов.
+    checkpoint — путь к файлу контрольной точки для возобновления.
+    Возвращает RescoreStats.
+    """
+    plan = build_scoring_plan(test)
+    stats = RescoreStats()
+    start_after, stats.user_ids = read_checkpoint(checkpoint, test)
+    if start_after and log:
+        log(f'Продолжаем после результата id={start_after}')
+
+    def prepare(chunk):
+        missing = {
+            a for _, _, answers, _, _ in chunk if isinstance(answers, dict)
+            for a in answers.values() if isinstance(a, int) and a not in plan.answers
+        }
+        rows = [(pk, answers if isinstance(answers, dict) else {}) for pk, _, answers, _, _ in chunk]
+        return rows, load_extra_answers(list(missing))
+
+    def apply(chunk, scored):
+        by_id = {pk: (user_id, old_map, old_scores) for pk, user_id, _, old_map, old_scores in chunk}
+        updates = []
+        user_ids = set()
+        for pk, personality_map, scores in scored:
+            user_id, old_map, old_scores = by_id[pk]
+            if stats.add(old_map, old_scores, personality_map, scores):
+                user_ids.add(user_id)
+                updates.append(TestResult(id=pk, personality_map=personality_map, score=scores))
+        stats.user_ids |= user_ids
+        stats.last_id = chunk[-1][0]
+        if not dry_run:
+            with transaction.atomic():
+                TestResult.objects.bulk_update(updates, ['personality_map', 'score'])
+                rebuild_trait_scores(TestResult.objects.filter(id__in=[r.id for r in updates]))
+                # Статистика черт построена по старым баллам: сбрасываем её вместе с записью
+                # пачки, чтобы прерванный пересчёт не оставил её устаревшей
+                reset_profile_statistics(user_ids)
+            if checkpoint:
+                write_checkpoint(checkpoint, test, stats)
+        if log:
+            log(f'... обработано {stats.processed}, изменилось {stats.changed}')
+
+    if workers <= 1:
+        init_scoring_worker(plan)
+        for chunk in _iter_chunks(test, start_after, chunk_size):
+            apply(chunk, score_rows(*prepare(chunk)))
+    else:
+        # Не отдаём открытые соединения с БД дочерним процессам
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_scoring_worker, initargs=(plan,)) as pool:
+            pending = deque()
+            for chunk in _iter_chunks(test, start_after, chunk_size):
+                pending.append((chunk, pool.submit(score_rows, *prepare(chunk))))
+                # Ограничиваем число пачек в памяти
+                if len(pending) >= workers * 2:
+                    chunk, future = pending.popleft()
+                    apply(chunk, future.result())
+            while pending:
+                chunk, future = pending.popleft()
+                apply(chunk, future.result())
+
+    if not dry_run and update_profiles:
+        request_profile_recompute(stats.user_ids)
+
+    if checkpoint and not dry_run and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return stats
@@ -0,0 +1,686 @@
+"""
+Скомпилированный план подсчёта баллов теста.
+
+План собирается один раз на версию теста (см. Test.scoring_version) и содержит
+всё, что не зависит от ответов пользователя: индекс ответов, максимумы по
+вопросам, вопросы каждой черты, особый случай MBTI и отображаемые имена черт.
+Модуль не зависит от Django: план строится из простых строк данных или из
+сериализованного определения теста (см. ScoringPlan.from_definition), поэтому
+его можно использовать вне веб-приложения (см. api/scoring_cli.py).
+"""
+from collections import OrderedDict
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # numpy — необязательная зависимость (векторный бэкенд)
+    np = None
+
+MBTI_LETTERS = ('E', 'I', 'S', 'N', 'T', 'F', 'J', 'P')
+
+# Для букв MBTI максимум фиксирован, если на дихотомию ровно столько вопросов
+MBTI_FIXED_QUESTIONS = 6
+
+TRAIT_DESCRIPTIONS = {
+    'Экстраверсия': 'Способность получать энергию от внешнего мира и взаимодействия с людьми',
+    'Интроверсия': 'Способность получать энергию от внутреннего мира и размышлений',
+    'Открытость': 'Готовность к новому опыту и творческому мышлению',
+    'Добросовестность': 'Самодисциплина, организованность и целеустремленность',
+    'Доброжелательность': 'Сотрудничество, доверие и альтруизм',
+    'Нейротизм': 'Эмоциональная стабильность и устойчивость к стрессу',
+    'Креативность': 'Способность к нестандартному мышлению и творчеству',
+    'Лидерство': 'Способность влиять на других и принимать решения',
+    'Эмпатия': 'Способность понимать чувства и эмоции других людей',
+    'Адаптивность': 'Гибкость в изменяющихся условиях'
+}
+
+
+def get_trait_level(score):
+    """Определяет уровень черты личности по баллу"""
+    if score >= 80:
+        return "Очень высокий"
+    elif score >= 60:
+        return "Высокий"
+    elif score >= 40:
+        return "Средний"
+    elif score >= 20:
+        return "Низкий"
+    else:
+        return "Очень низкий"
+
+
+def get_trait_description(trait, score):
+    """Возвращает описание черты личности"""
+    return TRAIT_DESCRIPTIONS.get(trait, trait)
+
+
+def map_trait_key(raw_key, test_name):
+    """Возвращает человеко-понятное имя черты с учётом названия теста"""
+    k = (raw_key or '').lower()
+    test_name_l = (test_name or '').lower()
+    # Нормализуем ключи, которые могли прийти как general_trait и т.п.
+    if k in ['general_trait', 'general', 'trait']:
+        # Маппим по тесту
+        if 'pss' in test_name_l or 'stress' in test_name_l:
+            return 'Уровень стресса'
+        if 'rosenberg' in test_name_l or 'self-esteem' in test_name_l or 'self esteem' in test_name_l:
+            return 'Самооценка'
+        if 'satisfaction with life' in test_name_l or 'swls' in test_name_l:
+            return 'Удовлетворённость жизнью'
+        if 'phq' in test_name_l or 'beck' in test_name_l or 'bdi' in test_name_l:
+            return 'Уровень депрессии'
+        if 'gad' in test_name_l or 'anx' in test_name_l:
+            return 'Уровень тревожности'
+        if 'big five' in test_name_l or 'ipip' in test_name_l or 'big 5' in test_name_l:
+            return 'Черты Большой пятёрки'
+        return 'Итоговый показатель'
+    # Прямые известные ключи
+    if k in ['stress']:
+        return 'Уровень стресса'
+    if k in ['self_worth', 'self-esteem', 'self_esteem']:
+        return 'Самооценка'
+    if k in ['life_satisfaction', 'satisfaction']:
+        return 'Удовлетворённость жизнью'
+    if k in ['anxiety']:
+        return 'Уровень тревожности'
+    if k in ['depression']:
+        return 'Уровень депрессии'
+    return raw_key
+
+
+def normalize_score(raw, maximum):
+    """Переводит сырой балл в проценты от максимума (0..100)"""
+    return min(100, max(0, int(round((raw / maximum) * 100))))
+
+
+class ScoringConfigError(ValueError):
+    """Некорректная схема подсчёта в Test.result_definitions"""
+
+
+def _as_int(value, where):
+    if isinstance(value, bool):
+        raise ScoringConfigError(f'{where}: ожидается целое число, получено {value!r}')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ScoringConfigError(f'{where}: ожидается целое число, получено {value!r}')
+
+
+class DimensionScheme:
+    """
+    Скомпилированный блок scoring из result_definitions (dimensions/categories/rules).
+
+    Номера вопросов переводятся в плотные индексы слотов, измерения и категории
+    хранятся кортежами слотов, правила — таблицей (индекс измерения, min?, порог),
+    поэтому подсчёт не разбирает конфигурацию и не приводит типы.
+    """
+
+    __slots__ = ('slot_of_order', 'dimensions', 'dimension_titles', 'dimension_slots',
+                 'max_score', 'categories', 'category_slots', 'rules')
+
+    def __init__(self, dimensions, categories, rules, max_score):
+        orders = sorted({o for _, os in dimensions + categories for o in os})
+        self.slot_of_order = {o: i for i, o in enumerate(orders)}
+        self.dimensions = [name for name, _ in dimensions]
+        self.dimension_titles = [name.capitalize() for name in self.dimensions]
+        self.dimension_slots = [tuple(self.slot_of_order[o] for o in os) for _, os in dimensions]
+        self.categories = [name for name, _ in categories]
+        self.category_slots = [tuple(self.slot_of_order[o] for o in os) for _, os in categories]
+        self.rules = rules
+        self.max_score = max_score
+
+    @classmethod
+    def compile(cls, result_definitions, question_orders=None):
+        """
+        Проверяет и компилирует схему. Возвращает None, если у теста нет схемы
+        измерений, и бросает ScoringConfigError для некорректной конфигурации.
+        question_orders — допустимые порядковые номера вопросов (если известны).
+        """
+        if not isinstance(result_definitions, dict):
+            return None
+        cfg = result_definitions.get('scoring') or result_definitions.get('SCORING')
+        if not (cfg and isinstance(cfg, dict) and cfg.get('dimensions')):
+            return None
+
+        valid_orders = set(question_orders) if question_orders is not None else None
+
+        def order_list(value, where):
+            if not isinstance(value, (list, tuple)):
+                raise ScoringConfigError(f'{where}: ожидается список номеров вопросов')
+            result = []
+            for i, o in enumerate(value):
+                o = _as_int(o, f'{where}[{i}]')
+                if valid_orders is not None and o not in valid_orders:
+                    raise ScoringConfigError(f'{where}: в тесте нет вопроса с номером {o}')
+                result.append(o)
+            return tuple(result)
+
+        raw_dimensions = cfg['dimensions']
+        if not isinstance(raw_dimensions, dict):
+            raise ScoringConfigError('scoring.dimensions: ожидается объект {измерение: [номера вопросов]}')
+        dimensions = [(str(name), order_list(os, f'scoring.dimensions.{name}')) for name, os in raw_dimensions.items()]
+
+        raw_categories = cfg.get('categories') or {}
+        if not isinstance(raw_categories, dict):
+            raise ScoringConfigError('scoring.categories: ожидается объект {категория: [номера вопросов]}')
+        categories = [(str(name), order_list(os, f'scoring.categories.{name}')) for name, os in raw_categories.items()]
+
+        # Условия правил ссылаются на измерения по имени без учёта регистра
+        dim_index = {}
+        for i, (name, _) in enumerate(dimensions):
+            dim_index.setdefault(name, i)
+            dim_index.setdefault(name.lower(), i)
+
+        raw_rules = cfg.get('rules') or {}
+        if not isinstance(raw_rules, dict):
+            raise ScoringConfigError('scoring.rules: ожидается объект {метка: {<измерение>_min|_max: порог}}')
+        rules = []
+        for label, rule in raw_rules.items():
+            where = f'scoring.rules.{label}'
+            if not isinstance(rule, dict):
+                raise ScoringConfigError(f'{where}: ожидается объект условий')
+            conditions = []
+            for cond_key, cond_val in rule.items():
+                base, _, kind = str(cond_key).rpartition('_')
+                if kind not in ('min', 'max') or not base:
+                    raise ScoringConfigError(f'{where}: условие {cond_key!r} должно иметь вид <измерение>_min или <измерение>_max')
+                index = dim_index.get(base, dim_index.get(base.lower()))
+                if index is None:
+                    raise ScoringConfigError(f'{where}: неизвестное измерение {base!r}')
+                conditions.append((index, kind == 'min', _as_int(cond_val, f'{where}.{cond_key}')))
+            rules.append((label, tuple(conditions)))
+
+        graph_cfg = result_definitions.get('graph') or {}
+        if not isinstance(graph_cfg, dict):
+            raise ScoringConfigError('graph: ожидается объект')
+        max_score = _as_int(graph_cfg.get('max_score') or 6, 'graph.max_score')
+
+        return cls(dimensions, categories, rules, max_score)
+
+    def evaluate(self, slot_values):
+        """
+        Возвращает (сырые баллы измерений, доминирующий стиль) по значениям
+        слотов. Доминирующий стиль: 1) максимум по categories, 2) первое
+        выполненное правило, 3) измерение с максимальным сырым баллом.
+        """
+        dim_raw = [sum(slot_values[i] for i in slots) for slots in self.dimension_slots]
+
+        dominant = None
+        if self.categories:
+            best = None
+            for name, slots in zip(self.categories, self.category_slots):
+                total = sum(slot_values[i] for i in slots)
+                if best is None or total > best:
+                    best, dominant = total, name
+        else:
+            for label, conditions in self.rules:
+                if all(dim_raw[i] >= t if is_min else dim_raw[i] <= t for i, is_min, t in conditions):
+                    dominant = label
+                    break
+
+        if dominant is None and dim_raw:
+            best = max(dim_raw)
+            dominant = self.dimensions[dim_raw.index(best)]
+
+        return dim_raw, dominant
+
+
+class ScoringPlan:
+    """
+    Компактное представление теста для подсчёта баллов.
+
+    answer_rows: итерируемое из кортежей
+        (answer_id, question_id, question_order, value, personality_trait)
+    question_ids: id всех вопросов теста (в том числе без вариантов ответа)
+    """
+
+    __slots__ = (
+        'test_id', 'version', 'test_name', 'result_definitions', 'scheme',
+        'answers', 'question_max', 'question_count', 'trait_questions',
+        'trait_max', 'mbti_fixed_traits', 'mbti_fixed_questions', 'trait_names',
+    )
+
+    def __init__(self, test_id, version, test_name, result_definitions, answer_rows, question_ids):
+        self.test_id = test_id
+        self.version = version
+        self.test_name = test_name or ''
+        self.result_definitions = result_definitions if isinstance(result_definitions, dict) else {}
+
+        # answer_id -> (question_id, question_order, trait, value)
+        self.answers = {}
+        self.question_max = {}
+        trait_questions = {}
+        for answer_id, question_id, order, value, trait in answer_rows:
+            qid = str(question_id)
+            self.answers[answer_id] = (qid, order, trait, value)
+            if value > self.question_max.get(qid, value - 1):
+                self.question_max[qid] = value
+            if trait:
+                trait_questions.setdefault(trait, set()).add(qid)
+
+        self.question_count = len(set(question_ids))
+        self.trait_questions = {t: frozenset(q) for t, q in trait_questions.items()}
+        # Максимум черты, когда отвечены все вопросы теста
+        self.trait_max = {
+            t: sum(self.question_max.get(qid, 0) for qid in qids)
+            for t, qids in self.trait_questions.items()
+        }
+        self.mbti_fixed_traits = frozenset(
+            letter for letter in MBTI_LETTERS
+            if len(self.trait_questions.get(letter, ())) == MBTI_FIXED_QUESTIONS
+        )
+        self.mbti_fixed_questions = frozenset().union(
+            *(self.trait_questions[letter] for letter in self.mbti_fixed_traits)
+        )
+        self.trait_names = {t: map_trait_key(t, self.test_name) for t in self.trait_questions}
+        # Явная схема измерений (например, стиль привязанности) или None
+        self.scheme = DimensionScheme.compile(
+            self.result_definitions, {order for _, order, _, _ in self.answers.values()}
+        )
+
+    @classmethod
+    def from_definition(cls, definition):
+        """
+        Строит план из сериализованного определения теста:
+        {"test_id", "version", "name", "result_definitions",
+         "questions": [{"id", "order", "answers": [{"id", "value", "personality_trait"}]}]}
+        """
+        answer_rows = []
+        question_ids = []
+        for question in definition.get('questions') or []:
+            question_ids.append(question['id'])
+            for answer in question.get('answers') or []:
+                answer_rows.append((
+                    answer['id'], question['id'], question.get('order', 0),
+                    answer['value'], answer.get('personality_trait') or ''
+                ))
+        return cls(
+            definition.get('test_id'), definition.get('version', 0), definition.get('name'),
+            definition.get('result_definitions'), answer_rows, question_ids
+        )
+
+    def trait_name(self, trait):
+        name = self.trait_names.get(trait)
+        if name is None:
+            name = map_trait_key(trait, self.test_name)
+        return name
+
+    def resolve(self, answers, extra_answers=None):
+        """
+        Сопоставляет ответы пользователя с планом.
+
+        Возвращает список (question_id, answer_id, trait, value, order) и
+        словарь максимумов по фактически отвеченным вопросам. extra_answers —
+        строки ответов, не принадлежащих тесту (в том же формате, что и
+        self.answers), плюс их question_max.
+        """
+        lookup = self.answers
+        extra_rows, extra_max = extra_answers or ({}, {})
+        user_answers = []
+        answered_max = {}
+        for question_id, answer_id in answers.items():
+            row = lookup.get(answer_id)
+            if row is None:
+                row = extra_rows.get(answer_id)
+                if row is None:
+                    continue
+                answered_max[row[0]] = extra_max.get(row[0], 0)
+            else:
+                answered_max[row[0]] = self.question_max[row[0]]
+            qid, order, trait, value = row
+            user_answers.append((str(question_id), answer_id, trait, value, order))
+        return user_answers, answered_max
+
+    def missing_answer_ids(self, answers):
+        """id ответов, которых нет среди вариантов этого теста"""
+        return [a for a in answers.values() if a not in self.answers]
+
+    def score(self, answers, extra_answers=None):
+        """Генерирует карту личности и нормализованные баллы по ответам"""
+        user_answers, answered_max = self.resolve(answers, extra_answers)
+
+        if self.scheme is not None:
+            return self.score_dimensions(user_answers)
+
+        trait_scores = {}
+        for _, _, trait, value, _ in user_answers:
+            trait_scores[trait] = trait_scores.get(trait, 0) + value
+        trait_maxima = self.trait_maxima(trait_scores, answered_max)
+        return self.build_trait_map(trait_scores, trait_maxima)
+
+    def trait_maxima(self, trait_scores, answered_max):
+        """Максимум каждой черты по вопросам, на которые дан ответ"""
+        all_answered = (
+            len(answered_max) == self.question_count
+            and all(qid in self.question_max for qid in answered_max)
+        )
+        if not all_answered:
+            # Неотвеченные вопросы букв MBTI считаем со значением 1 (демо-схема)
+            answered_max = dict(answered_max)
+            for qid in self.mbti_fixed_questions:
+                answered_max.setdefault(qid, 1)
+
+        trait_maxima = {}
+        for trait in trait_scores:
+            if trait in self.mbti_fixed_traits:
+                trait_maxima[trait] = MBTI_FIXED_QUESTIONS
+            elif all_answered:
+                trait_maxima[trait] = self.trait_max.get(trait, 0)
+            else:
+                related = self.trait_questions.get(trait, ())
+                trait_maxima[trait] = sum(answered_max.get(qid, 0) for qid in related)
+        return trait_maxima
+
+    def build_trait_map(self, trait_scores, trait_maxima):
+        """Собирает карту личности по сырым баллам и максимумам черт"""
+        normalized_scores = {}
+        for trait, raw in trait_scores.items():
+            trait_max = trait_maxima[trait]
+            normalized_scores[trait] = normalize_score(raw, trait_max) if trait_max > 0 else raw
+
+        personality_map = {
+            'traits': {},
+            'connections': [],
+            'overall_score': sum(normalized_scores.values()) // len(normalized_scores) if normalized_scores else 0
+        }
+
+        # Добавляем черты личности с русскими и тест-специфичными именами
+        for trait, norm_score in normalized_scores.items():
+            trait_name = self.trait_name(trait)
+            personality_map['traits'][trait_name] = {
+                'score': norm_score,
+                'raw_score': trait_scores[trait],
+                'max_score': trait_maxima[trait],
+                'level': get_trait_level(norm_score),
+                'description': get_trait_description(trait_name, norm_score),
+                'recommendations': ''
+            }
+
+        # Связи между чертами: обе черты имеют высокие баллы
+        high = [t for t, s in normalized_scores.items() if s > 70]
+        for i, trait1 in enumerate(high):
+            for trait2 in high[i+1:]:
+                personality_map['connections'].append({
+                    'from': self.trait_name(trait1),
+                    'to': self.trait_name(trait2),
+                    'strength': min(normalized_scores[trait1], normalized_scores[trait2])
+                })
+
+        return personality_map, normalized_scores
+
+    def score_dimensions(self, user_answers):
+        """Подсчёт по явной схеме измерений (например, стиль привязанности)"""
+        scheme = self.scheme
+        # Значения по слотам схемы (слот — порядковый номер вопроса)
+        slot_values = [0] * len(scheme.slot_of_order)
+        slot_of_order = scheme.slot_of_order
+        for _, _, _, value, order in user_answers:
+            slot = slot_of_order.get(order)
+            if slot is not None:
+                slot_values[slot] = value
+        return self.dimension_map(slot_values)
+
+    def dimension_map(self, slot_values):
+        """Карта личности по значениям слотов схемы измерений"""
+        scheme = self.scheme
+        dim_raw, dominant = scheme.evaluate(slot_values)
+        dim_max = scheme.max_score
+        normalized_scores = {}
+        personality_map = {'traits': {}, 'connections': []}
+        for dim, title, raw in zip(scheme.dimensions, scheme.dimension_titles, dim_raw):
+            score_norm = normalize_score(raw, max(1, dim_max))
+            normalized_scores[dim] = score_norm
+            personality_map['traits'][title] = {
+                'score': score_norm,
+                'raw_score': raw,
+                'max_score': dim_max,
+                'level': get_trait_level(score_norm),
+                'description': get_trait_description(title, score_norm),
+                'recommendations': ''
+            }
+        personality_map['overall_score'] = (
+            sum(normalized_scores.values()) // len(normalized_scores) if normalized_scores else 0
+        )
+
+        if dominant:
+            personality_map['dominant_style'] = dominant
+
+        return personality_map, normalized_scores
+
+
+class ScoringSession:
+    """
+    Накопительный подсчёт для прохождения теста по одному-нескольким вопросам.
+
+    Каждый ответ сразу добавляется к суммам черт (или к слотам схемы
+    измерений), поэтому finish() только нормализует готовые суммы. Результат
+    совпадает с ScoringPlan.score() по тем же ответам. Объект хранится в кэше
+    между запросами и привязан к версии плана (version).
+    """
+
+    __slots__ = ('test_id', 'version', 'answers', 'trait_scores', 'trait_counts', 'answered_max',
+                 'slot_values', 'slot_owners', 'reordered')
+
+    def __init__(self, plan):
+        self.test_id = plan.test_id
+        self.version = plan.version
+        # question_id -> answer_id в порядке первого ответа
+        self.answers = {}
+        self.trait_scores = {}
+        self.trait_counts = {}
+        self.answered_max = {}
+        self.slot_values = [0] * len(plan.scheme.slot_of_order) if plan.scheme is not None else None
+        # Вопрос, чьё значение лежит в слоте. В ScoringPlan.score_dimensions у слота,
+        # общего для нескольких вопросов, побеждает вопрос, отвеченный первым позже
+        # остальных (последний в answers), а не последний изменённый ответ
+        self.slot_owners = [None] * len(self.slot_values) if self.slot_values is not None else None
+        # Замена ответа сменила черту — порядок черт в карте считаем заново в finish()
+        self.reordered = False
+
+    @classmethod
+    def replay(cls, plan, answers):
+        """Новая сессия по уже данным ответам (например, после изменения теста)"""
+        session = cls(plan)
+        for question_id, answer_id in answers.items():
+            try:
+                session.add(plan, question_id, answer_id)
+            except ScoringConfigError:
+                continue
+        return session
+
+    @property
+    def answered_count(self):
+        return len(self.answers)
+
+    def add(self, plan, question_id, answer_id):
+        """Учитывает ответ; повторный ответ на вопрос заменяет предыдущий"""
+        qid = str(question_id)
+        row = plan.answers.get(answer_id)
+        if row is None or row[0] != qid:
+            raise ScoringConfigError(f'Ответ {answer_id} не относится к вопросу {qid}')
+        _, order, trait, value = row
+
+        previous = self.answers.get(qid)
+        if previous == answer_id:
+            return
+        if previous is None:
+            self.trait_scores[trait] = self.trait_scores.get(trait, 0) + value
+            self.trait_counts[trait] = self.trait_counts.get(trait, 0) + 1
+        else:
+            old_trait, old_value = plan.answers[previous][2], plan.answers[previous][3]
+            if old_trait == trait:
+                self.trait_scores[trait] += value - old_value
+            else:
+                self.reordered = True
+                self.trait_scores[old_trait] -= old_value
+                self.trait_counts[old_trait] -= 1
+                if not self.trait_counts[old_trait]:
+                    del self.trait_counts[old_trait]
+                    del self.trait_scores[old_trait]
+                self.trait_scores[trait] = self.trait_scores.get(trait, 0) + value
+                self.trait_counts[trait] = self.trait_counts.get(trait, 0) + 1
+
+        self.answers[qid] = answer_id
+        self.answered_max[qid] = plan.question_max[qid]
+        if self.slot_values is not None:
+            slot = plan.scheme.slot_of_order.get(order)
+            # Новый вопрос встаёт в конец answers и забирает слот; замена ответа
+            # меняет слот, только если он принадлежит этому же вопросу
+            if slot is not None and (previous is None or self.slot_owners[slot] == qid):
+                self.slot_values[slot] = value
+                self.slot_owners[slot] = qid
+
+    def finish(self, plan):
+        """Возвращает (personality_map, normalized_scores) по накопленным суммам"""
+        if self.reordered:
+            return plan.score(self.answers)
+        if plan.scheme is not None:
+            return plan.dimension_map(self.slot_values)
+        trait_maxima = plan.trait_maxima(self.trait_scores, self.answered_max)
+        return plan.build_trait_map(dict(self.trait_scores), trait_maxima)
+
+
+class VectorScoringPlan(ScoringPlan):
+    """
+    План с векторным ядром на numpy для длинных трейтовых тестов (IPIP, HEXACO).
+
+    Тест хранится массивами: отсортированные id ответов -> (индекс вопроса,
+    индекс черты, значение) и вектор максимумов черт. Подсчёт — gather по
+    searchsorted и np.bincount. Схемы измерений, неполные ответы и ответы
+    из чужих тестов считаются базовым (python) путём, результат совпадает.
+    """
+
+    __slots__ = ('answer_ids', 'answer_question', 'answer_trait', 'answer_value', 'trait_keys', 'trait_max_vec')
+
+    def __init__(self, *args, **kwargs):
+        if np is None:
+            raise ImportError('Для векторного подсчёта требуется numpy')
+        super().__init__(*args, **kwargs)
+        ids = sorted(self.answers)
+        question_index = {qid: i for i, qid in enumerate(self.question_max)}
+        trait_keys = []
+        trait_index = {}
+        for answer_id in ids:
+            trait = self.answers[answer_id][2]
+            if trait not in trait_index:
+                trait_index[trait] = len(trait_keys)
+                trait_keys.append(trait)
+        self.trait_keys = trait_keys
+        self.answer_ids = np.array(ids, dtype=np.int64)
+        self.answer_question = np.array([question_index[self.answers[a][0]] for a in ids], dtype=np.int32)
+        self.answer_trait = np.array([trait_index[self.answers[a][2]] for a in ids], dtype=np.int32)
+        self.answer_value = np.array([self.answers[a][3] for a in ids], dtype=np.float64)
+        self.trait_max_vec = np.array([
+            MBTI_FIXED_QUESTIONS if t in self.mbti_fixed_traits else self.trait_max.get(t, 0)
+            for t in trait_keys
+        ], dtype=np.int64)
+
+    def score(self, answers, extra_answers=None):
+        if self.scheme is not None or extra_answers or not self.trait_keys:
+            return super().score(answers, extra_answers)
+
+        ids = np.fromiter(answers.values(), dtype=np.int64, count=len(answers))
+        pos = np.searchsorted(self.answer_ids, ids)
+        pos[pos >= len(self.answer_ids)] = 0
+        pos = pos[self.answer_ids[pos] == ids]
+        answered = np.bincount(self.answer_question[pos], minlength=len(self.question_max))
+        if np.count_nonzero(answered) != self.question_count:
+            return super().score(answers, extra_answers)
+
+        traits = self.answer_trait[pos]
+        n_traits = len(self.trait_keys)
+        sums = np.bincount(traits, weights=self.answer_value[pos], minlength=n_traits)
+        # Порядок черт — порядок первого появления в ответах, как в базовом пути:
+        # при повторных индексах присваивание оставляет последнее значение,
+        # поэтому пишем позиции в обратном порядке
+        first = np.full(n_traits, len(traits))
+        first[traits[::-1]] = np.arange(len(traits) - 1, -1, -1)
+        order = np.argsort(first, kind='stable')[:np.count_nonzero(first < len(traits))].tolist()
+
+        keys = self.trait_keys
+        trait_scores = {keys[i]: int(sums[i]) for i in order}
+        trait_maxima = {keys[i]: int(self.trait_max_vec[i]) for i in order}
+        return self.build_trait_map(trait_scores, trait_maxima)
+
+
+class ScoreMemo:
+    """
+    Ограниченный LRU-кэш с TTL готовых результатов подсчёта в памяти процесса.
+
+    Ключ — (id теста, версия плана, последовательность id ответов). Порядок id
+    сохраняется: от него зависит порядок черт в карте личности. Возвращаемые
+    словари общие для всех попаданий и не должны изменяться вызывающим кодом.
+    """
+
+    def __init__(self, max_entries=10000, ttl=1800):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(plan, answers):
+        return (plan.test_id, plan.version, tuple(answers.values()))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, test_id):
+        """Удаляет все записи теста (старые версии и так недостижимы по ключу)"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == test_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0,
+            }
+
+
+# Подсчёт в пуле процессов: план передаётся в каждый процесс один раз
+_worker_plan = None
+
+
+def init_scoring_worker(plan):
+    global _worker_plan
+    _worker_plan = plan
+
+
+def score_rows(rows, extra_answers=None):
+    """Считает [(ключ, answers), ...] планом процесса: [(ключ, personality_map, scores), ...]"""
+    plan = _worker_plan
+    return [(key, *plan.score(answers, extra_answers)) for key, answers in rows]
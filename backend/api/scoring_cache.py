@@ -0,0 +1,120 @@
+"""
+Кэш скомпилированных планов подсчёта (см. api.scoring.ScoringPlan).
+
+Ключ кэша включает Test.scoring_version, поэтому любое изменение теста,
+его вопросов или ответов (см. signals.py) автоматически делает старый план
+недостижимым во всех процессах.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Test, Question, Answer
+from .scoring import ScoreMemo, ScoringPlan, VectorScoringPlan, np
+
+
+# Мемоизация результатов для коротких тестов (PHQ-9, GAD-7, TIPI, MBTI short)
+score_memo = ScoreMemo(
+    max_entries=getattr(settings, 'SCORING_MEMO_SIZE', 10000),
+    ttl=getattr(settings, 'SCORING_MEMO_TTL', 1800),
+)
+
+
+def scoring_plan_cache_key(test_id, version):
+    return f'scoring_plan:{test_id}:{version}'
+
+
+def scoring_plan_class(question_count):
+    """Выбирает реализацию плана по настройке SCORING_BACKEND и длине теста"""
+    backend = getattr(settings, 'SCORING_BACKEND', 'python')
+    min_questions = getattr(settings, 'SCORING_NUMPY_MIN_QUESTIONS', 0)
+    if backend == 'numpy' and np is not None and question_count >= min_questions:
+        return VectorScoringPlan
+    return ScoringPlan
+
+
+def scoring_definition(test):
+    """Сериализованное определение теста для ScoringPlan.from_definition (два запроса к БД)"""
+    questions = {
+        qid: {'id': qid, 'order': order, 'answers': []}
+        for qid, order in Question.objects.filter(test_id=test.id).order_by('order', 'id').values_list('id', 'order')
+    }
+    answer_rows = Answer.objects.filter(question__test_id=test.id).order_by('id').values_list(
+        'id', 'question_id', 'value', 'personality_trait'
+    )
+    for answer_id, question_id, value, trait in answer_rows:
+        questions[question_id]['answers'].append({'id': answer_id, 'value': value, 'personality_trait': trait})
+    return {
+        'test_id': test.id,
+        'version': test.scoring_version,
+        'name': test.name,
+        'result_definitions': test.result_definitions,
+        'questions': list(questions.values()),
+    }
+
+
+def build_scoring_plan(test):
+    """Собирает план теста по его сериализованному определению"""
+    definition = scoring_definition(test)
+    plan_class = scoring_plan_class(len(definition['questions']))
+    return plan_class.from_definition(definition)
+
+
+def get_scoring_plan(test):
+    """Возвращает план теста из кэша или собирает и кэширует его"""
+    key = scoring_plan_cache_key(test.id, test.scoring_version)
+    plan = cache.get(key)
+    if plan is None:
+        plan = build_scoring_plan(test)
+        cache.set(key, plan, settings.CACHE_TIMEOUT_LONG)
+    return plan
+
+
+def load_extra_answers(answer_ids):
+    """
+    Загружает ответы, не принадлежащие тесту плана.
+
+    Такие ответы исторически тоже учитывались при подсчёте, поэтому для
+    совместимости подгружаем их одним запросом в формате плана.
+    """
+    if not answer_ids:
+        return None
+    rows = {}
+    question_max = {}
+    answers = Answer.objects.filter(id__in=answer_ids).select_related('question').prefetch_related('question__answers')
+    for a in answers:
+        qid = str(a.question_id)
+        rows[a.id] = (qid, a.question.order, a.personality_trait, a.value)
+        if qid not in question_max:
+            question_max[qid] = max((x.value for x in a.question.answers.all()), default=0)
+    return rows, question_max
+
+
+def score_answers(test, answers, plan=None):
+    """
+    Подсчитывает карту личности и баллы для словаря {question_id: answer_id}.
+    Для коротких тестов результат берётся из score_memo, если такой набор
+    ответов уже встречался.
+    """
+    plan = plan or get_scoring_plan(test)
+    missing = plan.missing_answer_ids(answers)
+    if missing:
+        # Ответы из чужих тестов зависят не только от версии этого теста — не кэшируем
+        return plan.score(answers, load_extra_answers(missing))
+
+    if plan.question_count > getattr(settings, 'SCORING_MEMO_MAX_QUESTIONS', 30):
+        return plan.score(answers)
+    key = score_memo.key(plan, answers)
+    result = score_memo.get(key)
+    if result is None:
+        result = plan.score(answers)
+        score_memo.set(key, result)
+    return result
+
+
+def bump_scoring_version(test_ids):
+    """Увеличивает версию схемы подсчёта у указанных тестов"""
+    test_ids = list(test_ids)
+    Test.objects.filter(id__in=test_ids).update(scoring_version=F('scoring_version') + 1)
+    for test_id in test_ids:
+        score_memo.invalidate(test_id)
@@ -0,0 +1,166 @@
+"""
+Подсчёт баллов вне веб-приложения (без Django).
+
+Определения тестов выгружаются командой
+    python manage.py export_scoring_definitions --output definitions.json
+после чего наборы ответов в формате JSON lines
+    {"id": "любой ключ", "test_id": 5, "answers": {"<question_id>": <answer_id>, ...}}
+считаются на всех ядрах:
+    python -m api.scoring_cli definitions.json responses.jsonl -o scored.jsonl
+
+Результаты пишутся потоком в порядке входа:
+    {"id": ..., "test_id": ..., "personality_map": {...}, "scores": {...}}
+или {"id": ..., "test_id": ..., "error": "..."} для строк, которые не удалось посчитать.
+
+Ответы из других тестов сервер тоже учитывает (api.scoring_cache.load_extra_answers);
+здесь они ищутся среди всех загруженных определений. Если ответа нет ни в
+одном из них (выгружены не все тесты), строка всё равно считается, но
+получает "warning" со списком таких ответов: баллы могут не совпасть с серверными.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import sys
+
+from .scoring import ScoringPlan, VectorScoringPlan, np
+
+_plans = {}
+# answer_id -> (строка ответа в формате ScoringPlan.answers, максимум его вопроса) по всем тестам
+_answer_index = {}
+
+
+def load_plans(definitions, vector=False):
+    """{test_id: ScoringPlan} из списка сериализованных определений"""
+    plan_class = VectorScoringPlan if vector and np is not None else ScoringPlan
+    return {d['test_id']: plan_class.from_definition(d) for d in definitions}
+
+
+def answer_index(plans):
+    """Ответы всех загруженных тестов — для ответов из чужих тестов, как на сервере"""
+    index = {}
+    for plan in plans.values():
+        for answer_id, row in plan.answers.items():
+            index[answer_id] = (row, plan.question_max[row[0]])
+    return index
+
+
+def init_worker(plans):
+    global _plans, _answer_index
+    _plans = plans
+    _answer_index = answer_index(plans)
+
+
+def extra_answers(missing):
+    """(строки, максимумы вопросов) для ответов из чужих тестов и id, которых нет в определениях"""
+    rows, question_max, unknown = {}, {}, []
+    for answer_id in missing:
+        found = _answer_index.get(answer_id)
+        if found is None:
+            unknown.append(answer_id)
+            continue
+        rows[answer_id], question_max[found[0][0]] = found
+    return (rows, question_max) if rows else None, unknown
+
+
+def score_lines(lines):
+    """Считает пачку строк JSON lines, возвращает строки результата"""
+    out = []
+    for line in lines:
+        record_id = test_id = None
+        try:
+            record = json.loads(line)
+            record_id = record.get('id')
+            test_id = record.get('test_id')
+            plan = _plans.get(test_id)
+            if plan is None:
+                raise KeyError(f'нет определения теста {test_id}')
+            # JSON не сохраняет int-значения ключей, значения ответов приводим явно
+            answers = {str(q): int(a) for q, a in record['answers'].items()}
+            extra, unknown = extra_answers(plan.missing_answer_ids(answers))
+            personality_map, scores = plan.score(answers, extra)
+            result = {'id': record_id, 'test_id': test_id, 'personality_map': personality_map, 'scores': scores}
+            if unknown:
+                result['warning'] = (
+                    f'ответы {sorted(unknown)} не найдены в определениях тестов и не учтены; '
+                    'на сервере они учитываются, если существуют (выгрузите все тесты)'
+                )
+        except Exception as e:
+            result = {'id': record_id, 'test_id': test_id, 'error': f'{type(e).__name__}: {e}'}
+        out.append(json.dumps(result, ensure_ascii=False))
+    return out
+
+
+def iter_chunks(stream, chunk_size):
+    chunk = []
+    for line in stream:
+        if line.strip():
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def score_stream(plans, source, target, workers=1, chunk_size=2000):
+    """Считает строки source и пишет результаты в target. Возвращает число строк"""
+    count = 0
+    if workers <= 1:
+        init_worker(plans)
+        for chunk in iter_chunks(source, chunk_size):
+            for line in score_lines(chunk):
+                target.write(line + '\n')
+            count += len(chunk)
+        return count
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(plans,)) as pool:
+        pending = deque()
+
+        def drain_one():
+            lines = pending.popleft().result()
+            for line in lines:
+                target.write(line + '\n')
+            return len(lines)
+
+        for chunk in iter_chunks(source, chunk_size):
+            pending.append(pool.submit(score_lines, chunk))
+            # Ограничиваем число пачек в памяти
+            if len(pending) >= workers * 2:
+                count += drain_one()
+        while pending:
+            count += drain_one()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Подсчёт баллов тестов для файлов JSON lines')
+    parser.add_argument('definitions', help='JSON с определениями тестов (export_scoring_definitions)')
+    parser.add_argument('responses', help="Файл JSON lines с наборами ответов ('-' — stdin)")
+    parser.add_argument('-o', '--output', default='-', help="Файл результата ('-' — stdout)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Количество процессов')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='Строк в одной пачке')
+    parser.add_argument('--numpy', action='store_true', help='Векторное ядро numpy (для длинных тестов)')
+    args = parser.parse_args(argv)
+
+    with open(args.definitions, 'r', encoding='utf-8') as f:
+        definitions = json.load(f)
+    if isinstance(definitions, dict):
+        definitions = [definitions]
+    plans = load_plans(definitions, vector=args.numpy)
+
+    source = sys.stdin if args.responses == '-' else open(args.responses, 'r', encoding='utf-8')
+    target = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        count = score_stream(plans, source, target, workers=args.workers, chunk_size=max(1, args.chunk_size))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    print(f'Обработано строк: {count}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Test, Question, Answer, UserProfile, TestResult, PsyToolkitTest, PsyToolkitImportLog
+from .norms import load_norms, score_percentiles
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -151,6 +152,53 @@ class TestSubmissionSerializer(serializers.Serializer):
     )
 
 
+class TestSessionAnswerSerializer(serializers.Serializer):
+    answers = serializers.DictField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        help_text="Ответы на один или несколько вопросов: ID вопроса -> ID ответа"
+    )
+    response_time = serializers.DictField(
+        child=serializers.FloatField(),
+        required=False,
+        help_text="Время ответа на эти вопросы в секундах"
+    )
+
+
+class TestSessionFinishSerializer(serializers.Serializer):
+    metadata = serializers.DictField(
+        required=False,
+        help_text="Дополнительные метаданные"
+    )
+
+
+class TestBatchItemSerializer(TestSubmissionSerializer):
+    user_id = serializers.IntegerField(
+        required=False,
+        help_text="ID пользователя, за которого сохраняется результат (только для персонала)"
+    )
+
+
+class TestBatchSubmissionSerializer(serializers.Serializer):
+    submissions = TestBatchItemSerializer(
+        many=True,
+        allow_empty=False,
+        help_text="Список наборов ответов в формате обычной отправки теста"
+    )
+
+
+class TestBatteryItemSerializer(TestSubmissionSerializer):
+    test_id = serializers.IntegerField(help_text="ID теста")
+
+
+class TestBatterySubmissionSerializer(serializers.Serializer):
+    tests = TestBatteryItemSerializer(
+        many=True,
+        allow_empty=False,
+        help_text="Ответы на несколько тестов в формате обычной отправки теста"
+    )
+
+
 class TestResultSerializer(serializers.ModelSerializer):
     test = TestSerializer(read_only=True)
     personality_map = serializers.JSONField(read_only=True)
@@ -158,11 +206,38 @@ class TestResultSerializer(serializers.ModelSerializer):
     response_time = serializers.JSONField(read_only=True)
     confidence_levels = serializers.JSONField(read_only=True)
     metadata = serializers.JSONField(read_only=True)
+    percentiles = serializers.SerializerMethodField()
     
     class Meta:
         model = TestResult
-        fields = ('id', 'test', 'answers', 'personality_map', 'score', 'response_time', 
+        fields = ('id', 'test', 'answers', 'personality_map', 'score', 'percentiles', 'response_time', 
                  'confidence_levels', 'metadata', 'completed_at', 'psy_toolkit_result_id')
+    
+    def get_percentiles(self, obj):
+        # Нормы теста читаются один раз на весь список результатов
+        norms = self.context.setdefault('norms', {})
+        if obj.test_id not in norms:
+            norms.update(load_norms([obj.test_id]))
+        return score_percentiles(norms[obj.test_id], obj.score)
+
+
+class TraitHistoryEntrySerializer(serializers.ModelSerializer):
+    """Точка полной истории черты; черта передаётся в context['trait']"""
+    result_id = serializers.IntegerField(source='id', read_only=True)
+    test_id = serializers.IntegerField(read_only=True)
+    test_name = serializers.CharField(source='test.name', read_only=True)
+    score = serializers.SerializerMethodField()
+    confidence = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = TestResult
+        fields = ('result_id', 'test_id', 'test_name', 'score', 'confidence', 'completed_at')
+    
+    def get_score(self, obj):
+        return obj.score.get(self.context['trait'])
+    
+    def get_confidence(self, obj):
+        return (obj.confidence_levels or {}).get(self.context['trait'], 0)
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -174,6 +249,13 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = UserProfile
         fields = ('id', 'user', 'created_at', 'updated_at', 'history', 'dynamic_profile', 
                  'psy_toolkit_preferences', 'completed_psy_toolkit_tests')
+    
+    def update(self, instance, validated_data):
+        # Пишем только изменённые поля, не затирая параллельную сборку динамического профиля
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
 
 
 class DynamicProfileSerializer(serializers.Serializer):
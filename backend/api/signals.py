@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import UserProfile, Test, Question, Answer, TestResult, TraitScore
+from .norms import apply_norm_deltas, norm_deltas
+from .profile_queue import mark_profiles_changed
+from .scoring_cache import bump_scoring_version
 
 
 @receiver(post_save, sender=User)
@@ -13,9 +16,44 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    """Сохраняет профиль пользователя при обновлении пользователя"""
-    try:
-        instance.profile.save()
-    except UserProfile.DoesNotExist:
-        # Если профиль не существует, создаем его
+    """Создаёт профиль, если его нет"""
+    # Профиль не пересохраняем целиком: это затёрло бы параллельную запись динамического профиля
+    if not UserProfile.objects.filter(user=instance).exists():
         UserProfile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Test)
+def invalidate_test_scoring_plan(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Название и result_definitions влияют на подсчёт — при их изменении сбрасываем
+    план. Сохранения других полей (is_active, описание) план не трогают.
+    """
+    if not created and not instance.scoring_fields_changed(update_fields):
+        return
+    bump_scoring_version([instance.pk])
+    instance.remember_scoring_fields()
+    # Версия увеличена в БД — объект не должен держать прежнюю
+    instance.refresh_from_db(fields=['scoring_version'])
+
+
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_question_scoring_plan(sender, instance, **kwargs):
+    bump_scoring_version([instance.test_id])
+
+
+@receiver([post_save, post_delete], sender=Answer)
+def invalidate_answer_scoring_plan(sender, instance, **kwargs):
+    bump_scoring_version(Question.objects.filter(id=instance.question_id).values_list('test_id', flat=True))
+
+
+@receiver(post_delete, sender=TestResult)
+def invalidate_dynamic_profile(sender, instance, **kwargs):
+    """Удалённый результат не должен оставаться в сохранённом профиле"""
+    mark_profiles_changed([instance.user_id])
+
+
+@receiver(pre_delete, sender=TestResult)
+def remove_result_from_norms(sender, instance, **kwargs):
+    """Баллы удаляемого результата вычитаются из популяционных норм (строки TraitScore удалит каскад)"""
+    rows = TraitScore.objects.filter(result_id=instance.pk).values_list('test_id', 'trait_id', 'normalized')
+    apply_norm_deltas(norm_deltas(rows, -1))
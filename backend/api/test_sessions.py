@@ -0,0 +1,94 @@
+"""
+Сессии прохождения тестов с накопительным подсчётом.
+
+Клиент открывает сессию, отправляет ответы по одному-нескольким вопросам и
+завершает её. Состояние (api.scoring.ScoringSession с текущими суммами черт)
+хранится в кэше под ключом test_session:<uuid> и живёт TEST_SESSION_TIMEOUT
+секунд с последнего ответа. Для нескольких процессов нужен общий кэш (Redis,
+memcached), иначе сессия видна только процессу, который её открыл.
+
+Чтение, изменение и запись состояния идут под блокировкой сессии
+(cache.add ключа test_session:<uuid>:lock): параллельные ответы одной сессии
+применяются по очереди, а не перезаписывают друг друга. Запрос, не
+дождавшийся блокировки за TEST_SESSION_LOCK_WAIT секунд, получает 409.
+"""
+from contextlib import contextmanager
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .scoring import ScoringSession
+
+
+def test_session_cache_key(session_id):
+    return f'test_session:{session_id}'
+
+
+def session_timeout():
+    return getattr(settings, 'TEST_SESSION_TIMEOUT', 6 * 60 * 60)
+
+
+class TestSessionBusy(Exception):
+    """Сессию изменяет другой запрос, блокировка не освободилась за время ожидания"""
+
+
+@contextmanager
+def lock_test_session(session_id):
+    """
+    Блокировка сессии на время чтения и записи её состояния. Блокировка
+    истекает сама через TEST_SESSION_LOCK_TIMEOUT секунд, если процесс упал.
+    """
+    key = f'{test_session_cache_key(session_id)}:lock'
+    token = uuid.uuid4().hex
+    timeout = getattr(settings, 'TEST_SESSION_LOCK_TIMEOUT', 30)
+    deadline = time.monotonic() + getattr(settings, 'TEST_SESSION_LOCK_WAIT', 5)
+    while not cache.add(key, token, timeout):
+        if time.monotonic() >= deadline:
+            raise TestSessionBusy()
+        time.sleep(0.05)
+    try:
+        yield
+    finally:
+        # Не снимаем чужую блокировку, если наша успела истечь
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def start_test_session(user, plan):
+    """Открывает сессию и возвращает её состояние"""
+    state = {
+        'id': uuid.uuid4().hex,
+        'user_id': user.id,
+        'test_id': plan.test_id,
+        'started_at': timezone.now().isoformat(),
+        'response_time': {},
+        'scoring': ScoringSession(plan),
+    }
+    save_test_session(state)
+    return state
+
+
+def get_test_session(session_id, user):
+    """Состояние сессии пользователя или None, если она не найдена или истекла"""
+    state = cache.get(test_session_cache_key(session_id))
+    if state is None or state['user_id'] != user.id:
+        return None
+    return state
+
+
+def sync_test_session(state, plan):
+    """Пересобирает суммы, если с начала сессии изменилась схема подсчёта теста"""
+    if state['scoring'].version != plan.version:
+        state['scoring'] = ScoringSession.replay(plan, state['scoring'].answers)
+    return state['scoring']
+
+
+def save_test_session(state):
+    cache.set(test_session_cache_key(state['id']), state, session_timeout())
+
+
+def delete_test_session(state):
+    cache.delete(test_session_cache_key(state['id']))
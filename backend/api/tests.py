@@ -0,0 +1,44 @@
+from django.test import SimpleTestCase
+
+from .scoring import ScoringPlan, ScoringSession
+
+
+def dimension_plan():
+    """Схема измерений, где вопросы 10 и 11 делят порядковый номер 1"""
+    return ScoringPlan.from_definition({
+        'test_id': 1,
+        'name': 'Attachment',
+        'result_definitions': {
+            'scoring': {'dimensions': {'d1': [1], 'd2': [2]}},
+            'graph': {'max_score': 6},
+        },
+        'questions': [
+            {'id': 10, 'order': 1, 'answers': [{'id': 101, 'value': 1}, {'id': 102, 'value': 2}]},
+            {'id': 11, 'order': 1, 'answers': [{'id': 111, 'value': 5}, {'id': 112, 'value': 6}]},
+            {'id': 12, 'order': 2, 'answers': [{'id': 121, 'value': 3}, {'id': 122, 'value': 4}]},
+        ],
+    })
+
+
+class ScoringSessionTests(SimpleTestCase):
+
+    def test_replaced_answer_with_shared_order_matches_plan(self):
+        plan = dimension_plan()
+        session = ScoringSession(plan)
+        for question_id, answer_id in ((10, 101), (11, 111), (12, 121), (10, 102)):
+            session.add(plan, question_id, answer_id)
+        self.assertEqual(session.finish(plan), plan.score(session.answers))
+        self.assertEqual(session.finish(plan)[1]['d1'], 83)
+
+    def test_replaced_owner_of_shared_order_matches_plan(self):
+        plan = dimension_plan()
+        session = ScoringSession(plan)
+        for question_id, answer_id in ((10, 101), (11, 111), (12, 121), (11, 112), (10, 102)):
+            session.add(plan, question_id, answer_id)
+        self.assertEqual(session.finish(plan), plan.score(session.answers))
+        self.assertEqual(session.finish(plan)[1]['d1'], 100)
+
+    def test_replay_matches_plan(self):
+        plan = dimension_plan()
+        answers = {'11': 112, '10': 101, '12': 122}
+        self.assertEqual(ScoringSession.replay(plan, answers).finish(plan), plan.score(answers))
@@ -0,0 +1,107 @@
+"""
+Агрегаты баллов черт на стороне БД.
+
+aggregate_trait_scores() разворачивает TestResult.score функциями JSON базы
+данных (json_each в SQLite, jsonb_each в PostgreSQL) и возвращает по каждой
+паре (тест, черта) только количество, сумму и сумму квадратов баллов — без
+передачи самих результатов в Python. Учитываются числа и логические
+значения (как 0/1). Если баллы всех результатов уже есть в TraitScore
+(api.trait_scores), агрегаты считаются обычным GROUP BY по этой таблице. Для
+остальных СУБД баллы читаются порциями и суммируются в Python.
+"""
+from django.db import connection
+from django.db.models import Count, F, Min, Sum
+
+from .models import Test, TestResult, TraitScore
+from .trait_scores import has_trait_scores
+from .utils import ProfileStatistics, RunningStats, display_trait_key
+
+AGGREGATE_SQL = {
+    'sqlite': """
+        SELECT r.test_id, je.key, COUNT(*), SUM(je.value), SUM(je.value * je.value), MIN(r.completed_at)
+        FROM {table} r, json_each(r.score) je
+        WHERE r.id IN ({ids}) AND je.type IN ('integer', 'real', 'true', 'false')
+        GROUP BY r.test_id, je.key
+    """,
+    'postgresql': """
+        SELECT r.test_id, je.key, COUNT(v.score), SUM(v.score), SUM(v.score * v.score), MIN(r.completed_at)
+        FROM {table} r
+        CROSS JOIN LATERAL jsonb_each(r.score) je
+        CROSS JOIN LATERAL (SELECT CASE jsonb_typeof(je.value)
+            WHEN 'number' THEN (je.value #>> '{{}}')::float8
+            WHEN 'boolean' THEN (je.value::text)::boolean::int::float8
+            END AS score) v
+        WHERE r.id IN ({ids}) AND jsonb_typeof(je.value) IN ('number', 'boolean')
+        GROUP BY r.test_id, je.key
+    """,
+}
+
+
+def aggregate_trait_scores(results):
+    """
+    [(test_id, черта, количество, сумма, сумма квадратов, первое появление)]
+    по баллам результатов queryset results
+    """
+    if has_trait_scores(results):
+        return aggregate_trait_scores_table(results)
+    sql = AGGREGATE_SQL.get(connection.vendor)
+    if sql is None:
+        return aggregate_trait_scores_python(results)
+    ids_sql, params = results.values('id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(table=TestResult._meta.db_table, ids=ids_sql), params)
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def aggregate_trait_scores_table(results):
+    rows = (
+        TraitScore.objects.filter(result_id__in=results.values('id'))
+        .values_list('test_id', 'trait__name')
+        .annotate(
+            count=Count('id'), total=Sum('normalized'),
+            sumsq=Sum(F('normalized') * F('normalized')), first_at=Min('completed_at')
+        )
+        .order_by()
+    )
+    return [tuple(row) for row in rows]
+
+
+def aggregate_trait_scores_python(results):
+    groups = {}
+    rows = results.order_by().values_list('test_id', 'score', 'completed_at').iterator(chunk_size=2000)
+    for test_id, scores, completed_at in rows:
+        if not isinstance(scores, dict):
+            continue
+        for trait, score in scores.items():
+            # bool — как 0/1, так же как при добавлении результатов в статистику
+            if not isinstance(score, (int, float)):
+                continue
+            group = groups.get((test_id, trait))
+            if group is None:
+                group = groups[(test_id, trait)] = [0, 0, 0, completed_at]
+            group[0] += 1
+            group[1] += score
+            group[2] += score * score
+            group[3] = min(group[3], completed_at)
+    return [(test_id, trait, *group) for (test_id, trait), group in groups.items()]
+
+
+def statistics_from_aggregates(results):
+    """
+    ProfileStatistics со счётчиками, средними и дисперсиями черт (traits и
+    display) по агрегатам БД. История, окна, пары и уверенность не
+    заполняются, первого и последнего балла нет — годится для разделов,
+    которым нужны только эти величины (см. api.profile_sections).
+    """
+    rows = aggregate_trait_scores(results)
+    # Черты — в порядке первого появления, как при последовательном добавлении результатов
+    rows.sort(key=lambda row: (str(row[5]), row[0], row[1]))
+    names = dict(Test.objects.filter(id__in={row[0] for row in rows}).values_list('id', 'name'))
+    stats = ProfileStatistics()
+    stats.results = results.count()
+    for test_id, trait, count, total, sumsq, _ in rows:
+        for group, key in ((stats.traits, trait), (stats.display, display_trait_key(trait, names.get(test_id)))):
+            if key not in group:
+                group[key] = RunningStats()
+            group[key].merge(RunningStats.from_sums(count, total, sumsq))
+    return stats
@@ -0,0 +1,132 @@
+"""
+Нормализованные баллы черт (TraitScore) рядом с JSON TestResult.score.
+
+Каждый числовой балл результата хранится отдельной строкой с целым id черты
+из словаря Trait, сырым баллом и датой завершения результата — запросы по
+многим результатам (профили, нормы, фильтры админки) идут по индексам
+(user, trait) и (test, trait) без разбора JSON в Python. Строки пишутся при
+сохранении результата (TestResult.save, TestResult.create_many) и при
+пересчёте баллов (api.rescoring); для результатов, сохранённых раньше,
+таблицу заполняет команда backfill_trait_scores. Вместе с баллами
+обновляются популяционные нормы (api.norms).
+"""
+from django.db import transaction
+
+from .models import TestResult, Trait, TraitScore
+from .norms import apply_norm_deltas, norm_deltas
+
+ROW_FIELDS = ('id', 'user_id', 'test_id', 'score', 'personality_map', 'completed_at')
+RESULT_CHUNK_SIZE = 2000
+
+
+def intern_traits(names):
+    """{ключ черты: id} для ключей names; недостающие записи Trait создаются"""
+    names = set(names)
+    ids = dict(Trait.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - ids.keys()
+    if missing:
+        # Ключ мог добавить параллельный запрос — конфликты пропускаем и перечитываем
+        Trait.objects.bulk_create([Trait(name=name) for name in missing], ignore_conflicts=True)
+        ids.update(Trait.objects.filter(name__in=missing).values_list('name', 'id'))
+    return ids
+
+
+def raw_trait_scores(scores, personality_map):
+    """
+    {ключ черты: сырой балл} по карте личности. В карте черты записаны под
+    отображаемыми именами, поэтому балл черты сопоставляется с записями карты
+    с тем же нормализованным баллом; если их сырые баллы расходятся, сырой
+    балл черты неизвестен (None).
+    """
+    traits = personality_map.get('traits') if isinstance(personality_map, dict) else None
+    if not isinstance(traits, dict):
+        return {}
+    by_score = {}
+    for entry in traits.values():
+        if isinstance(entry, dict) and 'raw_score' in entry:
+            by_score.setdefault(entry.get('score'), set()).add(entry['raw_score'])
+    raw = {}
+    for trait, score in scores.items():
+        candidates = by_score.get(score, ())
+        if len(candidates) == 1:
+            value = next(iter(candidates))
+            raw[trait] = float(value) if isinstance(value, (int, float)) else None
+    return raw
+
+
+def trait_score_rows(rows):
+    """
+    TraitScore (без id черты) по строкам (id, user_id, test_id, score,
+    personality_map, completed_at). Учитываются числа и логические значения
+    (как 0/1), как и в статистике черт.
+    """
+    built = []
+    for result_id, user_id, test_id, scores, personality_map, completed_at in rows:
+        if not isinstance(scores, dict):
+            continue
+        raw = raw_trait_scores(scores, personality_map)
+        for trait, score in scores.items():
+            if not isinstance(score, (int, float)):
+                continue
+            built.append((trait, TraitScore(
+                result_id=result_id, user_id=user_id, test_id=test_id,
+                raw=raw.get(trait), normalized=float(score), completed_at=completed_at
+            )))
+    return built
+
+
+def write_trait_scores(rows, replace=True):
+    """Записывает баллы черт строк результатов; replace — сначала удалить прежние"""
+    rows = list(rows)
+    if not rows:
+        return 0
+    built = trait_score_rows(rows)
+    trait_ids = intern_traits({trait for trait, _ in built})
+    for trait, score in built:
+        score.trait_id = trait_ids[trait]
+    deltas = norm_deltas((score.test_id, score.trait_id, score.normalized) for _, score in built)
+    with transaction.atomic():
+        if replace:
+            previous = TraitScore.objects.filter(result_id__in=[row[0] for row in rows])
+            norm_deltas(previous.values_list('test_id', 'trait_id', 'normalized'), -1, deltas)
+            previous.delete()
+        TraitScore.objects.bulk_create([score for _, score in built], batch_size=1000)
+        # Популяционные нормы меняются в той же транзакции
+        apply_norm_deltas(deltas)
+    return len(built)
+
+
+def store_trait_scores(results, replace=False):
+    """Записывает баллы черт сохранённых объектов TestResult"""
+    return write_trait_scores(
+        [tuple(getattr(result, field) for field in ROW_FIELDS) for result in results], replace=replace
+    )
+
+
+def rebuild_trait_scores(results, chunk_size=RESULT_CHUNK_SIZE):
+    """
+    Перезаписывает баллы черт результатов queryset results, читая их
+    порциями. Возвращает (результатов, строк TraitScore).
+    """
+    rows = results.order_by('id').values_list(*ROW_FIELDS).iterator(chunk_size=chunk_size)
+    processed = written = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            written += write_trait_scores(chunk)
+            processed += len(chunk)
+            chunk = []
+    written += write_trait_scores(chunk)
+    return processed + len(chunk), written
+
+
+def missing_trait_scores(results=None):
+    """Результаты с баллами, для которых ещё нет строк TraitScore"""
+    results = TestResult.objects.all() if results is None else results
+    return results.filter(trait_scores__isnull=True).exclude(score={})
+
+
+def has_trait_scores(results):
+    """True, если баллы всех результатов queryset results есть в TraitScore"""
+    return not missing_trait_scores(results).exists()
@@ -0,0 +1,192 @@
+"""
+Хранение накопленной статистики черт пользователя (api.utils.ProfileStatistics).
+
+Статистика лежит в строках TraitStatistic/TraitPairStatistic, а в профиле —
+id последнего учтённого результата, число учтённых результатов и последние
+баллы черт по тестам. При обновлении профиля из БД читаются только
+результаты новее последнего учтённого; если число учтённых результатов не
+сходится (результаты удалены, статистика ещё не заполнена или сброшена после
+пересчёта баллов) или новый результат завершён раньше уже учтённых,
+статистика собирается заново по всей истории.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q
+
+from .models import TestResult, TraitPairStatistic, TraitStatistic, UserProfile
+from .utils import PairMoments, ProfileStatistics, RunningStats, TraitHistory, TraitWindows
+
+STATE_FIELDS = ('trait_stats_last_result', 'trait_stats_results', 'trait_stats_tests')
+RESULT_FIELDS = ('id', 'test_id', 'test__name', 'score', 'completed_at', 'confidence_levels')
+PAIR_FIELDS = ('count', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'sum_yy')
+RESULT_CHUNK_SIZE = 2000
+# Сколько раз повторять обновление, если статистику параллельно записал другой запрос
+STATS_WRITE_ATTEMPTS = 3
+
+
+def load_profile_statistics(user_id, results, test_scores, kinds=None):
+    """
+    Читает статистику пользователя; возвращает (stats, {(вид, ключ): id строки}).
+    kinds — какие виды строк читать ('trait', 'display', 'confidence', 'pair'),
+    по умолчанию все.
+    """
+    stats = ProfileStatistics()
+    stats.results = results
+    stats.test_scores = test_scores or {}
+    row_ids = {}
+    groups = {'trait': stats.traits, 'display': stats.display, 'confidence': stats.confidence}
+    rows = TraitStatistic.objects.filter(user_id=user_id)
+    if kinds is not None:
+        rows = rows.filter(kind__in=[kind for kind in kinds if kind in groups])
+    for row in rows.order_by('id'):
+        groups[row.kind][row.trait] = RunningStats(
+            row.count, row.total, row.mean, row.m2, row.first_score, row.last_score
+        )
+        if row.kind == 'trait':
+            stats.history[row.trait] = TraitHistory.from_dict(row.history)
+            stats.windows[row.trait] = TraitWindows.from_dict(row.windows)
+        row_ids[(row.kind, row.trait)] = row.id
+    if kinds is not None and 'pair' not in kinds:
+        return stats, row_ids
+    for row in TraitPairStatistic.objects.filter(user_id=user_id).order_by('id'):
+        stats.pairs[(row.trait1, row.trait2)] = PairMoments(*(getattr(row, f) for f in PAIR_FIELDS))
+        row_ids[('pair', (row.trait1, row.trait2))] = row.id
+    return stats, row_ids
+
+
+def save_profile_statistics(user_id, stats, row_ids):
+    """Записывает изменённые строки статистики (stats.changed)"""
+    groups = {'trait': stats.traits, 'display': stats.display, 'confidence': stats.confidence}
+    trait_rows = ([], [])
+    pair_rows = ([], [])
+    # Порядок создания строк — порядок первого появления черт
+    for kind, key in stats.changed:
+        row_id = row_ids.get((kind, key))
+        if kind == 'pair':
+            moments = stats.pairs[key]
+            row = TraitPairStatistic(
+                id=row_id, user_id=user_id, trait1=key[0], trait2=key[1],
+                **{f: getattr(moments, f) for f in PAIR_FIELDS}
+            )
+            pair_rows[row_id is None].append(row)
+            continue
+        running = groups[kind][key]
+        row = TraitStatistic(
+            id=row_id, user_id=user_id, kind=kind, trait=key,
+            count=running.count, total=running.total, mean=running.mean, m2=running.m2,
+            first_score=running.first, last_score=running.last,
+            history=stats.history[key].to_dict() if kind == 'trait' and key in stats.history else {},
+            windows=stats.windows[key].to_dict() if kind == 'trait' and key in stats.windows else {}
+        )
+        trait_rows[row_id is None].append(row)
+
+    TraitStatistic.objects.bulk_update(
+        trait_rows[0], ['count', 'total', 'mean', 'm2', 'first_score', 'last_score', 'history', 'windows']
+    )
+    TraitStatistic.objects.bulk_create(trait_rows[1])
+    TraitPairStatistic.objects.bulk_update(pair_rows[0], list(PAIR_FIELDS))
+    TraitPairStatistic.objects.bulk_create(pair_rows[1])
+    stats.changed.clear()
+
+
+def fold_results(stats, rows, rebuild=False):
+    """
+    Добавляет результаты; при полной пересборке ко-моменты пар считаются
+    разом в конце. Возвращает наибольший id добавленного результата (0 — не было).
+    """
+    last_result = 0
+    for result_id, test_id, test_name, score, completed_at, confidence_levels in rows:
+        stats.add_result(test_id, test_name, score, completed_at, confidence_levels, update_pairs=not rebuild)
+        last_result = max(last_result, result_id)
+    if rebuild:
+        stats.rebuild_pairs()
+    return last_result
+
+
+class StatisticsChanged(Exception):
+    """Статистику пользователя параллельно обновил другой запрос"""
+
+
+def refresh_profile_statistics(profile):
+    """
+    Учитывает в статистике новые результаты пользователя и возвращает её.
+    Поля состояния обновляются и в переданном объекте profile.
+
+    Состояние записывается сравнением-с-обменом по trait_stats_last_result и
+    trait_stats_results: select_for_update() в SQLite ничего не блокирует, и
+    два параллельных обновления могли бы учесть одни и те же результаты
+    дважды. Проигравшее обновление откатывается и повторяется по новому
+    состоянию.
+    """
+    for attempt in range(STATS_WRITE_ATTEMPTS):
+        try:
+            return _refresh_profile_statistics(profile)
+        except StatisticsChanged:
+            continue
+    # Статистику всё время кто-то меняет — отдаём записанную, без новых результатов
+    state = UserProfile.objects.filter(pk=profile.pk).values(*STATE_FIELDS).get()
+    for field in STATE_FIELDS:
+        setattr(profile, field, state[field])
+    return load_profile_statistics(profile.user_id, state['trait_stats_results'], state['trait_stats_tests'])[0]
+
+
+def _refresh_profile_statistics(profile):
+    results = TestResult.objects.filter(user_id=profile.user_id)
+    with transaction.atomic():
+        # Блокировка профиля там, где она есть (PostgreSQL): обновления одного пользователя идут по очереди
+        state = UserProfile.objects.select_for_update().filter(pk=profile.pk).values(*STATE_FIELDS).get()
+        last_result = state['trait_stats_last_result']
+        counts = results.aggregate(
+            n=Count('id', filter=Q(id__lte=last_result)),
+            folded_until=Max('completed_at', filter=Q(id__lte=last_result)),
+            new_from=Min('completed_at', filter=Q(id__gt=last_result)),
+        )
+        folded = counts['n']
+        rebuild = (
+            not folded or folded != state['trait_stats_results']
+            # Новый результат раньше уже учтённых (create_many, буфер с прошлыми датами):
+            # история, EWMA и окна добавляются только по времени
+            or (counts['new_from'] is not None and counts['new_from'] < counts['folded_until'])
+        )
+
+        if rebuild:
+            # Полная пересборка по всей истории
+            TraitStatistic.objects.filter(user_id=profile.user_id).delete()
+            TraitPairStatistic.objects.filter(user_id=profile.user_id).delete()
+            stats, row_ids = ProfileStatistics(), {}
+            last_result = 0
+        else:
+            stats, row_ids = load_profile_statistics(profile.user_id, folded, state['trait_stats_tests'])
+        rows = results.filter(id__gt=last_result).order_by('completed_at', 'id').values_list(*RESULT_FIELDS)
+
+        # Строки читаются порциями: длинная история не загружается в память целиком
+        folded_last = fold_results(stats, rows.iterator(chunk_size=RESULT_CHUNK_SIZE), rebuild)
+        if rebuild or folded_last:
+            save_profile_statistics(profile.user_id, stats, row_ids)
+            written = UserProfile.objects.filter(
+                pk=profile.pk,
+                trait_stats_last_result=state['trait_stats_last_result'],
+                trait_stats_results=state['trait_stats_results'],
+            )
+            state = {
+                'trait_stats_last_result': max(last_result, folded_last),
+                'trait_stats_results': stats.results,
+                'trait_stats_tests': stats.test_scores,
+            }
+            if not written.update(**state):
+                # Откатываем записанные строки статистики
+                raise StatisticsChanged()
+        for field in STATE_FIELDS:
+            setattr(profile, field, state[field])
+    return stats
+
+
+def reset_profile_statistics(user_ids):
+    """
+    Помечает статистику пользователей для полной пересборки (например, после
+    пересчёта баллов). Новая версия результатов делает устаревшими и
+    сохранённый профиль, и разделы профиля в кэше (api.profile_sections).
+    """
+    UserProfile.objects.filter(user_id__in=list(user_ids)).update(
+        trait_stats_last_result=0, trait_stats_results=0,
+        results_version=F('results_version') + 1
+    )
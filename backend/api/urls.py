@@ -6,16 +6,29 @@ urlpatterns = [
     path('tests/', views.TestListView.as_view(), name='test-list'),
     path('tests/<int:pk>/', views.TestDetailView.as_view(), name='test-detail'),
     path('tests/<int:test_id>/submit/', views.TestSubmissionView.as_view(), name='test-submit'),
+    path('tests/<int:test_id>/submit-batch/', views.TestBatchSubmissionView.as_view(), name='test-submit-batch'),
+    path('tests/<int:test_id>/sessions/', views.TestSessionStartView.as_view(), name='test-session-start'),
+    path('tests/sessions/<str:session_id>/answer/', views.TestSessionAnswerView.as_view(), name='test-session-answer'),
+    path('tests/sessions/<str:session_id>/finish/', views.TestSessionFinishView.as_view(), name='test-session-finish'),
+    path('tests/battery/submit/', views.TestBatterySubmissionView.as_view(), name='test-battery-submit'),
     
     # Результаты
     path('results/<int:pk>/', views.TestResultView.as_view(), name='result-detail'),
+    path('results/p<int:pk>/', views.PendingTestResultView.as_view(), name='pending-result-detail'),
     path('users/history/', views.UserHistoryView.as_view(), name='user-history'),
+    path('users/trait-history/', views.UserTraitHistoryView.as_view(), name='user-trait-history'),
+    
+    # Служебная статистика
+    path('scoring/memo-stats/', views.get_scoring_memo_statistics, name='scoring-memo-stats'),
+    path('profiles/queue-stats/', views.get_profile_queue_statistics, name='profile-queue-stats'),
+    path('tests/<int:test_id>/item-analysis/', views.get_test_item_analysis, name='test-item-analysis'),
     
     # Аутентификация
     path('auth/register/', views.RegisterView.as_view(), name='register'),
     path('auth/login/', views.LoginView.as_view(), name='login'),
     path('users/profile/', views.UserProfileView.as_view(), name='user-profile'),
     path('users/dynamic-profile/', views.UserDynamicProfileView.as_view(), name='user-dynamic-profile'),
+    path('users/dynamic-profile/changes/', views.UserDynamicProfileChangesView.as_view(), name='user-dynamic-profile-changes'),
     
     # PsyToolkit API
     path('psytoolkit/tests/', views.PsyToolkitViewSet.as_view(), name='psytoolkit-tests'),
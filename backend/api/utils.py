@@ -1,109 +1,592 @@
-from collections import defaultdict
-from datetime import datetime
+from datetime import date, datetime
 import json
 
+try:
+    import numpy as np
+except ImportError:  # numpy — необязательная зависимость (матричный расчёт корреляций)
+    np = None
 
-def analyze_user_patterns(test_results):
+# С какого числа черт корреляции считаются матрично (при установленном numpy)
+MATRIX_MIN_TRAITS = 8
+
+# Сколько точек истории черты хранится в профиле (полная история — через /users/trait-history/)
+TRAIT_HISTORY_POINTS = 64
+
+# Окна (в днях) для скользящей статистики черт и коэффициент сглаживания EWMA
+TRAIT_WINDOWS = (30, 90, 365)
+TRAIT_EWMA_ALPHA = 0.3
+# Изменение балла за окно (по наклону), с которого тренд окна не считается стабильным
+TRAIT_WINDOW_TREND_THRESHOLD = 5
+
+
+def display_trait_key(trait, test_name):
+    """Отображаемое имя черты в динамическом профиле"""
+    k = (trait or '').lower()
+    name_l = (test_name or '').lower()
+    if k in ['general_trait', 'general', 'trait']:
+        if 'pss' in name_l or 'stress' in name_l:
+            return 'Уровень стресса'
+        if 'rosenberg' in name_l or 'self-esteem' in name_l or 'self esteem' in name_l:
+            return 'Самооценка'
+        if 'satisfaction with life' in name_l or 'swls' in name_l:
+            return 'Удовлетворённость жизнью'
+        if 'phq' in name_l or 'beck' in name_l or 'bdi' in name_l:
+            return 'Уровень депрессии'
+        if 'gad' in name_l or 'anx' in name_l:
+            return 'Уровень тревожности'
+        if 'big five' in name_l or 'ipip' in name_l or 'big 5' in name_l:
+            return 'Черты Большой пятёрки'
+        return 'Итоговый показатель'
+    return trait
+
+
+class RunningStats:
     """
-    Анализирует паттерны пользователя на основе всех результатов тестов
+    Накопленная статистика ряда баллов: количество, сумма, среднее и M2
+    (алгоритм Уэлфорда), первый и последний балл. Добавление — O(1).
     """
-    patterns = {
-        'trait_evolution': {},
-        'inconsistencies': [],
-        'correlations': [],
-        'trends': {},
-        'confidence_patterns': {},
-        'response_time_patterns': {}
-    }
-    
-    if not test_results:
-        return patterns
-    
-    # Анализируем эволюцию черт личности
-    trait_history = defaultdict(list)
-    for result in test_results:
-        scores = result.score if isinstance(result.score, dict) else {}
+
+    __slots__ = ('count', 'total', 'mean', 'm2', 'first', 'last')
+
+    def __init__(self, count=0, total=0, mean=0.0, m2=0.0, first=None, last=None):
+        self.count = count
+        self.total = total
+        self.mean = mean
+        self.m2 = m2
+        self.first = first
+        self.last = last
+
+    @classmethod
+    def from_sums(cls, count, total, sumsq):
+        """Статистика по агрегатам (количество, сумма, сумма квадратов); первый и последний балл неизвестны"""
+        if not count:
+            return cls()
+        return cls(count, total, total / count, max(sumsq - total * total / count, 0))
+
+    def merge(self, other):
+        """Объединяет статистику двух непересекающихся рядов (первый/последний балл не сохраняются)"""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.total += other.total
+        self.count = count
+        self.first = self.last = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.count == 1:
+            self.first = value
+        self.last = value
+
+    @property
+    def average(self):
+        # Сумма / количество — то же значение, что и при подсчёте по всей истории
+        return self.total / self.count if self.count else 0
+
+    @property
+    def variance(self):
+        """Дисперсия генеральной совокупности"""
+        return self.m2 / self.count if self.count else 0
+
+    @property
+    def trend(self):
+        if self.count < 2:
+            return 'stable'
+        return 'increasing' if self.last > self.first else 'decreasing' if self.last < self.first else 'stable'
+
+
+class TraitHistory:
+    """
+    Прореженная история баллов черты ограниченного размера в колоночном виде.
+
+    Точки объединяются в корзины по bucket результатов подряд (балл корзины —
+    среднее, дата и тест — последнего результата в ней). Когда корзин
+    становится больше limit, соседние корзины сливаются попарно, а bucket
+    удваивается: история всегда покрывает весь период равномерно и занимает
+    не больше limit точек. Добавление — O(1) амортизированно, результат
+    зависит только от последовательности баллов.
+    """
+
+    __slots__ = ('limit', 'bucket', 'points', 'dates', 'scores', 'counts', 'test_ids', 'tests')
+
+    def __init__(self, limit=TRAIT_HISTORY_POINTS):
+        self.limit = limit
+        self.bucket = 1
+        self.points = 0
+        self.dates = []
+        self.scores = []
+        self.counts = []
+        self.test_ids = []
+        self.tests = {}
+
+    @classmethod
+    def from_dict(cls, data, limit=TRAIT_HISTORY_POINTS):
+        history = cls(limit)
+        if isinstance(data, dict):
+            history.bucket = data.get('bucket', 1)
+            history.points = data.get('points', 0)
+            for field in ('dates', 'scores', 'counts', 'test_ids'):
+                setattr(history, field, list(data.get(field, [])))
+            history.tests = dict(data.get('tests', {}))
+        return history
+
+    def to_dict(self):
+        return {
+            'bucket': self.bucket,
+            'points': self.points,
+            'dates': self.dates,
+            'scores': self.scores,
+            'counts': self.counts,
+            'test_ids': self.test_ids,
+            'tests': self.tests,
+        }
+
+    def add(self, test_id, test_name, score, date):
+        self.points += 1
+        self.tests[str(test_id)] = test_name
+        if self.counts and self.counts[-1] < self.bucket:
+            count = self.counts[-1]
+            self.scores[-1] = (self.scores[-1] * count + score) / (count + 1)
+            self.counts[-1] = count + 1
+            self.dates[-1] = date
+            replaced, self.test_ids[-1] = self.test_ids[-1], test_id
+            if replaced != test_id and replaced not in self.test_ids:
+                self.tests.pop(str(replaced), None)
+        else:
+            self.scores.append(score)
+            self.counts.append(1)
+            self.dates.append(date)
+            self.test_ids.append(test_id)
+        if len(self.counts) > self.limit:
+            self._compact()
+
+    def _compact(self):
+        """Сливает соседние корзины попарно и удваивает размер корзины"""
+        dates, scores, counts, test_ids = [], [], [], []
+        for i in range(0, len(self.counts), 2):
+            j = min(i + 1, len(self.counts) - 1)
+            count = self.counts[i] + (self.counts[j] if j != i else 0)
+            total = self.scores[i] * self.counts[i] + (self.scores[j] * self.counts[j] if j != i else 0)
+            scores.append(total / count)
+            counts.append(count)
+            dates.append(self.dates[j])
+            test_ids.append(self.test_ids[j])
+        self.dates, self.scores, self.counts, self.test_ids = dates, scores, counts, test_ids
+        self.bucket *= 2
+        used = {str(test_id) for test_id in test_ids}
+        self.tests = {k: v for k, v in self.tests.items() if k in used}
+
+    def series(self):
+        """Представление для профиля: колонки точек и их размер"""
+        return {
+            'points': self.points,
+            'bucket': self.bucket,
+            'dates': self.dates,
+            'scores': [round(score, 2) for score in self.scores],
+            'counts': self.counts,
+            'test_ids': self.test_ids,
+            'tests': self.tests,
+        }
+
+
+class TraitWindows:
+    """
+    Скользящая статистика баллов черты: EWMA по результатам и дневные корзины
+    (количество, сумма, сумма квадратов) за последние max(TRAIT_WINDOWS) дней
+    до последнего результата. По корзинам для каждого окна считаются среднее,
+    дисперсия и наклон (изменение балла в день, МНК). Добавление — O(1)
+    амортизированно, размер ограничен числом дней самого длинного окна.
+    """
+
+    __slots__ = ('ewma', 'days', 'counts', 'sums', 'sumsqs')
+
+    def __init__(self):
+        self.ewma = None
+        self.days = []
+        self.counts = []
+        self.sums = []
+        self.sumsqs = []
+
+    @classmethod
+    def from_dict(cls, data):
+        windows = cls()
+        if isinstance(data, dict):
+            windows.ewma = data.get('ewma')
+            for field in ('days', 'counts', 'sums', 'sumsqs'):
+                setattr(windows, field, list(data.get(field, [])))
+        return windows
+
+    def to_dict(self):
+        return {'ewma': self.ewma, 'days': self.days, 'counts': self.counts, 'sums': self.sums, 'sumsqs': self.sumsqs}
+
+    def add(self, score, day):
+        """
+        day — порядковый номер дня (date.toordinal()). Результаты должны идти по
+        времени: более ранний результат после позднего требует пересборки
+        (см. api.trait_stats.refresh_profile_statistics).
+        """
+        self.ewma = score if self.ewma is None else TRAIT_EWMA_ALPHA * score + (1 - TRAIT_EWMA_ALPHA) * self.ewma
+        if self.days and self.days[-1] == day:
+            self.counts[-1] += 1
+            self.sums[-1] += score
+            self.sumsqs[-1] += score * score
+        else:
+            self.days.append(day)
+            self.counts.append(1)
+            self.sums.append(score)
+            self.sumsqs.append(score * score)
+        # Корзины старше самого длинного окна больше не понадобятся
+        start = 0
+        while self.days[start] <= day - max(TRAIT_WINDOWS):
+            start += 1
+        if start:
+            for field in ('days', 'counts', 'sums', 'sumsqs'):
+                del getattr(self, field)[:start]
+
+    def window(self, days, today):
+        """Статистика окна последних days дней до today"""
+        n = sx = sy = sxx = sxy = syy = 0
+        for day, count, total, sumsq in zip(self.days, self.counts, self.sums, self.sumsqs):
+            if day <= today - days:
+                continue
+            x = day - today
+            n += count
+            sx += count * x
+            sy += total
+            sxx += count * x * x
+            sxy += x * total
+            syy += sumsq
+        if not n:
+            return {'count': 0, 'average': None, 'variance': None, 'slope': None, 'trend': 'stable'}
+        mean = sy / n
+        den = n * sxx - sx * sx
+        slope = (n * sxy - sx * sy) / den if den else 0
+        change = slope * days
+        trend = ('increasing' if change > TRAIT_WINDOW_TREND_THRESHOLD
+                 else 'decreasing' if change < -TRAIT_WINDOW_TREND_THRESHOLD else 'stable')
+        return {
+            'count': n,
+            'average': round(mean, 2),
+            'variance': round(max(syy / n - mean * mean, 0), 2),
+            'slope': round(slope, 4),
+            'trend': trend,
+        }
+
+    def summary(self, today):
+        return {
+            'ewma': round(self.ewma, 2) if self.ewma is not None else None,
+            'windows': {f'{days}d': self.window(days, today) for days in TRAIT_WINDOWS},
+        }
+
+
+class PairMoments:
+    """Ко-моменты пары черт (суммы x, y, xy, x², y²) для корреляции Пирсона"""
+
+    __slots__ = ('count', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'sum_yy')
+
+    def __init__(self, count=0, sum_x=0, sum_y=0, sum_xy=0, sum_xx=0, sum_yy=0):
+        self.count = count
+        self.sum_x = sum_x
+        self.sum_y = sum_y
+        self.sum_xy = sum_xy
+        self.sum_xx = sum_xx
+        self.sum_yy = sum_yy
+
+    def add(self, x, y, weight=1):
+        """weight = -1 убирает ранее добавленную пару значений"""
+        self.count += weight
+        self.sum_x += weight * x
+        self.sum_y += weight * y
+        self.sum_xy += weight * x * y
+        self.sum_xx += weight * x * x
+        self.sum_yy += weight * y * y
+
+    def correlation(self):
+        n = self.count
+        if n < 2:
+            return 0
+        num = self.sum_xy - (self.sum_x * self.sum_y / n)
+        var_x = self.sum_xx - self.sum_x * self.sum_x / n
+        var_y = self.sum_yy - self.sum_y * self.sum_y / n
+        # После вычитаний дробных баллов возможен отрицательный ноль
+        if var_x <= 0 or var_y <= 0:
+            return 0
+        return num / (var_x * var_y) ** 0.5
+
+
+class ProfileStatistics:
+    """
+    Накопленная статистика результатов пользователя для динамического профиля.
+
+    traits — по ключам черт из TestResult.score (паттерны, history — их
+    прореженная история TraitHistory, windows — скользящая статистика
+    TraitWindows), display — по
+    отображаемым именам черт (карта профиля), confidence — по уровням
+    уверенности, pairs — ко-моменты пар черт по последним баллам каждого
+    теста, test_scores — сами эти последние баллы. Результат добавляется за
+    O(черт) (O(черт²) для пар); changed — изменённые записи (вид, ключ) в
+    порядке первого изменения.
+    """
+
+    def __init__(self):
+        self.results = 0
+        self.traits = {}
+        self.history = {}
+        self.windows = {}
+        self.display = {}
+        self.confidence = {}
+        self.pairs = {}
+        self.test_scores = {}
+        self.changed = {}
+
+    @classmethod
+    def from_results(cls, test_results):
+        stats = cls()
+        for result in test_results:
+            stats.add_result(
+                result.test.id, result.test.name, result.score, result.completed_at,
+                result.confidence_levels, update_pairs=False
+            )
+        stats.rebuild_pairs()
+        return stats
+
+    def add_result(self, test_id, test_name, scores, completed_at, confidence_levels=None, update_pairs=True):
+        """
+        Добавляет результат. update_pairs=False — только запоминает последние
+        баллы теста; ко-моменты затем считаются разом в rebuild_pairs().
+        """
+        scores = scores if isinstance(scores, dict) else {}
+        confidence_levels = confidence_levels or {}
+        self.results += 1
+        date = completed_at.isoformat()
+        day = completed_at.toordinal()
+
         for trait, score in scores.items():
-            trait_history[trait].append({
-                'test_id': result.test.id,
-                'test_name': result.test.name,
-                'score': score,
-                'date': result.completed_at.isoformat(),
-                'confidence': result.confidence_levels.get(str(trait), 0),
-                'response_time': result.response_time.get(str(trait), 0)
-            })
-    
-    # Анализируем тренды и несоответствия
-    for trait, history in trait_history.items():
-        if len(history) > 1:
-            scores = [h['score'] for h in history]
-            avg_score = sum(scores) / len(scores)
-            variance = sum((s - avg_score) ** 2 for s in scores) / len(scores)
-            
-            # Определяем тренд
-            if len(scores) >= 2:
-                trend = 'increasing' if scores[-1] > scores[0] else 'decreasing' if scores[-1] < scores[0] else 'stable'
-            else:
-                trend = 'stable'
-            
-            patterns['trait_evolution'][trait] = {
-                'history': history,
-                'average_score': round(avg_score, 2),
+            self._stats(self.traits, 'trait', trait).add(score)
+            history = self.history.get(trait)
+            if history is None:
+                history = self.history[trait] = TraitHistory()
+            history.add(test_id, test_name, score, date)
+            windows = self.windows.get(trait)
+            if windows is None:
+                windows = self.windows[trait] = TraitWindows()
+            windows.add(score, day)
+            self._stats(self.display, 'display', display_trait_key(trait, test_name)).add(score)
+
+        for key, confidence in confidence_levels.items():
+            self._stats(self.confidence, 'confidence', key).add(confidence)
+
+        if update_pairs:
+            self._update_pairs(str(test_id), scores)
+        else:
+            self.test_scores[str(test_id)] = {**self.test_scores.get(str(test_id), {}), **scores}
+
+    def rebuild_pairs(self):
+        """Пересчитывает ко-моменты всех пар по последним баллам тестов"""
+        self.pairs = pair_moments_from_scores(self.test_scores)
+        for pair in self.pairs:
+            self.changed[('pair', pair)] = None
+
+    def _stats(self, group, kind, key):
+        stats = group.get(key)
+        if stats is None:
+            stats = group[key] = RunningStats()
+        self.changed[(kind, key)] = None
+        return stats
+
+    def _update_pairs(self, test_key, scores):
+        """Заменяет вклад последних баллов теста в ко-моменты пар"""
+        old = self.test_scores.get(test_key, {})
+        new = dict(old)
+        new.update(scores)
+        keys = list(new)
+        for i, a in enumerate(keys):
+            for b in keys[i+1:]:
+                if a not in scores and b not in scores:
+                    continue
+                t1, t2 = (a, b) if a < b else (b, a)
+                had_old = t1 in old and t2 in old
+                if had_old and old[t1] == new[t1] and old[t2] == new[t2]:
+                    continue
+                moments = self.pairs.get((t1, t2))
+                if moments is None:
+                    moments = self.pairs[(t1, t2)] = PairMoments()
+                if had_old:
+                    moments.add(old[t1], old[t2], -1)
+                moments.add(new[t1], new[t2])
+                self.changed[('pair', (t1, t2))] = None
+        self.test_scores[test_key] = new
+
+
+def trait_moment_matrices(test_scores):
+    """
+    Матричный расчёт сумм для всех пар черт (numpy).
+
+    Баллы раскладываются в матрицу X (тесты × черты) с маской M наличия
+    балла; пропуски — нули. Для пары (i, j) учитываются только тесты, где есть
+    обе черты (pairwise-complete): n = MᵀM, Σx = XᵀM, Σxy = XᵀX, Σx² = (X∘X)ᵀM.
+    Возвращает (черты, n, Σx, Σxy, Σx²); Σy и Σy² — транспонированные Σx и Σx².
+    """
+    traits = sorted({trait for scores in test_scores.values() for trait in scores})
+    index = {trait: i for i, trait in enumerate(traits)}
+    values = np.zeros((len(test_scores), len(traits)))
+    mask = np.zeros((len(test_scores), len(traits)))
+    for row, scores in enumerate(test_scores.values()):
+        for trait, score in scores.items():
+            values[row, index[trait]] = score
+            mask[row, index[trait]] = 1
+    return traits, mask.T @ mask, values.T @ mask, values.T @ values, (values * values).T @ mask
+
+
+def pair_moments_from_scores(test_scores):
+    """
+    Ко-моменты пар черт по последним баллам тестов ({тест: {черта: балл}}):
+    при большом числе черт — матрично (trait_moment_matrices), иначе попарно.
+    """
+    pairs = {}
+    n_traits = len({trait for scores in test_scores.values() for trait in scores})
+    if np is None or n_traits < MATRIX_MIN_TRAITS:
+        for scores in test_scores.values():
+            keys = sorted(scores)
+            for i, a in enumerate(keys):
+                for b in keys[i+1:]:
+                    moments = pairs.get((a, b))
+                    if moments is None:
+                        moments = pairs[(a, b)] = PairMoments()
+                    moments.add(scores[a], scores[b])
+        return pairs
+
+    traits, n, sum_x, sum_xy, sum_xx = trait_moment_matrices(test_scores)
+    rows, cols = np.nonzero(np.triu(n, 1))
+    columns = zip(
+        n[rows, cols].tolist(), sum_x[rows, cols].tolist(), sum_x[cols, rows].tolist(),
+        sum_xy[rows, cols].tolist(), sum_xx[rows, cols].tolist(), sum_xx[cols, rows].tolist()
+    )
+    for i, j, (count, sx, sy, sxy, sxx, syy) in zip(rows.tolist(), cols.tolist(), columns):
+        pairs[(traits[i], traits[j])] = PairMoments(int(count), sx, sy, sxy, sxx, syy)
+    return pairs
+
+
+def correlations_from_moments(pairs):
+    """[(черта1, черта2, r)] для всех пар в порядке ключей; при numpy — одним векторным расчётом"""
+    items = sorted(pairs.items())
+    if np is None or len(items) < MATRIX_MIN_TRAITS * (MATRIX_MIN_TRAITS - 1) // 2:
+        return [(t1, t2, moments.correlation()) for (t1, t2), moments in items]
+
+    n, sum_x, sum_y, sum_xy, sum_xx, sum_yy = np.array([
+        (m.count, m.sum_x, m.sum_y, m.sum_xy, m.sum_xx, m.sum_yy) for _, m in items
+    ], dtype=float).T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        num = sum_xy - sum_x * sum_y / n
+        var_x = sum_xx - sum_x * sum_x / n
+        var_y = sum_yy - sum_y * sum_y / n
+        r = num / np.sqrt(var_x * var_y)
+    r = np.where((n >= 2) & (var_x > 0) & (var_y > 0), r, 0.0).tolist()
+    return [(t1, t2, value) for ((t1, t2), _), value in zip(items, r)]
+
+
+def last_result_day(stats):
+    """Порядковый номер дня последнего результата (по корзинам окон) или None"""
+    return max((windows.days[-1] for windows in stats.windows.values() if windows.days), default=None)
+
+
+def trait_evolution_from_statistics(stats, today=None):
+    """
+    Эволюция черт (прореженная история, сводка, EWMA и окна последних
+    30/90/365 дней до today) для черт, встречавшихся больше одного раза.
+
+    По умолчанию окна заканчиваются днём последнего результата пользователя
+    (windows_end), а не текущей датой: профиль кэшируется до появления новых
+    результатов, и окна «до сегодня» в нём переставали бы сдвигаться.
+    """
+    today = today or last_result_day(stats) or datetime.now().toordinal()
+    windows_end = date.fromordinal(today).isoformat()
+    evolution = {}
+    for trait, trait_stats in stats.traits.items():
+        if trait_stats.count > 1:
+            history = stats.history.get(trait) or TraitHistory()
+            windows = stats.windows.get(trait) or TraitWindows()
+            variance = trait_stats.variance
+            # История хранится только здесь; полная — через /users/trait-history/
+            evolution[trait] = {
+                'history': history.series(),
+                'average_score': round(trait_stats.average, 2),
                 'variance': round(variance, 2),
-                'trend': trend,
-                'consistency': 'high' if variance < 100 else 'medium' if variance < 200 else 'low'
+                'trend': trait_stats.trend,
+                'consistency': 'high' if variance < 100 else 'medium' if variance < 200 else 'low',
+                **windows.summary(today),
+                'windows_end': windows_end,
             }
-            
-            # Выявляем несоответствия
-            if variance > 150:  # Высокая вариативность
-                patterns['inconsistencies'].append({
-                    'trait': trait,
-                    'type': 'high_variance',
-                    'description': f'Высокая вариативность в черте "{trait}" (дисперсия: {round(variance, 2)})',
-                    'scores': scores,
-                    'tests': [h['test_name'] for h in history]
-                })
-    
-    # Анализируем корреляции между чертами
-    all_traits = set()
-    for result in test_results:
-        scores = result.score if isinstance(result.score, dict) else {}
-        all_traits.update(scores.keys())
-    
-    trait_scores_by_test = defaultdict(dict)
-    for result in test_results:
-        scores = result.score if isinstance(result.score, dict) else {}
-        for trait, score in scores.items():
-            trait_scores_by_test[result.test.id][trait] = score
-    
-    # Находим корреляции
-    trait_list = list(all_traits)
-    for i, trait1 in enumerate(trait_list):
-        for trait2 in trait_list[i+1:]:
-            correlation = calculate_correlation(trait_scores_by_test, trait1, trait2)
-            if abs(correlation) > 0.3:  # Значимая корреляция
-                patterns['correlations'].append({
-                    'trait1': trait1,
-                    'trait2': trait2,
-                    'correlation': round(correlation, 3),
-                    'strength': 'strong' if abs(correlation) > 0.7 else 'medium' if abs(correlation) > 0.5 else 'weak'
-                })
-    
-    # Анализируем паттерны уверенности
-    confidence_by_trait = defaultdict(list)
-    for result in test_results:
-        for trait, confidence in result.confidence_levels.items():
-            confidence_by_trait[trait].append(confidence)
-    
-    for trait, confidences in confidence_by_trait.items():
-        if confidences:
-            avg_confidence = sum(confidences) / len(confidences)
-            patterns['confidence_patterns'][trait] = {
-                'average': round(avg_confidence, 2),
-                'trend': 'increasing' if len(confidences) > 1 and confidences[-1] > confidences[0] else 'stable'
+    return evolution
+
+
+def inconsistency_patterns_from_statistics(stats):
+    """Черты с высокой вариативностью баллов"""
+    inconsistencies = []
+    for trait, trait_stats in stats.traits.items():
+        variance = trait_stats.variance
+        if trait_stats.count > 1 and variance > 150:  # Высокая вариативность
+            inconsistencies.append({
+                'trait': trait,
+                'type': 'high_variance',
+                'description': f'Высокая вариативность в черте "{trait}" (дисперсия: {round(variance, 2)})',
+                'test_count': trait_stats.count
+            })
+    return inconsistencies
+
+
+def correlation_patterns_from_statistics(stats):
+    """Значимые корреляции между чертами по ко-моментам пар"""
+    correlations = []
+    for trait1, trait2, correlation in correlations_from_moments(stats.pairs):
+        if abs(correlation) > 0.3:  # Значимая корреляция
+            correlations.append({
+                'trait1': trait1,
+                'trait2': trait2,
+                'correlation': round(correlation, 3),
+                'strength': 'strong' if abs(correlation) > 0.7 else 'medium' if abs(correlation) > 0.5 else 'weak'
+            })
+    return correlations
+
+
+def confidence_patterns_from_statistics(stats):
+    """Паттерны уверенности"""
+    confidence_patterns = {}
+    for trait, confidence_stats in stats.confidence.items():
+        if confidence_stats.count:
+            confidence_patterns[trait] = {
+                'average': round(confidence_stats.average, 2),
+                'trend': 'increasing' if confidence_stats.count > 1 and confidence_stats.last > confidence_stats.first else 'stable'
             }
-    
-    return patterns
+    return confidence_patterns
+
+
+def patterns_from_statistics(stats):
+    """Паттерны пользователя по накопленной статистике (без прохода по истории)"""
+    return {
+        'trait_evolution': trait_evolution_from_statistics(stats),
+        'inconsistencies': inconsistency_patterns_from_statistics(stats),
+        'correlations': correlation_patterns_from_statistics(stats),
+        'trends': {},
+        'confidence_patterns': confidence_patterns_from_statistics(stats),
+        'response_time_patterns': {}
+    }
+
+
+def analyze_user_patterns(test_results):
+    """
+    Анализирует паттерны пользователя на основе всех результатов тестов
+    """
+    if not test_results:
+        return patterns_from_statistics(ProfileStatistics())
+    return patterns_from_statistics(ProfileStatistics.from_results(test_results))
 
 
 def calculate_correlation(trait_scores_by_test, trait1, trait2):
@@ -143,53 +626,16 @@ def generate_dynamic_personality_map(test_results, patterns):
     Генерирует динамическую карту личности на основе всех результатов тестов
     """
     if not test_results:
-        return {
-            'traits': {},
-            'connections': [],
-            'inconsistencies': [],
-            'patterns': patterns,
-            'overall_score': 0,
-            'last_updated': datetime.now().isoformat()
-        }
-    
-    # Объединяем все черты личности
-    all_traits = {}
-    trait_counts = defaultdict(int)
-    
-    def map_trait_key(trait: str, test_name: str) -> str:
-        k = (trait or '').lower()
-        name_l = (test_name or '').lower()
-        if k in ['general_trait', 'general', 'trait']:
-            if 'pss' in name_l or 'stress' in name_l:
-                return 'Уровень стресса'
-            if 'rosenberg' in name_l or 'self-esteem' in name_l or 'self esteem' in name_l:
-                return 'Самооценка'
-            if 'satisfaction with life' in name_l or 'swls' in name_l:
-                return 'Удовлетворённость жизнью'
-            if 'phq' in name_l or 'beck' in name_l or 'bdi' in name_l:
-                return 'Уровень депрессии'
-            if 'gad' in name_l or 'anx' in name_l:
-                return 'Уровень тревожности'
-            if 'big five' in name_l or 'ipip' in name_l or 'big 5' in name_l:
-                return 'Черты Большой пятёрки'
-            return 'Итоговый показатель'
-        return trait
-
-    for result in test_results:
-        scores = result.score if isinstance(result.score, dict) else {}
-        test_name = getattr(result.test, 'name', '')
-        for trait, score in scores.items():
-            display_trait = map_trait_key(trait, test_name)
-            if display_trait not in all_traits:
-                all_traits[display_trait] = []
-            all_traits[display_trait].append(score)
-            trait_counts[display_trait] += 1
-    
-    # Вычисляем средние значения и стабильность
+        return dynamic_map_from_statistics(ProfileStatistics(), patterns)
+    return dynamic_map_from_statistics(ProfileStatistics.from_results(test_results), patterns)
+
+
+def dynamic_traits_from_statistics(stats, evolution):
+    """Черты карты личности: средние значения, стабильность и уровень"""
     dynamic_traits = {}
-    for trait, scores in all_traits.items():
-        avg_score = sum(scores) / len(scores)
-        variance = sum((s - avg_score) ** 2 for s in scores) / len(scores)
+    for trait, trait_stats in stats.display.items():
+        avg_score = trait_stats.average
+        variance = trait_stats.variance
         
         # Определяем стабильность
         if variance < 100:
@@ -216,22 +662,23 @@ def generate_dynamic_personality_map(test_results, patterns):
             'level': level,
             'stability': stability,
             'variance': round(variance, 2),
-            'test_count': trait_counts[trait],
+            'test_count': trait_stats.count,
             'description': get_trait_description(trait, avg_score),
             'recommendations': get_trait_recommendations(trait, avg_score, stability),
-            'evolution': patterns.get('trait_evolution', {}).get(trait, {})
+            # Без истории: она уже есть в patterns.trait_evolution
+            'evolution': {k: v for k, v in evolution.get(trait, {}).items() if k != 'history'}
         }
-    
-    # Создаем связи между чертами
+    return dynamic_traits
+
+
+def connections_from_correlations(correlations, traits):
+    """Связи карты между чертами traits по значимым корреляциям"""
     connections = []
-    inconsistencies = []
-    
-    # Добавляем корреляции как связи
-    for correlation in patterns.get('correlations', []):
+    for correlation in correlations:
         trait1 = correlation['trait1']
         trait2 = correlation['trait2']
         
-        if trait1 in dynamic_traits and trait2 in dynamic_traits:
+        if trait1 in traits and trait2 in traits:
             connections.append({
                 'from': trait1,
                 'to': trait2,
@@ -240,31 +687,53 @@ def generate_dynamic_personality_map(test_results, patterns):
                 'correlation': correlation['correlation'],
                 'description': f"Корреляция: {correlation['strength']}"
             })
-    
-    # Добавляем несоответствия
-    for inconsistency in patterns.get('inconsistencies', []):
-        inconsistencies.append({
+    return connections
+
+
+def map_inconsistencies(inconsistency_patterns):
+    """Несоответствия карты с оценкой серьёзности"""
+    return [
+        {
             'trait': inconsistency['trait'],
             'type': inconsistency['type'],
             'description': inconsistency['description'],
             'severity': 'high' if 'high_variance' in inconsistency['type'] else 'medium'
-        })
-    
-    # Вычисляем общий балл
-    if dynamic_traits:
-        overall_score = sum(trait['score'] for trait in dynamic_traits.values()) / len(dynamic_traits)
-    else:
-        overall_score = 0
+        }
+        for inconsistency in inconsistency_patterns
+    ]
+
+
+def profile_summary_from_statistics(stats):
+    """Общий балл и счётчики карты (среднее округлённых средних баллов черт)"""
+    scores = [round(trait_stats.average, 2) for trait_stats in stats.display.values()]
+    overall_score = sum(scores) / len(scores) if scores else 0
+    return {
+        'overall_score': round(overall_score, 2),
+        'last_updated': datetime.now().isoformat(),
+        'total_tests': stats.results,
+        'unique_traits': len(scores)
+    }
+
+
+def dynamic_map_from_statistics(stats, patterns):
+    """Динамическая карта личности по накопленной статистике"""
+    if not stats.results:
+        return {
+            'traits': {},
+            'connections': [],
+            'inconsistencies': [],
+            'patterns': patterns,
+            'overall_score': 0,
+            'last_updated': datetime.now().isoformat()
+        }
     
+    dynamic_traits = dynamic_traits_from_statistics(stats, patterns.get('trait_evolution', {}))
     return {
         'traits': dynamic_traits,
-        'connections': connections,
-        'inconsistencies': inconsistencies,
+        'connections': connections_from_correlations(patterns.get('correlations', []), dynamic_traits),
+        'inconsistencies': map_inconsistencies(patterns.get('inconsistencies', [])),
         'patterns': patterns,
-        'overall_score': round(overall_score, 2),
-        'last_updated': datetime.now().isoformat(),
-        'total_tests': len(test_results),
-        'unique_traits': len(dynamic_traits)
+        **profile_summary_from_statistics(stats)
     }
 
 
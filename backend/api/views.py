@@ -1,28 +1,119 @@
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 from django.db.models import Q
 from django.core.cache import cache
 from django.conf import settings
-from .models import Test, Question, Answer, TestResult, UserProfile, PsyToolkitTest, PsyToolkitImportLog
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from .models import Test, Question, Answer, TestResult, PendingTestResult, UserProfile, PsyToolkitTest, PsyToolkitImportLog, ItemAnalysisSnapshot
+from .idempotency import (
+    IdempotencyError, claim_idempotency_key, complete_idempotency_key,
+    release_idempotency_key, request_fingerprint
+)
+from .ingestion import buffer_submission, is_buffered_ingestion
+from .item_analysis import snapshot_is_stale
+from .norms import load_norms, result_percentiles, score_percentiles
+from .profile_changes import profile_delta
+from .profile_queue import profile_queue_stats
+from .profile_sections import get_profile_sections, parse_sections
 from .psy_toolkit_service import psy_toolkit_service
+from .scoring import ScoringConfigError, get_trait_level, get_trait_description
+from .scoring_cache import get_scoring_plan, score_answers, score_memo
 from .serializers import (
-    TestSerializer, TestListSerializer, TestSubmissionSerializer,
-    TestResultSerializer, UserSerializer, RegisterSerializer,
+    TestSerializer, TestListSerializer, TestSubmissionSerializer, TestBatchSubmissionSerializer,
+    TestBatterySubmissionSerializer, TestSessionAnswerSerializer, TestSessionFinishSerializer,
+    TestResultSerializer, TraitHistoryEntrySerializer, UserSerializer, RegisterSerializer,
     LoginSerializer, UserProfileSerializer, DynamicProfileSerializer,
     PsyToolkitTestSerializer
 )
+from .test_sessions import (
+    TestSessionBusy, delete_test_session, get_test_session, lock_test_session, save_test_session,
+    session_timeout, start_test_session, sync_test_session
+)
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def scoring_config_error_response(test, error):
+    """
+    Ответ для теста с некорректной схемой подсчёта в result_definitions.
+    Схема проверяется при сохранении теста и вопросов (Test.clean, Question.clean)
+    и при импорте; сюда попадают только тесты, изменённые в обход этих проверок.
+    """
+    logger.error(f"Некорректная схема подсчёта теста {test.id}: {error}")
+    return Response(
+        {'error': f'Некорректная схема подсчёта теста: {error}'},
+        status=status.HTTP_500_INTERNAL_SERVER_ERROR
+    )
+
+
+INCOMPLETE_ANSWERS_ERROR = 'Необходимо ответить на все вопросы теста'
+
+
+def build_test_result(user_id, test, plan, item):
+    """
+    Считает один набор ответов (answers, response_time, metadata) и возвращает
+    несохранённый TestResult или None, если отвечены не все вопросы теста.
+    """
+    answers = item['answers']
+    if len(answers) != plan.question_count:
+        return None
+    personality_map, scores = score_answers(test, answers, plan)
+    return TestResult(
+        user_id=user_id,
+        test=test,
+        answers=answers,
+        personality_map=personality_map,
+        score=scores,
+        response_time=item.get('response_time', {}),
+        metadata=item.get('metadata', {})
+    )
+
+
+def save_submission(user, test, answers, personality_map, scores, response_time, metadata):
+    """Сохраняет посчитанный результат теста и возвращает ответ 201"""
+    # Буферизованный режим: подтверждаем после вставки в буфер
+    if is_buffered_ingestion():
+        pending = buffer_submission(user, test, answers, personality_map, scores, response_time, metadata)
+        return Response({
+            'message': 'Тест успешно завершен',
+            'result_id': pending.public_id,
+            'pending': True,
+            'personality_map': personality_map,
+            'scores': scores,
+            'percentiles': result_percentiles(test.id, scores)
+        }, status=status.HTTP_201_CREATED)
+
+    # Сохраняем результат
+    with transaction.atomic():
+        test_result = TestResult.objects.create(
+            user=user,
+            test=test,
+            answers=answers,
+            personality_map=personality_map,
+            score=scores,
+            response_time=response_time,
+            metadata=metadata
+        )
+
+    return Response({
+        'message': 'Тест успешно завершен',
+        'result_id': test_result.id,
+        'personality_map': personality_map,
+        'scores': scores,
+        'percentiles': result_percentiles(test.id, scores)
+    }, status=status.HTTP_201_CREATED)
+
+
 class TestListView(generics.ListAPIView):
     """Список всех доступных тестов"""
     serializer_class = TestListSerializer
@@ -57,6 +148,42 @@ class TestSubmissionView(APIView):
 
     def post(self, request, test_id):
         test = get_object_or_404(Test, id=test_id, is_active=True)
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key:
+            return self.submit(request, test)
+        if len(idempotency_key) > 255:
+            return Response(
+                {'error': 'Ключ идемпотентности не должен быть длиннее 255 символов'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Повтор запроса с тем же ключом возвращает исходный ответ без подсчёта и записи
+        try:
+            record, replay_data = claim_idempotency_key(
+                request.user, idempotency_key, test, request_fingerprint(test, request.data)
+            )
+        except IdempotencyError as e:
+            return Response({'error': str(e)}, status=e.status)
+        if replay_data is not None:
+            response = Response(replay_data, status=status.HTTP_201_CREATED)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        response = None
+        try:
+            response = self.submit(request, test)
+        finally:
+            if response is not None and response.status_code == status.HTTP_201_CREATED:
+                if not complete_idempotency_key(record, response.data['result_id']):
+                    logger.warning(
+                        f'Ключ идемпотентности {idempotency_key!r} пользователя {request.user.id} '
+                        f'забран другим запросом до сохранения результата {response.data["result_id"]}'
+                    )
+            else:
+                release_idempotency_key(record)
+        return response
+
+    def submit(self, request, test):
         serializer = TestSubmissionSerializer(data=request.data)
         
         if serializer.is_valid():
@@ -64,348 +191,309 @@ class TestSubmissionView(APIView):
             response_time = serializer.validated_data.get('response_time', {})
             metadata = serializer.validated_data.get('metadata', {})
             
+            try:
+                plan = get_scoring_plan(test)
+            except ScoringConfigError as e:
+                return scoring_config_error_response(test, e)
+
             # Проверяем, что все вопросы теста отвечены
-            test_questions = test.questions.all()
-            if len(answers) != test_questions.count():
+            if len(answers) != plan.question_count:
                 return Response(
-                    {'error': 'Необходимо ответить на все вопросы теста'},
+                    {'error': INCOMPLETE_ANSWERS_ERROR},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
             # Генерируем карту личности
-            personality_map, scores = self.generate_personality_map(test, answers)
+            personality_map, scores = self.generate_personality_map(test, answers, plan)
             
-            # Сохраняем результат
-            with transaction.atomic():
-                test_result = TestResult.objects.create(
-                    user=request.user,
-                    test=test,
-                    answers=answers,
-                    personality_map=personality_map,
-                    score=scores,
-                    response_time=response_time,
-                    metadata=metadata
-                )
-            
-            return Response({
-                'message': 'Тест успешно завершен',
-                'result_id': test_result.id,
-                'personality_map': personality_map,
-                'scores': scores
-            }, status=status.HTTP_201_CREATED)
+            return save_submission(request.user, test, answers, personality_map, scores, response_time, metadata)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    def generate_personality_map(self, test, answers):
-        """Генерирует карту личности на основе ответов"""
-        # Оптимизированный запрос: получаем все нужные данные одним запросом
-        answer_ids = list(answers.values())
-        answers_data = Answer.objects.filter(
-            id__in=answer_ids
-        ).select_related('question').prefetch_related('question__answers')
-        
-        # Создаем словарь для быстрого доступа
-        answers_dict = {str(a.id): a for a in answers_data}
-        
-        user_answers = []
-        per_question_max_values = {}  # question_id -> max value among its answers
-        
-        for question_id, answer_id in answers.items():
-            answer = answers_dict.get(str(answer_id))
-            if not answer:
-                continue
-                
-            # Вычисляем максимум для вопроса
-            question = answer.question
-            if question and question.id not in per_question_max_values:
-                # Используем prefetch_related данные
-                max_val = max((a.value for a in question.answers.all()), default=0)
-                per_question_max_values[str(question.id)] = max_val
-
-            user_answers.append({
-                'question_id': str(question_id),
-                'answer_id': answer_id,
-                'personality_trait': answer.personality_trait,
-                'value': answer.value
-            })
-        
-        # Специальная логика для тестов с явной схемой подсчёта (например, стиль привязанности)
-        try:
-            test_scoring = getattr(test, 'result_definitions', {}) or {}
-            scoring_cfg = test_scoring.get('scoring') or test_scoring.get('SCORING')
-            graph_cfg = test_scoring.get('graph') or {}
-        except Exception:
-            scoring_cfg = None
-            graph_cfg = {}
-
-        if scoring_cfg and isinstance(scoring_cfg, dict) and scoring_cfg.get('dimensions'):
-            # Считаем сырые баллы по заданным измерениям, используя порядковые номера вопросов
-            dim_to_orders = scoring_cfg.get('dimensions', {})
-            # Строим индекс: order -> выбранное значение
-            order_to_value = {}
-            try:
-                for qa in user_answers:
-                    # Используем уже загруженные данные
-                    answer = answers_dict.get(str(qa['answer_id']))
-                    if answer and answer.question:
-                        q_order = getattr(answer.question, 'order', None)
-                        if q_order is not None:
-                            order_to_value[int(q_order)] = qa['value']
-            except Exception:
-                pass
-
-            dim_raw = {}
-            dim_max = {}
-            for dim, orders in dim_to_orders.items():
-                raw = 0
-                for ord_num in orders:
-                    raw += int(order_to_value.get(int(ord_num), 0))
-                # максимум берём из graph.max_score или из длины массива, умноженной на максимум значения (допущение 1)
-                max_per_dim = int(graph_cfg.get('max_score') or 6)
-                dim_raw[dim] = raw
-                dim_max[dim] = max_per_dim
-
-            # Нормализация в проценты
-            normalized_scores = {}
-            for dim, raw in dim_raw.items():
-                m = max(1, dim_max.get(dim, 6))
-                normalized_scores[dim] = min(100, max(0, int(round((raw / m) * 100))))
-
-            # Собираем карту личности для привязанности
-            personality_map = {
-                'traits': {},
-                'connections': [],
-                'overall_score': sum(normalized_scores.values()) // len(normalized_scores) if normalized_scores else 0
-            }
-            for dim, score_norm in normalized_scores.items():
-                raw = dim_raw.get(dim, 0)
-                m = dim_max.get(dim, 6)
-                personality_map['traits'][dim.capitalize()] = {
-                    'score': score_norm,
-                    'raw_score': raw,
-                    'max_score': m,
-                    'level': self.get_trait_level(score_norm),
-                    'description': self.get_trait_description(dim.capitalize(), score_norm),
-                    'recommendations': ''
-                }
-
-            # Определяем доминирующий стиль: приоритет 1) categories по номерам вопросов, 2) rules, 3) максимум по измерениям
-            dominant = None
-
-            # 1) Если определены категории с номерами вопросов — суммируем и выбираем максимум
-            try:
-                categories = scoring_cfg.get('categories') or {}
-                if isinstance(categories, dict) and categories:
-                    cat_totals = {}
-                    for cat, orders in categories.items():
-                        total = 0
-                        for ord_num in orders:
-                            total += int(order_to_value.get(int(ord_num), 0))
-                        cat_totals[cat] = total
-                    if cat_totals:
-                        dominant = max(cat_totals.items(), key=lambda x: x[1])[0]
-            except Exception:
-                pass
-
-            # 2) Если не получилось — проверяем rules (пороговые условия)
-            if dominant is None:
-                rules = scoring_cfg.get('rules', {})
-                def get_dim_val(key):
-                    return int(dim_raw.get(key, dim_raw.get(key.lower(), 0)))
-                for label, rule in rules.items():
-                    ok = True
-                    for cond_key, cond_val in rule.items():
-                        try:
-                            base, kind = cond_key.split('_')
-                        except ValueError:
-                            continue
-                        v = get_dim_val(base)
-                        if kind == 'min' and not (v >= int(cond_val)):
-                            ok = False; break
-                        if kind == 'max' and not (v <= int(cond_val)):
-                            ok = False; break
-                    if ok:
-                        dominant = label
-                        break
-
-            # 3) Если всё ещё нет — берём измерение с максимальным raw
-            if dominant is None and dim_raw:
-                dominant = max(dim_raw.items(), key=lambda x: x[1])[0]
-
-            if dominant:
-                personality_map['dominant_style'] = dominant
-
-            return personality_map, normalized_scores
-
-        # Подсчитываем баллы по чертам личности и собираем, какие вопросы относятся к какой черте
-        trait_scores = {}
-        trait_questions = {}  # trait -> set(question_ids)
-        for answer_data in user_answers:
-            trait = answer_data['personality_trait']
-            value = answer_data['value']
-            qid = answer_data['question_id']
-            trait_scores[trait] = trait_scores.get(trait, 0) + value
-            s = trait_questions.get(trait)
-            if s is None:
-                s = set()
-                trait_questions[trait] = s
-            s.add(qid)
-        
-        # Сопоставление ВСЕХ вопросов теста к чертам (для корректного max по каждой букве/черте)
-        all_trait_questions = {}  # trait -> set(all question ids where any answer has this trait)
-        try:
-            # Используем уже загруженные данные из prefetch_related
-            for q in test.questions.all():
-                qid_str = str(q.id)
-                for a in q.answers.all():
-                    t = a.personality_trait
-                    if not t:
-                        continue
-                    s = all_trait_questions.get(t)
-                    if s is None:
-                        s = set()
-                        all_trait_questions[t] = s
-                    s.add(qid_str)
-        except Exception:
-            # fallback: если не удалось, используем только вопросы, где пользователь ответил
-            all_trait_questions = {k: set(v) for k, v in trait_questions.items()}
-
-        # Для букв MBTI (E/I/S/N/T/F/J/P) используем фиксированный максимум 6, если нашли ровно 6 вопросов на дихотомию
-        letters = ['E','I','S','N','T','F','J','P']
-        for letter in letters:
-            qids = all_trait_questions.get(letter, set())
-            # если тест содержит 6 вопросов для этой буквы, то max = 6 (каждый ответ score=1 в демо), иначе оставляем расчет по суммам
-            if len(qids) == 6:
-                trait_maxima_letter = 6
-                # если ранее не посчитали per_question_max_values (на случай пустых), заполним 1
-                for qid in qids:
-                    if qid not in per_question_max_values:
-                        per_question_max_values[qid] = 1
-
-        # Нормализация по максимуму КАЖДОЙ ЧЕРТЫ (сумма максимумов по всем вопросам, относящимся к этой черте во ВСЕМ тесте)
-        normalized_scores = {}
-        trait_maxima = {}
-        for trait, raw in trait_scores.items():
-            related_qids = all_trait_questions.get(trait, set())
-            trait_max = sum(per_question_max_values.get(qid, 0) for qid in related_qids)
-            trait_maxima[trait] = trait_max
-            if trait_max > 0:
-                normalized_scores[trait] = min(100, max(0, int(round((raw / trait_max) * 100))))
-            else:
-                normalized_scores[trait] = raw
-
-        # Принудительно фиксируем максимум = 6 для букв MBTI, если в тесте по букве ровно 6 вопросов
-        for letter in ['E','I','S','N','T','F','J','P']:
-            if letter in trait_scores:
-                qids = all_trait_questions.get(letter, set())
-                if len(qids) == 6:
-                    raw = trait_scores.get(letter, 0)
-                    trait_maxima[letter] = 6
-                    normalized_scores[letter] = min(100, max(0, int(round((raw / 6) * 100))))
-        
-        # Создаем карту личности
-        personality_map = {
-            'traits': {},
-            'connections': [],
-            'overall_score': sum(normalized_scores.values()) // len(normalized_scores) if normalized_scores else 0
-        }
-        
-        # Определяем человеко-понятные имена черт в зависимости от теста
-        test_name_l = (test.name or '').lower()
-
-        def map_trait_key(raw_key: str) -> str:
-            k = (raw_key or '').lower()
-            # Нормализуем ключи, которые могли прийти как general_trait и т.п.
-            if k in ['general_trait', 'general', 'trait']:
-                # Маппим по тесту
-                if 'pss' in test_name_l or 'stress' in test_name_l:
-                    return 'Уровень стресса'
-                if 'rosenberg' in test_name_l or 'self-esteem' in test_name_l or 'self esteem' in test_name_l:
-                    return 'Самооценка'
-                if 'satisfaction with life' in test_name_l or 'swls' in test_name_l:
-                    return 'Удовлетворённость жизнью'
-                if 'phq' in test_name_l or 'beck' in test_name_l or 'bdi' in test_name_l:
-                    return 'Уровень депрессии'
-                if 'gad' in test_name_l or 'anx' in test_name_l:
-                    return 'Уровень тревожности'
-                if 'big five' in test_name_l or 'ipip' in test_name_l or 'big 5' in test_name_l:
-                    return 'Черты Большой пятёрки'
-                return 'Итоговый показатель'
-            # Прямые известные ключи
-            if k in ['stress']:
-                return 'Уровень стресса'
-            if k in ['self_worth', 'self-esteem', 'self_esteem']:
-                return 'Самооценка'
-            if k in ['life_satisfaction', 'satisfaction']:
-                return 'Удовлетворённость жизнью'
-            if k in ['anxiety']:
-                return 'Уровень тревожности'
-            if k in ['depression']:
-                return 'Уровень депрессии'
-            return raw_key
-
-        # Добавляем черты личности с русскими и тест-специфичными именами
-        for trait, norm_score in normalized_scores.items():
-            trait_name = map_trait_key(trait)
-            raw_score = trait_scores.get(trait, 0)
-            trait_max_score = trait_maxima.get(trait, 0)
-            personality_map['traits'][trait_name] = {
-                'score': norm_score,
-                'raw_score': raw_score,
-                'max_score': trait_max_score,
-                'level': self.get_trait_level(norm_score),
-                'description': self.get_trait_description(trait_name, norm_score),
-                'recommendations': ''
-            }
-        
-        # Добавляем связи между чертами (простая логика)
-        traits_list = list(normalized_scores.keys())
-        for i, trait1 in enumerate(traits_list):
-            for trait2 in traits_list[i+1:]:
-                # Создаем связь если обе черты имеют высокие баллы
-                if (normalized_scores[trait1] > 70 and normalized_scores[trait2] > 70):
-                    personality_map['connections'].append({
-                        'from': map_trait_key(trait1),
-                        'to': map_trait_key(trait2),
-                        'strength': min(normalized_scores[trait1], normalized_scores[trait2])
-                    })
-        
-        return personality_map, normalized_scores
+    def generate_personality_map(self, test, answers, plan=None):
+        """Генерирует карту личности на основе ответов по скомпилированному плану теста"""
+        return score_answers(test, answers, plan)
     
     def get_trait_level(self, score):
         """Определяет уровень черты личности по баллу"""
-        if score >= 80:
-            return "Очень высокий"
-        elif score >= 60:
-            return "Высокий"
-        elif score >= 40:
-            return "Средний"
-        elif score >= 20:
-            return "Низкий"
-        else:
-            return "Очень низкий"
+        return get_trait_level(score)
     
     def get_trait_description(self, trait, score):
         """Возвращает описание черты личности"""
-        descriptions = {
-            'Экстраверсия': 'Способность получать энергию от внешнего мира и взаимодействия с людьми',
-            'Интроверсия': 'Способность получать энергию от внутреннего мира и размышлений',
-            'Открытость': 'Готовность к новому опыту и творческому мышлению',
-            'Добросовестность': 'Самодисциплина, организованность и целеустремленность',
-            'Доброжелательность': 'Сотрудничество, доверие и альтруизм',
-            'Нейротизм': 'Эмоциональная стабильность и устойчивость к стрессу',
-            'Креативность': 'Способность к нестандартному мышлению и творчеству',
-            'Лидерство': 'Способность влиять на других и принимать решения',
-            'Эмпатия': 'Способность понимать чувства и эмоции других людей',
-            'Адаптивность': 'Гибкость в изменяющихся условиях'
-        }
-        return descriptions.get(trait, trait)
+        return get_trait_description(trait, score)
     
     def get_trait_recommendations(self, trait, score):
         """Временно отключено: возвращаем пустые рекомендации"""
         return ''
 
 
+class TestSessionStartView(APIView):
+    """
+    Начало прохождения теста с накопительным подсчётом.
+
+    Ответы отправляются по мере прохождения (TestSessionAnswerView), баллы
+    черт пересчитываются на каждом ответе, а завершение сессии только
+    нормализует готовые суммы и сохраняет результат.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, test_id):
+        test = get_object_or_404(Test, id=test_id, is_active=True)
+        try:
+            plan = get_scoring_plan(test)
+        except ScoringConfigError as e:
+            return scoring_config_error_response(test, e)
+        state = start_test_session(request.user, plan)
+        return Response({
+            'session_id': state['id'],
+            'test_id': test.id,
+            'question_count': plan.question_count,
+            'expires_in': session_timeout()
+        }, status=status.HTTP_201_CREATED)
+
+
+class TestSessionView(APIView):
+    """Общая загрузка сессии и плана теста"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def locked(self, session_id, handler, *args):
+        """Выполняет handler под блокировкой сессии; не дождались блокировки — 409"""
+        try:
+            with lock_test_session(session_id):
+                return handler(*args)
+        except TestSessionBusy:
+            return Response(
+                {'error': 'Сессия занята другим запросом, повторите отправку'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+    def load(self, request, session_id):
+        """Возвращает (state, test, plan, None) или (None, None, None, ответ с ошибкой)"""
+        state = get_test_session(session_id, request.user)
+        if state is None:
+            return None, None, None, Response(
+                {'error': 'Сессия не найдена или истекла'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        test = Test.objects.filter(id=state['test_id'], is_active=True).first()
+        if test is None:
+            delete_test_session(state)
+            return None, None, None, Response({'error': 'Тест не найден'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            plan = get_scoring_plan(test)
+        except ScoringConfigError as e:
+            return None, None, None, scoring_config_error_response(test, e)
+        sync_test_session(state, plan)
+        return state, test, plan, None
+
+
+class TestSessionAnswerView(TestSessionView):
+    """Ответ на один или несколько вопросов открытой сессии"""
+
+    def post(self, request, session_id):
+        serializer = TestSessionAnswerSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return self.locked(session_id, self.answer, request, session_id, serializer)
+
+    def answer(self, request, session_id, serializer):
+        state, test, plan, error = self.load(request, session_id)
+        if error is not None:
+            return error
+
+        scoring = state['scoring']
+        errors = {}
+        for question_id, answer_id in serializer.validated_data['answers'].items():
+            try:
+                scoring.add(plan, question_id, answer_id)
+            except ScoringConfigError as e:
+                errors[question_id] = str(e)
+        state['response_time'].update(serializer.validated_data.get('response_time', {}))
+        save_test_session(state)
+
+        data = {
+            'session_id': state['id'],
+            'answered': scoring.answered_count,
+            'remaining': max(0, plan.question_count - scoring.answered_count)
+        }
+        if errors:
+            data['errors'] = errors
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
+
+class TestSessionFinishView(TestSessionView):
+    """Завершение сессии: сохранение результата по накопленным суммам"""
+
+    def post(self, request, session_id):
+        serializer = TestSessionFinishSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # Под блокировкой: повторное завершение не сохранит второй результат
+        return self.locked(session_id, self.finish, request, session_id, serializer)
+
+    def finish(self, request, session_id, serializer):
+        state, test, plan, error = self.load(request, session_id)
+        if error is not None:
+            return error
+
+        scoring = state['scoring']
+        if scoring.answered_count != plan.question_count:
+            return Response(
+                {
+                    'error': INCOMPLETE_ANSWERS_ERROR,
+                    'remaining': plan.question_count - scoring.answered_count
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        personality_map, scores = scoring.finish(plan)
+        metadata = serializer.validated_data.get('metadata', {})
+        response = save_submission(
+            request.user, test, dict(scoring.answers), personality_map, scores,
+            state['response_time'], metadata
+        )
+        delete_test_session(state)
+        return response
+
+
+class TestBatchSubmissionView(APIView):
+    """
+    Пакетная отправка ответов на тест (оцифровка бумажных бланков, киоски).
+
+    Все наборы считаются по одному плану теста, сохраняются одним bulk_create,
+    а динамический профиль каждого пользователя пересчитывается один раз.
+    Персонал может указать user_id для каждого набора.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_batch_size = 1000
+
+    def post(self, request, test_id):
+        test = get_object_or_404(Test, id=test_id, is_active=True)
+        serializer = TestBatchSubmissionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        submissions = serializer.validated_data['submissions']
+        if len(submissions) > self.max_batch_size:
+            return Response(
+                {'error': f'Максимальный размер пакета: {self.max_batch_size}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Права на сохранение результатов за других пользователей
+        user_ids = {item.get('user_id', request.user.id) for item in submissions}
+        if user_ids != {request.user.id} and not request.user.is_staff:
+            return Response(
+                {'error': 'Сохранять результаты других пользователей может только персонал'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        existing_ids = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+        unknown_ids = sorted(user_ids - existing_ids)
+        if unknown_ids:
+            return Response(
+                {'error': f'Пользователи не найдены: {unknown_ids}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            plan = get_scoring_plan(test)
+        except ScoringConfigError as e:
+            return scoring_config_error_response(test, e)
+
+        errors = {}
+        results = []
+        for index, item in enumerate(submissions):
+            result = build_test_result(item.get('user_id', request.user.id), test, plan, item)
+            if result is None:
+                errors[index] = INCOMPLETE_ANSWERS_ERROR
+                continue
+            results.append(result)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            created = TestResult.create_many(results)
+        test_norms = load_norms([test.id])[test.id]
+
+        return Response({
+            'message': f'Сохранено результатов: {len(created)}',
+            'count': len(created),
+            'results': [
+                {
+                    'result_id': result.id,
+                    'user_id': result.user_id,
+                    'personality_map': result.personality_map,
+                    'scores': result.score,
+                    'percentiles': score_percentiles(test_norms, result.score)
+                }
+                for result in created
+            ]
+        }, status=status.HTTP_201_CREATED)
+
+
+class TestBatterySubmissionView(APIView):
+    """
+    Отправка ответов сразу на несколько тестов (батарея при онбординге).
+
+    Все результаты сохраняются в одной транзакции, динамический профиль
+    пересчитывается один раз в конце.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_tests = 20
+
+    def post(self, request):
+        serializer = TestBatterySubmissionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        items = serializer.validated_data['tests']
+        if len(items) > self.max_tests:
+            return Response(
+                {'error': f'Максимальное количество тестов в батарее: {self.max_tests}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        tests = Test.objects.in_bulk({item['test_id'] for item in items})
+        errors = {}
+        results = []
+        for index, item in enumerate(items):
+            test = tests.get(item['test_id'])
+            if test is None or not test.is_active:
+                errors[index] = f'Тест не найден: {item["test_id"]}'
+                continue
+            try:
+                plan = get_scoring_plan(test)
+            except ScoringConfigError as e:
+                return scoring_config_error_response(test, e)
+            result = build_test_result(request.user.id, test, plan, item)
+            if result is None:
+                errors[index] = INCOMPLETE_ANSWERS_ERROR
+                continue
+            results.append(result)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            created = TestResult.create_many(results)
+        norms = load_norms({result.test_id for result in created})
+
+        return Response({
+            'message': 'Тесты успешно завершены',
+            'count': len(created),
+            'results': [
+                {
+                    'test_id': result.test_id,
+                    'result_id': result.id,
+                    'personality_map': result.personality_map,
+                    'scores': result.score,
+                    'percentiles': score_percentiles(norms[result.test_id], result.score)
+                }
+                for result in created
+            ]
+        }, status=status.HTTP_201_CREATED)
+
+
 class TestResultView(generics.RetrieveAPIView):
     """Просмотр результата конкретного теста"""
     serializer_class = TestResultSerializer
@@ -415,6 +503,36 @@ class TestResultView(generics.RetrieveAPIView):
         return TestResult.objects.filter(user=self.request.user).select_related('test', 'user')
 
 
+class PendingTestResultView(APIView):
+    """
+    Результат, отправленный в буферизованном режиме (id вида 'p<id>').
+    До переноса отдаётся из буфера, после — сохранённый TestResult.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        pending = get_object_or_404(
+            PendingTestResult.objects.select_related('test', 'result'), id=pk, user=request.user
+        )
+        if pending.result is not None:
+            return Response(TestResultSerializer(pending.result).data)
+
+        result = TestResult(
+            user=request.user,
+            test=pending.test,
+            answers=pending.answers,
+            personality_map=pending.personality_map,
+            score=pending.score,
+            response_time=pending.response_time,
+            metadata=pending.metadata,
+            completed_at=pending.created_at
+        )
+        data = TestResultSerializer(result).data
+        data['id'] = pending.public_id
+        data['pending'] = True
+        return Response(data)
+
+
 class UserHistoryView(generics.ListAPIView):
     """История результатов тестов пользователя"""
     serializer_class = TestResultSerializer
@@ -424,22 +542,89 @@ class UserHistoryView(generics.ListAPIView):
         return TestResult.objects.filter(user=self.request.user).select_related('test', 'user').order_by('-completed_at')
 
 
+class TraitHistoryPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class UserTraitHistoryView(generics.ListAPIView):
+    """
+    Полная история баллов черты по страницам (?trait=...&page=...&page_size=...).
+    В динамическом профиле хранится только прореженная история.
+    """
+    serializer_class = TraitHistoryEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TraitHistoryPagination
+    
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get('trait'):
+            return Response({
+                'error': 'Не указана черта (параметр trait)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
+    
+    def get_queryset(self):
+        trait = self.request.query_params.get('trait')
+        return (
+            TestResult.objects.filter(user=self.request.user, score__has_key=trait)
+            .select_related('test')
+            .only('id', 'test_id', 'test__name', 'score', 'confidence_levels', 'completed_at')
+            .order_by('completed_at', 'id')
+        )
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['trait'] = self.request.query_params.get('trait')
+        return context
+
+
 class UserDynamicProfileView(APIView):
     """Динамический профиль пользователя с анализом паттернов"""
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        """Возвращает текущий динамический профиль пользователя"""
+        """
+        Возвращает сохранённый динамический профиль пользователя.
+
+        Профиль пересобирается, только если после его сборки появились новые
+        результаты. Ответ содержит ETag (версия профиля) и Last-Modified;
+        при совпадении If-None-Match / If-Modified-Since возвращается 304.
+        С ?sections=traits,connections,... возвращаются только указанные
+        разделы (см. api.profile_sections).
+        """
+        try:
+            sections = parse_sections(request.query_params.get('sections'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         try:
             profile = request.user.profile
-            # Обновляем динамический профиль перед возвратом
-            profile.update_dynamic_profile()
-            
-            serializer = DynamicProfileSerializer(profile.dynamic_profile)
-            return Response({
-                'message': 'Динамический профиль успешно получен',
-                'profile': serializer.data
-            })
+            if sections:
+                return self.get_sections(request, profile, sections)
+            profile.ensure_dynamic_profile()
+
+            etag = quote_etag(f'dp-{profile.user_id}-{profile.dynamic_profile_version}')
+            last_modified = int(profile.updated_at.timestamp())
+            if_none_match = request.headers.get('If-None-Match')
+            if if_none_match:
+                not_modified = etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+            else:
+                since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+                not_modified = since is not None and last_modified <= since
+
+            if not_modified:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                serializer = DynamicProfileSerializer(profile.dynamic_profile)
+                response = Response({
+                    'message': 'Динамический профиль успешно получен',
+                    'version': profile.dynamic_profile_version,
+                    'profile': serializer.data
+                })
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            response['Cache-Control'] = 'private, no-cache'
+            return response
         except UserProfile.DoesNotExist:
             return Response({
                 'error': 'Профиль пользователя не найден'
@@ -448,6 +633,56 @@ class UserDynamicProfileView(APIView):
             return Response({
                 'error': f'Ошибка при получении профиля: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def get_sections(self, request, profile, sections):
+        """Отдельные разделы профиля; ETag — по версии результатов и набору разделов"""
+        etag = quote_etag(f'dp-{profile.user_id}-r{profile.results_version}-{"+".join(sections)}')
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({
+                'message': 'Динамический профиль успешно получен',
+                'profile': get_profile_sections(profile, sections)
+            })
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class UserDynamicProfileChangesView(APIView):
+    """Изменения динамического профиля после версии ?since= (версия — из ETag / поля version)"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', ''))
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            return Response({
+                'error': 'Параметр since должен быть неотрицательным номером версии'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            profile = request.user.profile
+            profile.ensure_dynamic_profile()
+            delta = profile_delta(profile, since)
+            if delta is None:
+                # Журнал не покрывает разрыв — полный снимок
+                delta = {
+                    'version': profile.dynamic_profile_version,
+                    'since': since,
+                    'full': True,
+                    'profile': profile.dynamic_profile,
+                }
+            response = Response(delta)
+            response['ETag'] = quote_etag(f'dp-{profile.user_id}-{profile.dynamic_profile_version}')
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+        except UserProfile.DoesNotExist:
+            return Response({
+                'error': 'Профиль пользователя не найден'
+            }, status=status.HTTP_404_NOT_FOUND)
 
 
 class RegisterView(APIView):
@@ -506,6 +741,11 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     
     def get_object(self):
         return self.request.user.profile
+    
+    def retrieve(self, request, *args, **kwargs):
+        # dynamic_profile собирается лениво — при первом чтении после изменений
+        self.get_object().ensure_dynamic_profile()
+        return super().retrieve(request, *args, **kwargs)
 
 
 class PsyToolkitViewSet(generics.ListCreateAPIView):
@@ -817,3 +1057,43 @@ def get_psytoolkit_test_statistics(request):
             'success': False,
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def get_scoring_memo_statistics(request):
+    """Счётчики мемоизации подсчёта баллов (в пределах текущего процесса)"""
+    return Response({
+        'success': True,
+        'statistics': score_memo.stats()
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def get_profile_queue_statistics(request):
+    """Глубина и лаг очереди пересчёта динамических профилей"""
+    return Response({
+        'success': True,
+        'statistics': profile_queue_stats()
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def get_test_item_analysis(request, test_id):
+    """Снимок анализа заданий теста (считается командой analyze_test_items)"""
+    test = get_object_or_404(Test, id=test_id)
+    snapshot = ItemAnalysisSnapshot.objects.filter(test=test).first()
+    if snapshot is None:
+        return Response({
+            'success': False,
+            'error': 'Анализ заданий для теста ещё не рассчитан'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'success': True,
+        'test_id': test.id,
+        'computed_at': snapshot.computed_at,
+        'stale': snapshot_is_stale(snapshot, test),
+        'analysis': snapshot.data
+    })
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -147,6 +148,9 @@ SIMPLE_JWT = {
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = False
 
+# Allow clients to send Idempotency-Key on test submissions
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 # Optionally keep explicit origins for future tightening
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -170,4 +174,57 @@ CACHES = {
 # Cache timeout settings
 CACHE_TIMEOUT_SHORT = 60  # 1 minute
 CACHE_TIMEOUT_MEDIUM = 300  # 5 minutes
-CACHE_TIMEOUT_LONG = 1800  # 30 minutes
\ No newline at end of file
+CACHE_TIMEOUT_LONG = 1800  # 30 minutes
+
+# Scoring backend: 'python' or 'numpy' (vectorized kernel for long trait tests, requires numpy)
+SCORING_BACKEND = 'python'
+# The numpy kernel only pays off on long tests; shorter tests are scored in pure python
+SCORING_NUMPY_MIN_QUESTIONS = 60
+# In-process memo of scoring results for short tests, keyed by the answer vector
+SCORING_MEMO_SIZE = 10000
+SCORING_MEMO_TTL = CACHE_TIMEOUT_LONG
+SCORING_MEMO_MAX_QUESTIONS = 30
+
+# Result ingestion: 'direct' (TestResult written in the request) or 'buffered'
+# (PendingTestResult staging row, moved to TestResult by manage.py flush_result_buffer)
+RESULT_INGESTION_MODE = 'direct'
+RESULT_BUFFER_FLUSH_INTERVAL_MS = 500
+RESULT_BUFFER_FLUSH_SIZE = 500
+RESULT_BUFFER_RETENTION_HOURS = 24
+
+# Idempotent submissions (Idempotency-Key header on /tests/<id>/submit/)
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+# How long a duplicate waits for the original request, and when an unfinished claim is considered abandoned
+IDEMPOTENCY_WAIT_SECONDS = 5
+IDEMPOTENCY_STALE_SECONDS = 60
+
+# Incremental test sessions (/tests/<id>/sessions/): running scores kept in the cache,
+# expire this many seconds after the last answer
+TEST_SESSION_TIMEOUT = 6 * 60 * 60
+# Concurrent requests to one session are serialized by a cache lock: how long a request
+# waits for it (then 409), and when a lock left by a crashed process expires
+TEST_SESSION_LOCK_WAIT = 5
+TEST_SESSION_LOCK_TIMEOUT = 30
+
+# Dynamic profile recompute after new results: 'lazy' (on the first read after a change),
+# 'sync' (in the request) or 'queued' (ProfileRecomputeJob, coalesced per user,
+# processed by manage.py process_profile_queue)
+PROFILE_RECOMPUTE_MODE = 'lazy'
+PROFILE_RECOMPUTE_BATCH_SIZE = 100
+PROFILE_RECOMPUTE_INTERVAL_MS = 1000
+# Failed recomputes are retried after RETRY_SECONDS * 2^(attempt-1), up to MAX_ATTEMPTS times
+PROFILE_RECOMPUTE_MAX_ATTEMPTS = 5
+PROFILE_RECOMPUTE_RETRY_SECONDS = 30
+# A job locked longer than this is considered abandoned by a crashed worker
+PROFILE_RECOMPUTE_STALE_SECONDS = 300
+# A stale profile is rebuilt by one reader at a time: how long other readers wait for it,
+# and when a build claimed by a crashed process is considered abandoned
+DYNAMIC_PROFILE_BUILD_WAIT = 5
+DYNAMIC_PROFILE_CLAIM_STALE_SECONDS = 60
+# How many profile versions /users/dynamic-profile/changes/ can diff against before
+# falling back to a full snapshot
+DYNAMIC_PROFILE_CHANGE_LOG_SIZE = 20
+
+# Population norms (api.norms): percentiles are reported only for (test, trait) pairs
+# with at least this many results
+NORMS_MIN_SAMPLE = 30
@@ -45,6 +45,8 @@ export interface TestResult {
   answers: Record<string, number>;
   personality_map: PersonalityMap;
   score: Record<string, number>;
+  // Процентиль балла среди всех результатов теста (null — мало данных)
+  percentiles: Record<string, number | null>;
   response_time: Record<string, number>;
   // confidence_levels убраны
   metadata: Record<string, any>;
@@ -92,24 +94,51 @@ export interface DynamicTraitInfo extends TraitInfo {
   stability: string;
   variance: number;
   test_count: number;
-  evolution: TraitEvolution;
+  // без history — она есть в patterns.trait_evolution
+  evolution: Omit<TraitEvolution, 'history'>;
 }
 
 export interface TraitEvolution {
-  history: TraitHistoryEntry[];
+  history: TraitHistorySeries;
   average_score: number;
   variance: number;
   trend: string;
   consistency: string;
+  ewma: number | null;
+  // ключи '30d', '90d', '365d'
+  windows: Record<string, TraitWindow>;
+  // дата, которой заканчиваются окна (последний результат пользователя)
+  windows_end: string;
+}
+
+export interface TraitWindow {
+  count: number;
+  average: number | null;
+  variance: number | null;
+  // изменение балла в день
+  slope: number | null;
+  trend: string;
+}
+
+// Прореженная история: колонки по точкам, каждая точка — среднее counts[i] результатов
+export interface TraitHistorySeries {
+  points: number;
+  bucket: number;
+  dates: string[];
+  scores: number[];
+  counts: number[];
+  test_ids: number[];
+  tests: Record<string, string>;
 }
 
+// Полная история черты: /users/trait-history/?trait=...
 export interface TraitHistoryEntry {
+  result_id: number;
   test_id: number;
   test_name: string;
   score: number;
-  date: string;
-  // confidence убран
-  response_time: number;
+  confidence: number;
+  completed_at: string;
 }
 
 export interface DynamicConnection extends Connection {
@@ -123,6 +152,7 @@ export interface Inconsistency {
   type: string;
   description: string;
   severity: string;
+  test_count?: number;
 }
 
 export interface PatternAnalysis {
@@ -172,7 +202,7 @@ export interface D3Node extends d3.SimulationNodeDatum {
   stability?: string;
   variance?: number;
   test_count?: number;
-  evolution?: TraitEvolution;
+  evolution?: Omit<TraitEvolution, 'history'>;
 }
 
 export interface D3Link extends d3.SimulationLinkDatum<D3Node> {